@@ -1,12 +1,32 @@
-from django.contrib import admin
+import json
+from collections import Counter
+from django.contrib import admin, messages
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.admin.views.main import ALL_VAR, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, TO_FIELD_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from django.utils.html import format_html
-from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
 from import_export.admin import ImportExportModelAdmin
-from .models import Empleado, RegistroHora, Periodo, Departamento, Secretaria, PerfilUsuario
+from .models import Empleado, RegistroHora, Periodo, Departamento, Secretaria, PerfilUsuario, TrabajoReporte, CierrePeriodo, empleados_modificados
+from . import busqueda, conteos
+from .cierres import ErrorCierre, cerrar_periodos, reabrir_periodos
+from .cola_reportes import CIERRE_ZIP, encolar_cierre
+from .exportacion import xlsx_disponible
+from .contexto import periodo_activo, periodo_activo_id, secretaria_usuario
+from .reportes import ENCABEZADOS
+from .resumenes import aplicar_delta
+from .forms import ModeloPrecargadoField, ImportarHorasForm, PeriodoForm, RegistroHoraListaForm, RegistrosEditablesFormSet
+from .importacion import ErrorImportacion, importar_registros, leer_filas
+
+DESTINATARIOS = tuple(ENCABEZADOS)
 
 # --- 1. GESTIÓN DE USUARIOS ---
 class PerfilUsuarioInline(admin.StackedInline):
@@ -29,43 +49,162 @@ class FiltroSecretariaMixin:
         if request.user.is_superuser: 
             return qs
         
-        # 2. Intentamos obtener la secretaría del usuario
-        try:
-            # Verificamos si tiene perfil y secretaría
-            if hasattr(request.user, 'perfilusuario') and request.user.perfilusuario.secretaria:
-                sec = request.user.perfilusuario.secretaria
-                
-                # Filtramos según el modelo que se esté viendo
-                if self.model == Empleado:
-                    return qs.filter(departamento__secretaria=sec)
-                elif self.model == RegistroHora:
-                    return qs.filter(departamento_imputacion__secretaria=sec)
-                elif self.model == Departamento:
-                    return qs.filter(secretaria=sec)
-            else:
-                # CASO DIRECTOR (O usuario sin secretaría específica):
-                # Si queremos que el Director vea todo, dejamos esto así:
-                return qs 
-                # Si quisieras que un usuario sin secretaría no vea NADA, pondrías: return qs.none()
-                
-        except Exception:
-            pass
-            
+        # 2. Secretaría del usuario (resuelta una vez por request, ver contexto.py)
+        sec = secretaria_usuario(request)
+        if sec:
+            # Empleado y RegistroHora guardan una copia de la Secretaría de su departamento: sin JOIN
+            if self.model in (Empleado, RegistroHora, Departamento):
+                return qs.filter(secretaria=sec)
+
+        # CASO DIRECTOR (O usuario sin secretaría específica): ve todo.
+        # Si quisieras que un usuario sin secretaría no vea NADA, pondrías: return qs.none()
         return qs
 
+# --- 3. CONSULTAS: RELACIONES QUE LEE __str__ ---
+# Empleado, Departamento y RegistroHora muestran datos de relaciones en __str__:
+# se traen en la misma consulta en listados, autocompletado, desplegables y
+# filtros laterales, así la cantidad de consultas no depende del tamaño de la página.
+RELACIONES_STR = {
+    Empleado: ('departamento',),
+    Departamento: ('secretaria',),
+    RegistroHora: ('empleado__departamento',),
+}
+
+class RelacionesStrMixin:
+    def get_queryset(self, request):
+        # ChangeList ignora list_select_related si el queryset ya trae select_related: se suman acá
+        extra = self.list_select_related if isinstance(self.list_select_related, (list, tuple)) else ()
+        return super().get_queryset(request).select_related(*RELACIONES_STR.get(self.model, ()), *extra)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        relaciones = RELACIONES_STR.get(db_field.remote_field.model)
+        if relaciones and formfield is not None and hasattr(formfield, 'queryset'):
+            formfield.queryset = formfield.queryset.select_related(*relaciones)
+        return formfield
+
+class RelacionadoListFilter(admin.RelatedFieldListFilter):
+    # Opciones del filtro lateral en una sola consulta (RelatedFieldListFilter llama a __str__ por opción)
+    # y guardadas en la caché entre requests (ver conteos.py)
+    def field_choices(self, field, request, model_admin):
+        modelo = field.remote_field.model
+        orden = [str(o) for o in self.field_admin_ordering(field, request, model_admin) or ()]
+        def obtener():
+            qs = modelo._default_manager.select_related(*RELACIONES_STR.get(modelo, ()))
+            return [(obj.pk, str(obj)) for obj in (qs.order_by(*orden) if orden else qs)]
+        return conteos.opciones_filtro(modelo, orden, obtener)
+
+class BusquedaEmpleadoMixin:
+    # Búsqueda del listado y del autocompletado contra el índice FTS5 (ver busqueda.py);
+    # search_fields queda como respaldo en bases sin FTS5. 'campo_empleado' apunta al empleado.
+    campo_empleado = 'pk'
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = busqueda.coincidencias(search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(**{f'{self.campo_empleado}__in': ids}), False
+
+class AutocompletePrecargado(AutocompleteSelect):
+    # Si el campo trae 'precargados' (ver ModeloPrecargadoField) la opción elegida sale de ahí,
+    # no de un SELECT por widget: en el listado editable hay un widget por fila
+    def optgroups(self, name, value, attr=None):
+        precargados = getattr(self.choices.field, 'precargados', None)
+        if precargados is None:
+            return super().optgroups(name, value, attr)
+        opciones = []
+        if not self.is_required:
+            opciones.append(self.create_option(name, '', '', False, 0))
+        for v in value:
+            obj = precargados.get(str(v))
+            if obj is not None:
+                opciones.append(self.create_option(name, obj.pk, self.choices.field.label_from_instance(obj), True, len(opciones)))
+        return [(None, opciones, 0)]
+
 # --- IMPORTACIÓN ---
+# Todo lo que antes costaba consultas por fila se resuelve en before_import:
+# los departamentos faltantes se crean de una vez, las FK salen de un mapa en
+# memoria y los empleados existentes de un índice por legajo. Las filas sin
+# cambios se saltean. Por defecto cada fila se guarda con Empleado.save() (con
+# sus señales); la escritura con bulk_create / bulk_update es una opción aparte
+# del formulario de importación (EmpleadoResourceMasivo).
+def _texto_celda(valor):
+    # Excel devuelve los números como float (1234.0)
+    if isinstance(valor, float) and valor.is_integer(): valor = int(valor)
+    return str(valor).strip() if valor is not None else ''
+
+class DepartamentoPorNombreWidget(ForeignKeyWidget):
+    def __init__(self):
+        super().__init__(Departamento, field='nombre')
+        self.mapa = {}
+    def clean(self, value, row=None, **kwargs):
+        nombre = _texto_celda(value).upper()
+        if not nombre:
+            return None
+        return self.mapa.get(nombre) or super().clean(nombre, row, **kwargs)
+
 class EmpleadoResource(resources.ModelResource):
     legajo = fields.Field(attribute='legajo', column_name='Nº identificación')
     nombre_completo = fields.Field(attribute='nombre_completo', column_name='Nombre del empleado')
-    departamento = fields.Field(attribute='departamento', column_name='Departamento', widget=ForeignKeyWidget(Departamento, field='nombre'))
-    class Meta: model = Empleado; import_id_fields = ('legajo',); fields = ('legajo', 'nombre_completo', 'departamento'); skip_unchanged = False 
+    departamento = fields.Field(attribute='departamento', column_name='Departamento', widget=DepartamentoPorNombreWidget())
+    class Meta: model = Empleado; import_id_fields = ('legajo',); fields = ('legajo', 'nombre_completo', 'departamento'); skip_unchanged = True; name = "Empleados (fila por fila)"
+
+    def before_import(self, dataset, **kwargs):
+        if 'Nº identificación' in dataset.headers:
+            # Legajo repetido en el archivo: vale la última fila, como cuando se guardaba fila por fila
+            ultima = {_texto_celda(v): i for i, v in enumerate(dataset['Nº identificación'])}
+            for i in sorted(set(range(len(dataset))) - set(ultima.values()), reverse=True):
+                del dataset[i]
+        legajos = [_texto_celda(v) for v in dataset['Nº identificación']] if 'Nº identificación' in dataset.headers else []
+        nombres = {_texto_celda(v).upper() for v in dataset['Departamento']} - {''} if 'Departamento' in dataset.headers else set()
+        # 1. Departamentos: una consulta + un bulk_create para los que falten
+        mapa = {d.nombre: d for d in Departamento.objects.filter(nombre__in=nombres)}
+        faltantes = [Departamento(nombre=n) for n in sorted(nombres - set(mapa))]
+        if faltantes:
+            Departamento.objects.bulk_create(faltantes, ignore_conflicts=True)
+            mapa.update((d.nombre, d) for d in Departamento.objects.filter(nombre__in=[d.nombre for d in faltantes]))
+            conteos.invalidar_opciones_filtro()  # bulk_create no dispara post_save
+        self.fields['departamento'].widget.mapa = mapa
+        # 2. Empleados existentes indexados por legajo
+        self._empleados = {e.legajo: e for e in Empleado.objects.filter(legajo__in=set(legajos) - {''}).select_related('departamento')}
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        # bulk_create / bulk_update no disparan post_save: el índice de búsqueda se actualiza acá
+        legajos = {_texto_celda(v) for v in dataset['Nº identificación']} - {''} if 'Nº identificación' in dataset.headers else set()
+        if legajos:
+            empleados_modificados.send(sender=Empleado, empleado_ids=list(Empleado.objects.filter(legajo__in=legajos).values_list('pk', flat=True)))
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # En la importación masiva no se llama a Empleado.save(): la Secretaría denormalizada se copia acá (el departamento sale del mapa)
+        instance.secretaria_id = instance.departamento.secretaria_id if instance.departamento_id else None
+
+    def get_bulk_update_fields(self):
+        return [*super().get_bulk_update_fields(), 'secretaria']
+
     def before_import_row(self, row, **kwargs):
-        if row.get('Departamento'):
-            nombre = str(row.get('Departamento')).strip().upper()
-            row['Departamento'] = nombre
-            Departamento.objects.get_or_create(nombre=nombre)
+        row['Nº identificación'] = _texto_celda(row.get('Nº identificación'))
+        if 'Departamento' in row:
+            row['Departamento'] = _texto_celda(row['Departamento']).upper()
+
+    def get_instance(self, instance_loader, row):
+        return self._empleados.get(_texto_celda(row.get('Nº identificación')))
+
     def skip_row(self, instance, original, row, import_validation_errors=None):
-        return row.get('Nº identificación') is None or str(row.get('Nº identificación')).strip() == ''
+        if not row.get('Nº identificación'):
+            return True
+        if import_validation_errors or original is None or original.pk is None:
+            return False
+        # Sin consultas: el original sale del índice precargado
+        return (instance.legajo, instance.nombre_completo, instance.departamento_id) == (original.legajo, original.nombre_completo, original.departamento_id)
+
+class EmpleadoResourceMasivo(EmpleadoResource):
+    # Padrones grandes: bulk_create / bulk_update por lotes, sin Empleado.save() ni post_save por fila.
+    # Lo que hacen por fila se cubre igual: la Secretaría denormalizada en before_save_instance, el
+    # índice de búsqueda y la huella de los PDF con empleados_modificados (after_import), y las
+    # opciones de filtros al crear departamentos (before_import). Un receptor nuevo de post_save
+    # de Empleado debe escuchar también empleados_modificados.
+    class Meta(EmpleadoResource.Meta): use_bulk = True; batch_size = 500; name = "Empleados (importación masiva)"
 
 # --- PANELES CON SEGURIDAD APLICADA ---
 
@@ -73,89 +212,316 @@ class SecretariaAdmin(admin.ModelAdmin):
     list_display = ('nombre',); search_fields = ('nombre',)
 
 # APLICAMOS EL MIXIN AQUÍ
-class DepartamentoAdmin(FiltroSecretariaMixin, admin.ModelAdmin):
-    list_display = ('nombre', 'secretaria')
+class DepartamentoAdmin(FiltroSecretariaMixin, RelacionesStrMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'secretaria'); list_select_related = ('secretaria',)
     list_filter = ('secretaria',); search_fields = ('nombre', 'secretaria__nombre')
 
 class PeriodoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'fecha_inicio', 'fecha_fin', 'activo', 'cerrado', 'acciones_reporte')
-    list_filter = ('activo', 'cerrado'); list_editable = ('activo', 'cerrado')
+    list_display = ('nombre', 'fecha_inicio', 'fecha_fin', 'activo', 'cerrado', 'archivado', 'acciones_reporte', 'estado_reportes')
+    list_filter = ('activo', 'cerrado', 'archivado'); list_editable = ('activo', 'cerrado')
+    actions = ['cerrar_seleccionados', 'reabrir_seleccionados', 'descargar_cierre_zip']
+    form = PeriodoForm
+
+    def get_changelist_form(self, request, **kwargs):
+        return super().get_changelist_form(request, **{'form': PeriodoForm, **kwargs})
+
+    # El tilde 'cerrado' (formulario o listado editable) pasa por la operación de cierre/reapertura.
+    # PeriodoForm ya rechazó lo que no se puede; el admin guarda dentro de una transacción, así
+    # que si el cierre falla igual (horas cargadas en el medio) se deshace también el resto.
+    def save_model(self, request, obj, form, change):
+        if 'cerrado' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+        cerrar = obj.cerrado
+        obj.cerrado = not cerrar
+        super().save_model(request, obj, form, change)
+        (cerrar_periodos if cerrar else reabrir_periodos)([obj], request.user)
+        obj.cerrado = cerrar
+
+    def cerrar_seleccionados(self, request, queryset):
+        try:
+            cerrados = cerrar_periodos(queryset, request.user)
+        except ErrorCierre as e:
+            for periodo, mensajes in e.errores.items():
+                self.message_user(request, f"⛔ {periodo.nombre}: {' '.join(mensajes)}", messages.ERROR)
+            self.message_user(request, "No se cerró ningún período: corrija los registros y vuelva a intentarlo.", messages.WARNING)
+            return
+        self.message_user(request, f"🔒 {len(cerrados)} período(s) cerrado(s).", messages.SUCCESS)
+    cerrar_seleccionados.short_description = "🔒 Cerrar períodos seleccionados"
+
+    def reabrir_seleccionados(self, request, queryset):
+        try:
+            reabiertos = reabrir_periodos(queryset, request.user)
+        except ErrorCierre as e:
+            for periodo, mensajes in e.errores.items():
+                self.message_user(request, f"⛔ {periodo.nombre}: {' '.join(mensajes)}", messages.ERROR)
+            return
+        self.message_user(request, f"🔓 {len(reabiertos)} período(s) reabierto(s).", messages.SUCCESS)
+    reabrir_seleccionados.short_description = "🔓 Reabrir períodos seleccionados"
+
+    # Último trabajo de renderizado por destinatario, resuelto en la misma consulta del listado
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        for dest in (*DESTINATARIOS, CIERRE_ZIP):
+            ultimo = TrabajoReporte.objects.filter(periodo=OuterRef('pk'), destinatario=dest).order_by('-creado')
+            qs = qs.annotate(**{f'trabajo_{dest}_id': Subquery(ultimo.values('pk')[:1]), f'trabajo_{dest}_estado': Subquery(ultimo.values('estado')[:1])})
+        return qs
+
     def acciones_reporte(self, obj):
         url_a = reverse('reporte_pdf', args=[obj.pk, 'andrea'])
         url_e = reverse('reporte_pdf', args=[obj.pk, 'edith'])
-        return format_html(
+        url_csv = reverse('reporte_exportar', args=[obj.pk, 'csv'])
+        botones = format_html(
             '<a class="btn btn-info btn-sm" href="{}" target="_blank" style="margin-right:5px;"><i class="fas fa-file-pdf"></i> Andrea</a>'
-            '<a class="btn btn-success btn-sm" href="{}" target="_blank"><i class="fas fa-file-pdf"></i> Edith</a>', url_a, url_e)
+            '<a class="btn btn-success btn-sm" href="{}" target="_blank" style="margin-right:5px;"><i class="fas fa-file-pdf"></i> Edith</a>'
+            '<a class="btn btn-secondary btn-sm" href="{}" style="margin-right:5px;"><i class="fas fa-file-csv"></i> CSV</a>', url_a, url_e, url_csv)
+        if xlsx_disponible():
+            botones += format_html('<a class="btn btn-secondary btn-sm" href="{}"><i class="fas fa-file-excel"></i> XLSX</a>', reverse('reporte_exportar', args=[obj.pk, 'xlsx']))
+        return botones
     acciones_reporte.short_description = "Reportes"
 
+    def estado_reportes(self, obj):
+        if not obj.cerrado: return "-"
+        volver = reverse('admin:calculos_periodo_changelist')
+        partes = []
+        for dest in DESTINATARIOS:
+            estado = getattr(obj, f'trabajo_{dest}_estado', None)
+            if estado == TrabajoReporte.LISTO:
+                url = reverse('reporte_trabajo_descarga', args=[getattr(obj, f'trabajo_{dest}_id')])
+                partes.append(format_html('<a href="{}" target="_blank">✅ {} listo</a>', url, dest.title()))
+            elif estado in (TrabajoReporte.PENDIENTE, TrabajoReporte.PROCESANDO):
+                partes.append(format_html('⏳ {} renderizando', dest.title()))
+            else:
+                # Encolar es un POST: el botón envía el formulario del listado (con su token CSRF) a otra URL
+                url = reverse('reporte_pdf_encolar', args=[obj.pk, dest])
+                partes.append(format_html('<button type="submit" formaction="{}?volver={}" formnovalidate class="button">{} {}</button>', url, volver, '⚠️' if estado == TrabajoReporte.ERROR else '▶️', dest.title()))
+        estado = getattr(obj, f'trabajo_{CIERRE_ZIP}_estado', None)
+        if estado == TrabajoReporte.LISTO:
+            partes.append(format_html('<a href="{}">📦 ZIP listo</a>', reverse('reporte_trabajo_descarga', args=[getattr(obj, f'trabajo_{CIERRE_ZIP}_id')])))
+        elif estado in (TrabajoReporte.PENDIENTE, TrabajoReporte.PROCESANDO):
+            partes.append("⏳ ZIP generando")
+        elif estado == TrabajoReporte.ERROR:
+            partes.append("⚠️ ZIP con error")
+        return format_html_join(format_html('<br>'), '{}', ((p,) for p in partes))
+    estado_reportes.short_description = "Segundo plano"
+
+    # Todos los PDF de cierre (ambos destinatarios + uno por Secretaría) en un ZIP por período,
+    # armado en segundo plano: se descarga desde la columna "Segundo plano"
+    def descargar_cierre_zip(self, request, queryset):
+        cerrados = list(queryset.filter(cerrado=True))
+        abiertos = queryset.filter(cerrado=False).count()
+        if abiertos:
+            self.message_user(request, f"⚠️ Se omitieron {abiertos} período(s) ABIERTO(s): deben estar cerrados para generar reportes.", messages.WARNING)
+        if not cerrados:
+            return None
+        base_url = request.build_absolute_uri('/')
+        for periodo in cerrados:
+            encolar_cierre(periodo, base_url)
+        self.message_user(request, f"📦 ZIP de cierre de {len(cerrados)} período(s) en preparación: descárguelo desde la columna \"Segundo plano\".", messages.SUCCESS)
+    descargar_cierre_zip.short_description = "📦 Preparar los reportes de cierre (ZIP)"
+
+# Historial de cierres: solo lectura (las fotos son inmutables)
+class CierrePeriodoAdmin(admin.ModelAdmin):
+    list_display = ('periodo', 'operacion', 'fecha', 'usuario', 'total_horas', 'cantidad_registros', 'cantidad_empleados')
+    list_filter = ('operacion', 'periodo'); list_select_related = ('periodo', 'usuario')
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+    def has_delete_permission(self, request, obj=None): return False
+
 # APLICAMOS EL MIXIN AQUÍ
-class EmpleadoAdmin(FiltroSecretariaMixin, ImportExportModelAdmin):
-    resource_class = EmpleadoResource
-    list_display = ('legajo', 'nombre_completo', 'departamento')
+class EmpleadoAdmin(FiltroSecretariaMixin, RelacionesStrMixin, BusquedaEmpleadoMixin, ImportExportModelAdmin):
+    resource_classes = [EmpleadoResource, EmpleadoResourceMasivo]
+    list_display = ('legajo', 'nombre_completo', 'departamento'); list_select_related = ('departamento__secretaria',)
     search_fields = ('legajo', 'nombre_completo', 'departamento__nombre')
-    list_filter = ('departamento__secretaria', 'departamento')
+    list_filter = ('departamento__secretaria', ('departamento', RelacionadoListFilter))
+
+class ChangeListConteos(ChangeList):
+    # show_full_result_count=False evita el COUNT(*) de toda la historia; el "N en total" sale del resumen
+    def get_results(self, request):
+        super().get_results(request)
+        total = self.model_admin.conteo_total(request)
+        self.show_full_result_count, self.full_result_count, self.show_admin_actions = True, total, bool(total)
 
 # APLICAMOS EL MIXIN AQUÍ
-class RegistroHoraAdmin(FiltroSecretariaMixin, admin.ModelAdmin):
+class RegistroHoraAdmin(FiltroSecretariaMixin, RelacionesStrMixin, BusquedaEmpleadoMixin, admin.ModelAdmin):
     list_display = ('empleado', 'departamento_imputacion', 'cantidad_horas', 'confirmar_exceso')
+    list_select_related = ('empleado__departamento', 'departamento_imputacion__secretaria')
     list_editable = ('cantidad_horas', 'departamento_imputacion', 'confirmar_exceso')
-    list_filter = ('periodo', 'departamento_imputacion')
-    search_fields = ('empleado__nombre_completo', 'empleado__departamento__nombre')
+    list_filter = (('periodo', RelacionadoListFilter), ('departamento_imputacion', RelacionadoListFilter))
+    search_fields = ('empleado__nombre_completo', 'empleado__departamento__nombre'); campo_empleado = 'empleado'
     autocomplete_fields = ['empleado', 'departamento_imputacion']
+    paginator = conteos.PaginadorConteo; show_full_result_count = False
     
     # Combinamos filtros de seguridad con filtro de período activo
     def get_queryset(self, request):
         qs = super().get_queryset(request) # Llama al Mixin primero
         if not request.GET:
-            p_activo = Periodo.objects.filter(activo=True).first()
+            p_activo = periodo_activo(request)
             if p_activo: qs = qs.filter(periodo=p_activo)
         return qs
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
+        if self.has_add_permission(request):
+            extra_context['importar_horas_url'] = reverse('admin:calculos_registrohora_importar')
         
         # HERRAMIENTAS SOLO PARA SUPERUSUARIO O DIRECTOR (Si quieres que el secretario no vea esto, usa is_superuser)
         if request.user.is_superuser:
             extra_context['reporte_historico_url'] = reverse('reporte_historico')
+            extra_context['rendimiento_url'] = reverse('panel_rendimiento')
             
             periodo_id = request.GET.get('periodo__id__exact')
             if periodo_id:
                 try:
                     p = Periodo.objects.get(pk=periodo_id)
-                    st = "🔒 CERRADO" if p.cerrado else "🟢 ABIERTO"
+                    st = "🗄️ ARCHIVADO (ver el reporte del período)" if p.archivado else "🔒 CERRADO" if p.cerrado else "🟢 ABIERTO"
                     extra_context['periodo_info'] = f"Viendo: {p.nombre} ({st})"
                     extra_context['periodo_bg'] = '#ffc107' 
                 except: pass
             else:
-                p_activo = Periodo.objects.filter(activo=True).first()
+                p_activo = periodo_activo(request)
                 if p_activo:
                     extra_context['periodo_info'] = f"Activo: {p_activo.nombre}"
                     extra_context['periodo_bg'] = '#17a2b8'
                 else:
                     extra_context['periodo_info'] = "⚠️ Sin período activo"; extra_context['periodo_bg'] = '#6c757d'
-        
+
+        # Guardado del listado editable: save_model acumula y se escribe todo junto al final
+        if request.method == 'POST' and '_save' in request.POST and self.list_editable:
+            request._registros_pendientes, request._cambios_pendientes = [], {}
+            with transaction.atomic():
+                response = super().changelist_view(request, extra_context=extra_context)
+                self.guardar_pendientes(request)
+            return response
         return super().changelist_view(request, extra_context=extra_context)
+
+    # --- CONTEOS DEL LISTADO (ver conteos.py) ---
+    FILTROS_RESUMEN = {'periodo__id__exact': 'periodo_id', 'departamento_imputacion__id__exact': 'departamento_id'}
+    PARAMETROS_VISTA = {ALL_VAR, ORDER_VAR, PAGE_VAR, IS_POPUP_VAR, TO_FIELD_VAR, IS_FACETS_VAR}
+
+    def filtros_resumen(self, request, raiz=False):
+        # Filtros del listado como columnas de ResumenHoras; None si hay otros (búsqueda, etc.).
+        # raiz=True: los del total sin filtros laterales (el queryset de get_queryset)
+        sec = None if request.user.is_superuser else secretaria_usuario(request)
+        filtros = {'secretaria_id': sec.pk if sec else None}
+        if not request.GET:  # mismo criterio que get_queryset
+            filtros['periodo_id'] = periodo_activo_id(request)
+        if raiz or not request.GET:
+            return filtros
+        for clave, valores in request.GET.lists():
+            if clave in self.PARAMETROS_VISTA or (clave == SEARCH_VAR and not ''.join(valores).strip()):
+                continue
+            campo = self.FILTROS_RESUMEN.get(clave)
+            if campo is None or len(valores) != 1 or not valores[0].isdigit():
+                return None
+            filtros[campo] = int(valores[0])
+        return filtros
+
+    def conteo_listado(self, request, queryset):
+        filtros = self.filtros_resumen(request)
+        if filtros is not None:
+            return conteos.desde_resumen(**filtros)
+        periodo = request.GET.get('periodo__id__exact', '')
+        return conteos.contar_cacheado(queryset, int(periodo) if periodo.isdigit() else None)
+
+    def conteo_total(self, request):
+        return conteos.desde_resumen(**self.filtros_resumen(request, raiz=True))
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, conteo=lambda: self.conteo_listado(request, queryset))
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListConteos
+
+    # --- GUARDADO EN LOTE DEL LISTADO EDITABLE ---
+    def get_changelist_form(self, request, **kwargs):
+        return super().get_changelist_form(request, form=RegistroHoraListaForm, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        return super().get_changelist_formset(request, formset=RegistrosEditablesFormSet, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        pendientes = getattr(request, '_registros_pendientes', None)
+        if pendientes is None:
+            return super().save_model(request, obj, form, change)
+        # Misma regla que RegistroHora.save(); el resto ya se validó en el formset
+        if not obj.departamento_imputacion_id and obj.empleado.departamento_id:
+            obj.departamento_imputacion_id = obj.empleado.departamento_id
+        pendientes.append(obj)
+
+    def log_change(self, request, obj, message):
+        # En el guardado en lote el historial también se escribe junto (un INSERT por tipo de cambio)
+        if getattr(request, '_registros_pendientes', None) is None:
+            return super().log_change(request, obj, message)
+        request._cambios_pendientes.setdefault(json.dumps(message), (request.user.pk, []))[1].append(obj)
+
+    def guardar_pendientes(self, request):
+        pendientes = request._registros_pendientes
+        if not pendientes:
+            return
+        # bulk_update no pasa por save(): la Secretaría denormalizada se copia acá (una consulta)
+        secretarias = dict(Departamento.objects.filter(pk__in={o.departamento_imputacion_id for o in pendientes}).values_list('pk', 'secretaria_id'))
+        for o in pendientes: o.secretaria_id = secretarias.get(o.departamento_imputacion_id)
+        RegistroHora.objects.bulk_update(pendientes, ['cantidad_horas', 'departamento_imputacion', 'secretaria', 'confirmar_exceso'], batch_size=500)
+        for mensaje, (usuario_id, objetos) in request._cambios_pendientes.items():
+            LogEntry.objects.log_actions(user_id=usuario_id, queryset=objetos, action_flag=CHANGE, change_message=mensaje)
+        # bulk_update no pasa por save(): el resumen se corrige con los deltas de las filas cambiadas,
+        # sumados por (período, departamento), en esta misma transacción. No se recalcula el período entero.
+        horas, cantidad = Counter(), Counter()
+        for o in pendientes:
+            previo = o._valores_previos()
+            anterior, nuevo = (previo['periodo_id'], previo['departamento_imputacion_id']), (o.periodo_id, o.departamento_imputacion_id)
+            horas[anterior] -= previo['cantidad_horas']; cantidad[anterior] -= 1
+            horas[nuevo] += o.cantidad_horas; cantidad[nuevo] += 1
+        for (periodo_id, departamento_id), delta in horas.items():
+            aplicar_delta(periodo_id, departamento_id, delta, cantidad[(periodo_id, departamento_id)])
     
+    # Importación masiva de horas desde planilla (ver importacion.py)
+    def get_urls(self):
+        urls = [path('importar-horas/', self.admin_site.admin_view(self.importar_horas_view), name='calculos_registrohora_importar')]
+        return urls + super().get_urls()
+
+    def importar_horas_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        resultado = None
+        if request.method == 'POST':
+            form = ImportarHorasForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = form.cleaned_data['archivo']
+                try:
+                    # Un secretario solo importa horas de su Secretaría (superusuarios y directores: todas)
+                    sec = None if request.user.is_superuser else secretaria_usuario(request)
+                    resultado = importar_registros(leer_filas(archivo.file, archivo.name), form.cleaned_data['periodo'], simulacion=form.cleaned_data['simular'], secretaria=sec, omitir_cargadas=form.cleaned_data['omitir_cargadas'])
+                except ErrorImportacion as e:
+                    messages.error(request, str(e))
+        else:
+            p = periodo_activo(request)
+            form = ImportarHorasForm(initial={'periodo': p.pk if p and not p.cerrado else None})
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta, 'title': 'Importar horas', 'form': form, 'resultado': resultado}
+        return TemplateResponse(request, 'admin/calculos/registrohora/importar_horas.html', context)
+
     def get_changeform_initial_data(self, request):
         initial = super().get_changeform_initial_data(request)
-        p = Periodo.objects.filter(activo=True).first()
+        p = periodo_activo(request)
         if p: initial['periodo'] = p.pk
         return initial
     
     # Filtro de desplegables (Dropdowns)
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if not request.user.is_superuser:
-            try:
-                sec = request.user.perfilusuario.secretaria
-                if sec:
-                    if db_field.name == "empleado": kwargs["queryset"] = Empleado.objects.filter(departamento__secretaria=sec)
-                    if db_field.name == "departamento_imputacion": kwargs["queryset"] = Departamento.objects.filter(secretaria=sec)
-            except: pass
+            sec = secretaria_usuario(request)
+            if sec:
+                if db_field.name == "empleado": kwargs["queryset"] = Empleado.objects.filter(secretaria=sec)
+                if db_field.name == "departamento_imputacion": kwargs["queryset"] = Departamento.objects.filter(secretaria=sec)
+        if db_field.name == "departamento_imputacion":
+            kwargs.setdefault("form_class", ModeloPrecargadoField)
+            kwargs.setdefault("widget", AutocompletePrecargado(db_field, self.admin_site, using=kwargs.get("using")))
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
     class Media: css = {'all': ('css/admin_fixes.css',)}
 
 admin.site.register(Secretaria, SecretariaAdmin)
+admin.site.register(CierrePeriodo, CierrePeriodoAdmin)
 admin.site.register(Departamento, DepartamentoAdmin)
 admin.site.register(Periodo, PeriodoAdmin)
 admin.site.register(Empleado, EmpleadoAdmin)
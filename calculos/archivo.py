@@ -0,0 +1,245 @@
+import array
+import datetime
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import zlib
+from decimal import Decimal
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from .models import Departamento, Empleado, Periodo, RegistroHora, ResumenHoras, Secretaria
+
+# ====================================================================
+# ARCHIVO EN FRÍO DE PERÍODOS CERRADOS (FORMATO COLUMNAR)
+# ====================================================================
+# Los registros de los períodos cerrados más viejos que ARCHIVO_ANTIGUEDAD_MESES
+# se pasan a un archivo por período en ARCHIVO_DIR y se borran de RegistroHora
+# (DELETE directo, sin señales: el resumen materializado del período se conserva
+# y el dashboard histórico y los cierres siguen leyendo de ahí). El período
+# queda con archivado=True y resumen_por_empleado() lo lee del archivo, así que
+# el PDF, la exportación y la generación en lote no cambian.
+#
+# Formato de cada archivo: MAGIA, largo del encabezado (4 bytes), encabezado
+# JSON y una columna tras otra, cada una un array; todo comprimido con zlib. El
+# encabezado describe las columnas (tipo, bytes, sha256) y guarda los nombres
+# de empleados, departamentos y secretarías tal como estaban al archivar.
+# manifiesto.json lista los archivos con sus totales y su sha256.
+# ARCHIVO_DIR no está dentro de la base: crear_backup lo copia en cada
+# backup (completo e incremental) y archivar_periodos hace uno al terminar.
+
+MAGIA = b'CALCCOL1'
+MANIFIESTO = 'manifiesto.json'
+NULO = -1  # FK vacía en las columnas enteras
+LOTE = 2000
+# (nombre, typecode de array): horas en décimas (el campo tiene un decimal)
+COLUMNAS = (('id', 'q'), ('empleado_id', 'q'), ('departamento_imputacion_id', 'q'), ('secretaria_id', 'q'), ('decimas', 'q'), ('confirmar_exceso', 'b'))
+
+class ErrorArchivo(Exception):
+    pass
+
+def directorio_archivo():
+    return getattr(settings, 'ARCHIVO_DIR', os.path.join(settings.BASE_DIR, 'archivo'))
+
+def antiguedad_meses():
+    return getattr(settings, 'ARCHIVO_ANTIGUEDAD_MESES', 24)
+
+def ruta_periodo(periodo_id):
+    return os.path.join(directorio_archivo(), f'periodo_{periodo_id:06}.col')
+
+def _escribir_atomico(ruta, partes):
+    # Archivo temporal + rename: nunca queda un archivo a medias con el nombre final
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    h = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for parte in partes:
+                h.update(parte); f.write(parte)
+        os.replace(tmp, ruta)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return h.hexdigest()
+
+# --- ESCRITURA ---
+def columnas_periodo(periodo):
+    # Columnas (arrays) y diccionarios de nombres de los registros del período
+    columnas = {nombre: array.array(tipo) for nombre, tipo in COLUMNAS}
+    filas = (RegistroHora.objects.filter(periodo=periodo).order_by('pk')
+        .values_list('pk', 'empleado_id', 'departamento_imputacion_id', 'secretaria_id', 'cantidad_horas', 'confirmar_exceso'))
+    for pk, empleado, depto, secretaria, horas, confirmar in filas.iterator(chunk_size=LOTE):
+        columnas['id'].append(pk); columnas['empleado_id'].append(empleado)
+        columnas['departamento_imputacion_id'].append(NULO if depto is None else depto)
+        columnas['secretaria_id'].append(NULO if secretaria is None else secretaria)
+        columnas['decimas'].append(int(horas * 10)); columnas['confirmar_exceso'].append(int(confirmar))
+    diccionarios = {
+        'empleados': {str(pk): [legajo, nombre, habitual] for pk, legajo, nombre, habitual in
+            Empleado.objects.filter(pk__in=set(columnas['empleado_id'])).values_list('pk', 'legajo', 'nombre_completo', 'departamento__nombre')},
+        'departamentos': {str(pk): nombre for pk, nombre in Departamento.objects.filter(pk__in=set(columnas['departamento_imputacion_id'])).values_list('pk', 'nombre')},
+        'secretarias': {str(pk): nombre for pk, nombre in Secretaria.objects.filter(pk__in=set(columnas['secretaria_id'])).values_list('pk', 'nombre')},
+    }
+    return columnas, diccionarios
+
+def escribir(ruta, periodo, columnas, diccionarios):
+    bloques, descripcion = [], []
+    for nombre, tipo in COLUMNAS:
+        datos = zlib.compress(columnas[nombre].tobytes(), 6)
+        bloques.append(datos)
+        descripcion.append({'nombre': nombre, 'tipo': tipo, 'bytes': len(datos), 'sha256': hashlib.sha256(datos).hexdigest()})
+    encabezado = zlib.compress(json.dumps({
+        'periodo': {'id': periodo.pk, 'nombre': periodo.nombre, 'fecha_inicio': periodo.fecha_inicio.isoformat(), 'fecha_fin': periodo.fecha_fin.isoformat()},
+        'filas': len(columnas['id']), 'orden_bytes': sys.byteorder, 'columnas': descripcion, **diccionarios,
+    }, ensure_ascii=False).encode('utf-8'), 6)
+    return _escribir_atomico(ruta, [MAGIA, len(encabezado).to_bytes(4, 'little'), encabezado, *bloques])
+
+# --- LECTURA ---
+class PeriodoArchivado:
+    def __init__(self, encabezado, columnas):
+        self.encabezado = encabezado
+        self.columnas = columnas
+        self.filas = encabezado['filas']
+        self.empleados = {int(k): v for k, v in encabezado['empleados'].items()}
+        self.departamentos = {int(k): v for k, v in encabezado['departamentos'].items()}
+        self.secretarias = {int(k): v for k, v in encabezado['secretarias'].items()}
+
+    def total_decimas(self):
+        return sum(self.columnas['decimas'])
+
+def leer(ruta):
+    with open(ruta, 'rb') as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ErrorArchivo(f'❌ {ruta} no es un archivo de período.')
+        encabezado = json.loads(zlib.decompress(f.read(int.from_bytes(f.read(4), 'little'))).decode('utf-8'))
+        columnas = {}
+        for col in encabezado['columnas']:
+            datos = f.read(col['bytes'])
+            if hashlib.sha256(datos).hexdigest() != col['sha256']:
+                raise ErrorArchivo(f"❌ {ruta}: la columna '{col['nombre']}' está dañada.")
+            columnas[col['nombre']] = array.array(col['tipo'], zlib.decompress(datos))
+            if encabezado['orden_bytes'] != sys.byteorder: columnas[col['nombre']].byteswap()
+    return PeriodoArchivado(encabezado, columnas)
+
+@lru_cache(maxsize=8)
+def _leer_cacheado(ruta, mtime_ns, tamanio):
+    return leer(ruta)
+
+def leer_periodo(periodo_id):
+    # Los archivos no cambian una vez escritos: se releen solo si cambia la fecha o el tamaño
+    ruta = ruta_periodo(periodo_id)
+    try:
+        st = os.stat(ruta)
+    except FileNotFoundError:
+        raise ErrorArchivo(f'❌ Falta el archivo del período {periodo_id}: {ruta}')
+    return _leer_cacheado(ruta, st.st_mtime_ns, st.st_size)
+
+class FilasArchivadas(list):
+    # Mismo uso que el queryset de resumen_por_empleado (iteración, list() e .iterator())
+    def iterator(self, chunk_size=None):
+        return iter(self)
+
+def resumen_por_empleado(periodo, secretaria=None, por_secretaria=False):
+    # Mismas filas y orden que resumenes.resumen_por_empleado, calculadas desde el archivo
+    datos = leer_periodo(periodo.pk)
+    c = datos.columnas
+    filtro = getattr(secretaria, 'pk', secretaria)
+    grupos = {}  # (secretaría, empleado) -> [décimas, cargas, departamento de la carga]
+    for empleado, depto, sec, decimas in zip(c['empleado_id'], c['departamento_imputacion_id'], c['secretaria_id'], c['decimas']):
+        if filtro is not None and sec != filtro or por_secretaria and sec == NULO:
+            continue
+        grupo = grupos.get((sec if por_secretaria else None, empleado))
+        if grupo is None:
+            grupos[(sec if por_secretaria else None, empleado)] = [decimas, 1, depto]
+        else:
+            grupo[0] += decimas; grupo[1] += 1
+    filas = FilasArchivadas()
+    for (sec, empleado), (decimas, cargas, depto) in grupos.items():
+        legajo, nombre, habitual = datos.empleados[empleado]
+        # Una sola carga: el departamento de imputación; varias: el habitual del empleado
+        departamento = datos.departamentos.get(depto) if cargas == 1 else habitual
+        fila = {'empleado_pk': empleado, 'nombre': nombre, 'documento': legajo, 'depto_habitual': habitual,
+                'total_horas': Decimal(decimas).scaleb(-1), 'cargas': cargas, 'departamento': '-' if departamento is None else departamento}
+        if por_secretaria:
+            fila.update(secretaria_pk=sec, secretaria_nombre=datos.secretarias[sec])
+        filas.append(fila)
+    filas.sort(key=lambda f: (f['secretaria_nombre'], f['nombre'], f['empleado_pk']) if por_secretaria else (f['nombre'], f['empleado_pk']))
+    return filas
+
+# --- MANIFIESTO ---
+def leer_manifiesto():
+    try:
+        with open(os.path.join(directorio_archivo(), MANIFIESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'periodos': {}}
+
+def _registrar_en_manifiesto(periodo, sha256, filas, decimas):
+    manifiesto = leer_manifiesto()
+    ruta = ruta_periodo(periodo.pk)
+    manifiesto['periodos'][str(periodo.pk)] = {
+        'nombre': periodo.nombre, 'fecha_inicio': periodo.fecha_inicio.isoformat(), 'fecha_fin': periodo.fecha_fin.isoformat(),
+        'archivo': os.path.basename(ruta), 'bytes': os.path.getsize(ruta), 'sha256': sha256,
+        'filas': filas, 'total_horas': str(Decimal(decimas).scaleb(-1)), 'archivado': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    _escribir_atomico(os.path.join(directorio_archivo(), MANIFIESTO), [json.dumps(manifiesto, ensure_ascii=False, indent=2).encode('utf-8')])
+
+# --- ARCHIVAR ---
+def fecha_limite(hoy=None, meses=None):
+    # Se archivan los períodos que terminaron antes de esta fecha
+    hoy = hoy or datetime.date.today()
+    meses = antiguedad_meses() if meses is None else meses
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    return hoy.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+def candidatos(limite=None):
+    return Periodo.objects.filter(cerrado=True, archivado=False, fecha_fin__lt=limite or fecha_limite()).order_by('fecha_inicio')
+
+def archivar_periodo(periodo):
+    # Escribe el archivo, lo relee y compara con la base, y recién ahí borra los registros.
+    # Devuelve (filas, bytes). Si algo falla la transacción se deshace y el archivo queda huérfano.
+    with transaction.atomic():
+        periodo = Periodo.objects.select_for_update().get(pk=periodo.pk)
+        if not periodo.cerrado or periodo.archivado:
+            raise ErrorArchivo(f'⛔ {periodo.nombre}: solo se archivan períodos cerrados y sin archivar.')
+        columnas, diccionarios = columnas_periodo(periodo)
+        ruta = ruta_periodo(periodo.pk)
+        sha256 = escribir(ruta, periodo, columnas, diccionarios)
+        _leer_cacheado.cache_clear()
+        copia = leer(ruta)
+        base = RegistroHora.objects.filter(periodo=periodo).aggregate(total=Sum('cantidad_horas'))['total'] or Decimal('0')
+        if copia.filas != len(columnas['id']) or Decimal(copia.total_decimas()).scaleb(-1) != base:
+            raise ErrorArchivo(f'❌ {periodo.nombre}: el archivo no coincide con la base.')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(RegistroHora._meta.db_table)} WHERE periodo_id = %s', [periodo.pk])
+        # save() y no update(): las señales invalidan las cachés del dashboard y de los filtros
+        periodo.archivado = True
+        periodo.save(update_fields=['archivado'])
+        transaction.on_commit(lambda: _registrar_en_manifiesto(periodo, sha256, copia.filas, copia.total_decimas()))
+    return copia.filas, os.path.getsize(ruta)
+
+def verificar():
+    # [(período, problema)] de los períodos archivados: archivo, sha256 del manifiesto y totales del resumen
+    manifiesto = leer_manifiesto()['periodos']
+    problemas = []
+    for periodo in Periodo.objects.filter(archivado=True).order_by('fecha_inicio'):
+        entrada = manifiesto.get(str(periodo.pk))
+        try:
+            datos = leer(ruta_periodo(periodo.pk))
+        except (OSError, ErrorArchivo, ValueError) as e:
+            problemas.append((periodo, str(e))); continue
+        resumen = ResumenHoras.objects.filter(periodo=periodo).aggregate(filas=Sum('cantidad_registros'), total=Sum('total_horas'))
+        if entrada is None or entrada['sha256'] != _sha256_archivo(ruta_periodo(periodo.pk)):
+            problemas.append((periodo, 'el archivo no coincide con el manifiesto'))
+        if (datos.filas, Decimal(datos.total_decimas()).scaleb(-1)) != ((resumen['filas'] or 0), (resumen['total'] or Decimal('0'))):
+            problemas.append((periodo, 'los totales no coinciden con el resumen'))
+    return problemas
+
+def _sha256_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
@@ -0,0 +1,421 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+
+# ====================================================================
+# COPIAS DE SEGURIDAD DE LA BASE SQLITE
+# ====================================================================
+# La copia se hace con la API de backup en línea de SQLite, por tandas de
+# páginas y con una pausa entre tandas: el servidor sigue escribiendo y la
+# copia resultante es consistente. La copia va a un .sqlite3 temporal en la
+# misma carpeta del backup (hace falta lugar en disco para una base más) y se
+# comprime y hashea por tramos de TAMANIO_BLOQUE al .gz, con un .sha256 al
+# lado compatible con `sha256sum -c`; después se borra. La base nunca se carga
+# entera en memoria.
+#
+# Modo incremental: la copia temporal se lee en bloques alineados a páginas de
+# SQLite, cada bloque se guarda una sola vez (comprimido, nombrado por su
+# sha256) y cada snapshot es un manifiesto JSON con la lista de bloques.
+# Un snapshot nuevo solo agrega los bloques que cambiaron. Los bloques se
+# escriben antes que el manifiesto (y los que ya existen no se reescriben):
+# crear_incremental, la retención y la recolección de bloques toman el mismo
+# candado de archivo para no borrar bloques de un snapshot a medio escribir.
+#
+# El archivo en frío (ARCHIVO_DIR, ver archivo.py) tiene los únicos datos de los
+# registros archivados: va en cada copia. En la completa, un .archivo.tar.gz al
+# lado del .sqlite3.gz; en la incremental, cada archivo como un bloque más
+# (no cambian una vez escritos: se guardan una sola vez). Se copia después de
+# la base, así cada período archivado en la copia tiene su archivo.
+
+PREFIJO = 'db_backup_'
+FORMATO_FECHA = '%Y-%m-%d_%H-%M-%S'
+PATRON_ARCHIVO = re.compile(rf'^{PREFIJO}(\d{{4}}-\d{{2}}-\d{{2}}_\d{{2}}-\d{{2}}-\d{{2}})\.sqlite3(\.gz)?$')
+PATRON_MANIFIESTO = re.compile(r'^db_incremental_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$')
+PAGINAS_POR_BLOQUE = 16
+SUFIJO_ARCHIVO = '.archivo.tar.gz'
+RETENCION_POR_DEFECTO = {'horarios': 24, 'diarios': 30, 'mensuales': 12}
+TAMANIO_BLOQUE = 1024 * 1024
+
+def directorio_backups():
+    return getattr(settings, 'BACKUPS_DIR', os.path.join(settings.BASE_DIR, 'backups'))
+
+def directorio_incrementales(directorio=None):
+    return os.path.join(directorio or directorio_backups(), 'incrementales')
+
+def retencion():
+    return {**RETENCION_POR_DEFECTO, **getattr(settings, 'BACKUP_RETENCION', {})}
+
+def ruta_base_datos():
+    return str(settings.DATABASES['default']['NAME'])
+
+def archivos_en_frio():
+    # [(nombre, ruta)] de ARCHIVO_DIR: un .col por período archivado y el manifiesto
+    from .archivo import directorio_archivo
+    carpeta = directorio_archivo()
+    if not os.path.isdir(carpeta):
+        return []
+    return sorted((n, os.path.join(carpeta, n)) for n in os.listdir(carpeta) if not n.endswith('.tmp') and os.path.isfile(os.path.join(carpeta, n)))
+
+def ruta_archivo_en_frio(ruta):
+    # El .tar.gz del archivo en frío que acompaña a un backup completo
+    return re.sub(r'\.sqlite3(\.gz)?$', SUFIJO_ARCHIVO, ruta)
+
+# --- COPIA ---
+@contextmanager
+def copia_en_linea(origen, directorio, paginas=256, pausa=0.01):
+    # Ruta de una copia consistente de la base en un .sqlite3 temporal dentro de 'directorio'; se borra al salir.
+    # paginas=-1 copia todo de una vez; con tandas chicas los escritores no esperan
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix='.sqlite3.tmp'); os.close(fd)
+    try:
+        fuente = sqlite3.connect(pathlib.Path(origen).resolve().as_uri() + '?mode=ro', uri=True)
+        copia = sqlite3.connect(tmp)
+        try:
+            fuente.backup(copia, pages=paginas, sleep=pausa)
+            resultado = copia.execute('PRAGMA quick_check').fetchone()[0]
+            if resultado != 'ok':
+                raise sqlite3.DatabaseError(f'La copia no pasó el quick_check: {resultado}')
+        finally:
+            copia.close(); fuente.close()
+        yield tmp
+    finally:
+        for r in (tmp, f'{tmp}-journal', f'{tmp}-wal', f'{tmp}-shm'):
+            if os.path.exists(r): os.remove(r)
+
+def _escritura_atomica(ruta, datos):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+def sha256_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANIO_BLOQUE), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def escribir_sidecar(ruta, digest):
+    with open(f'{ruta}.sha256', 'w') as f:
+        f.write(f'{digest}  {os.path.basename(ruta)}\n')
+
+def leer_sidecar(ruta):
+    try:
+        with open(f'{ruta}.sha256') as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+def comprimir(origen, nombre, destino):
+    # gzip en streaming por tramos de TAMANIO_BLOQUE; el hash se calcula sobre los bytes comprimidos mientras se escriben
+    h = hashlib.sha256()
+    class _Hasheado:
+        def __init__(self, f): self.f = f
+        def write(self, datos): h.update(datos); return self.f.write(datos)
+        def flush(self): self.f.flush()
+    with open(origen, 'rb') as entrada, open(destino, 'wb') as salida:
+        with gzip.GzipFile(filename=nombre, mode='wb', fileobj=_Hasheado(salida), compresslevel=6) as gz:
+            shutil.copyfileobj(entrada, gz, TAMANIO_BLOQUE)
+    return h.hexdigest()
+
+def crear_backup(directorio=None, paginas=256, pausa=0.01, ahora=None):
+    # Devuelve (ruta del .gz, sha256, tamaño original, tamaño comprimido)
+    directorio = directorio or directorio_backups()
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{PREFIJO}{(ahora or datetime.now()).strftime(FORMATO_FECHA)}.sqlite3.gz"
+    destino = os.path.join(directorio, nombre)
+    with copia_en_linea(ruta_base_datos(), directorio, paginas, pausa) as copia:
+        tamanio = os.path.getsize(copia)
+        fd, tmp_gz = tempfile.mkstemp(dir=directorio, suffix='.gz.tmp'); os.close(fd)
+        try:
+            digest = comprimir(copia, nombre[:-3], tmp_gz)
+            os.replace(tmp_gz, destino)
+            escribir_sidecar(destino, digest)
+        finally:
+            if os.path.exists(tmp_gz): os.remove(tmp_gz)
+    empaquetar_archivo(ruta_archivo_en_frio(destino))
+    return destino, digest, tamanio, os.path.getsize(destino)
+
+def empaquetar_archivo(destino):
+    # .tar.gz de ARCHIVO_DIR con su .sha256; None si no hay nada archivado
+    archivos = archivos_en_frio()
+    if not archivos:
+        return None
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tar.tmp'); os.close(fd)
+    try:
+        with tarfile.open(tmp, 'w:gz') as tar:
+            for nombre, ruta in archivos:
+                tar.add(ruta, arcname=nombre)
+        os.replace(tmp, destino)
+        escribir_sidecar(destino, sha256_archivo(destino))
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    return destino
+
+# --- MODO INCREMENTAL (BLOQUES DEDUPLICADOS) ---
+def _ruta_bloque(base, digest):
+    return os.path.join(base, 'objetos', digest[:2], digest)
+
+@contextmanager
+def candado_incrementales(directorio=None):
+    # Candado exclusivo entre procesos (flock) sobre la carpeta de incrementales
+    base = directorio_incrementales(directorio)
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, '.candado'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def crear_incremental(directorio=None, paginas=256, pausa=0.01, ahora=None):
+    # Devuelve (ruta del manifiesto, bloques totales, bloques nuevos, bytes nuevos comprimidos)
+    with candado_incrementales(directorio):
+        return _crear_incremental(directorio_incrementales(directorio), paginas, pausa, ahora)
+
+def _crear_incremental(base, paginas, pausa, ahora):
+    os.makedirs(base, exist_ok=True)
+    bloques, nuevos, bytes_nuevos, total, tamanio = [], 0, 0, hashlib.sha256(), 0
+    def guardar(bloque):
+        nonlocal nuevos, bytes_nuevos
+        digest = hashlib.sha256(bloque).hexdigest()
+        ruta = _ruta_bloque(base, digest)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            comprimido = zlib.compress(bloque, 6)
+            _escritura_atomica(ruta, comprimido)
+            nuevos += 1; bytes_nuevos += len(comprimido)
+        return digest
+    # La copia se lee bloque a bloque, en orden: en memoria solo está el bloque actual
+    with copia_en_linea(ruta_base_datos(), base, paginas, pausa) as copia, open(copia, 'rb') as f:
+        tamanio_pagina = int.from_bytes(f.read(18)[16:18], 'big')  # del encabezado del archivo SQLite
+        if tamanio_pagina == 1: tamanio_pagina = 65536  # así se guardan las páginas de 64 KiB
+        tamanio_bloque = tamanio_pagina * PAGINAS_POR_BLOQUE
+        f.seek(0)
+        for bloque in iter(lambda: f.read(tamanio_bloque), b''):
+            total.update(bloque); tamanio += len(bloque)
+            bloques.append(guardar(bloque))
+    # Archivo en frío: un bloque por archivo (nombre -> sha256)
+    archivo = {}
+    for nombre, ruta in archivos_en_frio():
+        with open(ruta, 'rb') as f:
+            archivo[nombre] = guardar(f.read())
+    fecha = ahora or datetime.now()
+    manifiesto = {
+        'fecha': fecha.strftime(FORMATO_FECHA), 'tamanio': tamanio,
+        'tamanio_bloque': tamanio_bloque, 'sha256': total.hexdigest(), 'bloques': bloques, 'archivo': archivo,
+    }
+    # El manifiesto se escribe al final: si algo falla antes, el snapshot no existe
+    ruta = os.path.join(base, f"db_incremental_{manifiesto['fecha']}.json")
+    _escritura_atomica(ruta, json.dumps(manifiesto).encode())
+    return ruta, len(bloques) + len(archivo), nuevos, bytes_nuevos
+
+def listar_incrementales(directorio=None):
+    base = directorio_incrementales(directorio)
+    encontrados = []
+    for archivo in os.listdir(base) if os.path.isdir(base) else []:
+        m = PATRON_MANIFIESTO.match(archivo)
+        if m:
+            encontrados.append((datetime.strptime(m.group(1), FORMATO_FECHA), archivo))
+    return sorted(encontrados, reverse=True)
+
+def recolectar_bloques(directorio=None):
+    # Borra los bloques que ya no referencia ningún manifiesto. Devuelve cuántos borró.
+    with candado_incrementales(directorio):
+        return _recolectar_bloques(directorio)
+
+def _recolectar_bloques(directorio):
+    base = directorio_incrementales(directorio)
+    usados = set()
+    for _, archivo in listar_incrementales(directorio):
+        with open(os.path.join(base, archivo)) as f:
+            manifiesto = json.load(f)
+        usados.update(manifiesto['bloques'], manifiesto.get('archivo', {}).values())
+    borrados = 0
+    objetos = os.path.join(base, 'objetos')
+    for carpeta, _, archivos in os.walk(objetos):
+        for archivo in archivos:
+            if archivo not in usados:
+                os.remove(os.path.join(carpeta, archivo)); borrados += 1
+    return borrados
+
+# --- RESTAURACIÓN ---
+class ErrorRestauracion(Exception):
+    pass
+
+def listar_snapshots(directorio=None):
+    # Completos e incrementales juntos: [(fecha, tipo, ruta)] del más nuevo al más viejo
+    directorio = directorio or directorio_backups()
+    snapshots = [(f, 'completo', os.path.join(directorio, a)) for f, a in listar_backups(directorio)]
+    snapshots += [(f, 'incremental', os.path.join(directorio_incrementales(directorio), a)) for f, a in listar_incrementales(directorio)]
+    return sorted(snapshots, key=lambda s: s[0], reverse=True)
+
+def buscar_snapshot(nombre=None, hasta=None, directorio=None):
+    # Por nombre de archivo, o el último snapshot tomado antes de 'hasta' (point-in-time)
+    for fecha, tipo, ruta in listar_snapshots(directorio):
+        if (nombre and os.path.basename(ruta) == nombre) or (not nombre and (hasta is None or fecha <= hasta)):
+            return fecha, tipo, ruta
+    raise ErrorRestauracion(f"❌ No hay ningún snapshot que coincida con '{nombre or hasta}'.")
+
+def _leer_bloque(base, digest):
+    try:
+        with open(_ruta_bloque(base, digest), 'rb') as f:
+            datos = zlib.decompress(f.read())
+    except (OSError, zlib.error) as e:
+        raise ErrorRestauracion(f"❌ Bloque {digest[:12]}… ilegible o faltante: {e}")
+    if hashlib.sha256(datos).hexdigest() != digest:
+        raise ErrorRestauracion(f"❌ El bloque {digest[:12]}… está corrupto.")
+    return datos
+
+def _reconstruir_incremental(ruta_manifiesto, destino, carpeta_archivo):
+    base = os.path.dirname(ruta_manifiesto)
+    with open(ruta_manifiesto) as f:
+        manifiesto = json.load(f)
+    total = hashlib.sha256()
+    with open(destino, 'wb') as salida:
+        for digest in manifiesto['bloques']:
+            datos = _leer_bloque(base, digest)
+            total.update(datos); salida.write(datos)
+    if total.hexdigest() != manifiesto['sha256']:
+        raise ErrorRestauracion('❌ El archivo reconstruido no coincide con el checksum del manifiesto.')
+    for nombre, digest in manifiesto.get('archivo', {}).items():
+        os.makedirs(carpeta_archivo, exist_ok=True)
+        with open(os.path.join(carpeta_archivo, os.path.basename(nombre)), 'wb') as f:
+            f.write(_leer_bloque(base, digest))
+    return bool(manifiesto.get('archivo'))
+
+def _verificar_sidecar(ruta):
+    esperado = leer_sidecar(ruta)
+    if esperado and sha256_archivo(ruta) != esperado:
+        raise ErrorRestauracion(f'❌ {os.path.basename(ruta)} no coincide con su .sha256.')
+
+def _descomprimir_completo(ruta, destino, carpeta_archivo):
+    _verificar_sidecar(ruta)
+    abrir = gzip.open if ruta.endswith('.gz') else open
+    try:
+        with abrir(ruta, 'rb') as entrada, open(destino, 'wb') as salida:
+            shutil.copyfileobj(entrada, salida, TAMANIO_BLOQUE)
+    except (OSError, EOFError) as e:
+        raise ErrorRestauracion(f'❌ No se pudo descomprimir {os.path.basename(ruta)}: {e}')
+    paquete = ruta_archivo_en_frio(ruta)
+    if not os.path.exists(paquete):
+        return False
+    _verificar_sidecar(paquete)
+    try:
+        with tarfile.open(paquete, 'r:gz') as tar:
+            tar.extractall(carpeta_archivo, filter='data')
+    except (OSError, tarfile.TarError) as e:
+        raise ErrorRestauracion(f'❌ No se pudo descomprimir {os.path.basename(paquete)}: {e}')
+    return True
+
+def carpeta_archivo_restaurado(destino):
+    return f'{destino}.archivo'
+
+def restaurar(tipo, ruta, destino):
+    # Reconstruye el snapshot en 'destino' (y el archivo en frío en carpeta_archivo_restaurado)
+    # y corre integrity_check. No toca la base en uso. Devuelve la carpeta del archivo o None.
+    carpeta_archivo = carpeta_archivo_restaurado(destino)
+    shutil.rmtree(carpeta_archivo, ignore_errors=True)
+    if tipo == 'incremental':
+        with candado_incrementales(os.path.dirname(os.path.dirname(ruta))):  # que la recolección no borre bloques a mitad de la lectura
+            con_archivo = _reconstruir_incremental(ruta, destino, carpeta_archivo)
+    else:
+        con_archivo = _descomprimir_completo(ruta, destino, carpeta_archivo)
+    conexion = sqlite3.connect(destino)
+    try:
+        resultado = conexion.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conexion.close()
+    if resultado != 'ok':
+        raise ErrorRestauracion(f'❌ La base restaurada no pasó el integrity_check: {resultado}')
+    return carpeta_archivo if con_archivo else None
+
+def reemplazar_base(origen, destino=None, paginas=-1):
+    # Vuelca la base restaurada sobre la activa con la API de backup (respeta los locks de SQLite).
+    # Después vacía la caché de este proceso: huellas, versiones y series son de la base
+    # anterior (los demás procesos del servidor hay que reiniciarlos).
+    fuente = sqlite3.connect(origen)
+    activa = sqlite3.connect(destino or ruta_base_datos())
+    try:
+        fuente.backup(activa, pages=paginas)
+    finally:
+        activa.close(); fuente.close()
+    cache.clear()
+
+def reemplazar_archivo(origen):
+    # Copia el archivo en frío restaurado sobre ARCHIVO_DIR (cada archivo con reemplazo atómico)
+    from .archivo import directorio_archivo
+    carpeta = directorio_archivo()
+    os.makedirs(carpeta, exist_ok=True)
+    for nombre in sorted(os.listdir(origen)):
+        with open(os.path.join(origen, nombre), 'rb') as f:
+            _escritura_atomica(os.path.join(carpeta, nombre), f.read())
+
+# --- RETENCIÓN ESCALONADA ---
+def listar_backups(directorio=None):
+    # [(fecha, nombre)] de los backups completos (comprimidos o los .sqlite3 viejos), del más nuevo al más viejo
+    directorio = directorio or directorio_backups()
+    encontrados = []
+    for archivo in os.listdir(directorio) if os.path.isdir(directorio) else []:
+        m = PATRON_ARCHIVO.match(archivo)
+        if m:
+            encontrados.append((datetime.strptime(m.group(1), FORMATO_FECHA), archivo))
+    return sorted(encontrados, reverse=True)
+
+def a_conservar(fechas, ahora, horarios, diarios, mensuales):
+    # El más nuevo de cada hora de las últimas N horas, de cada día de los últimos
+    # N días y de cada mes de los últimos N meses. El último backup nunca se borra.
+    conservar, vistos = set(), set()
+    for fecha in sorted(fechas, reverse=True):
+        edad = ahora - fecha
+        meses = (ahora.year - fecha.year) * 12 + ahora.month - fecha.month
+        for nivel, clave, vigente in (
+            ('hora', fecha.strftime('%Y%m%d%H'), edad.total_seconds() < horarios * 3600),
+            ('dia', fecha.strftime('%Y%m%d'), edad.days < diarios),
+            ('mes', fecha.strftime('%Y%m'), meses < mensuales),
+        ):
+            if vigente and (nivel, clave) not in vistos:
+                vistos.add((nivel, clave)); conservar.add(fecha)
+    if fechas:
+        conservar.add(max(fechas))
+    return conservar
+
+def aplicar_retencion(directorio=None, ahora=None, incremental=False, **niveles):
+    # Devuelve la lista de archivos borrados (en modo incremental, manifiestos; los bloques
+    # que quedan sin referencia se recolectan después)
+    directorio = directorio or directorio_backups()
+    if incremental:
+        with candado_incrementales(directorio):
+            return _aplicar_retencion(directorio, ahora, True, niveles)
+    return _aplicar_retencion(directorio, ahora, False, niveles)
+
+def _aplicar_retencion(directorio, ahora, incremental, niveles):
+    niveles = {**retencion(), **{k: v for k, v in niveles.items() if v is not None}}
+    carpeta = directorio_incrementales(directorio) if incremental else directorio
+    backups = listar_incrementales(directorio) if incremental else listar_backups(directorio)
+    conservar = a_conservar([f for f, _ in backups], ahora or datetime.now(), **niveles)
+    borrados = []
+    for fecha, archivo in backups:
+        if fecha in conservar:
+            continue
+        ruta = os.path.join(carpeta, archivo)
+        paquete = None if incremental else ruta_archivo_en_frio(ruta)
+        for r in (ruta, f'{ruta}.sha256', paquete, paquete and f'{paquete}.sha256'):
+            if r and os.path.exists(r): os.remove(r)
+        borrados.append(archivo)
+    return borrados
@@ -0,0 +1,76 @@
+import re
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from .models import Departamento, Empleado, Secretaria
+
+# ====================================================================
+# BÚSQUEDA DE EMPLEADOS CON SQLITE FTS5
+# ====================================================================
+# Tabla virtual TABLA (migración 0008) con una fila por empleado (rowid = id):
+# legajo, nombre, departamento y secretaría. El tokenizador unicode61 con
+# remove_diacritics ignora mayúsculas y acentos ("gomez" encuentra GÓMEZ) y
+# cada palabra buscada se trata como prefijo. Se mantiene desde las señales
+# de models.py; los caminos masivos (importación, datos de prueba) envían
+# empleados_modificados. En otras bases todo esto no hace nada y el admin usa
+# los search_fields de siempre.
+
+TABLA = 'calculos_empleado_busqueda'
+LOTE = 500
+
+def disponible():
+    return connection.vendor == 'sqlite'
+
+def expresion(termino):
+    # 'gomez  ju' -> '"gomez"* "ju"*' (todas las palabras, cada una como prefijo); None si no hay palabras
+    palabras = re.findall(r'\w+', termino or '')
+    return ' '.join(f'"{p}"*' for p in palabras) or None
+
+def coincidencias(termino):
+    # Subconsulta con los ids de los empleados que coinciden (para usar en __in); None si no aplica
+    consulta = expresion(termino)
+    if consulta is None or not disponible():
+        return None
+    return RawSQL(f'SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s', (consulta,))
+
+# --- SINCRONIZACIÓN ---
+def _tablas():
+    return Empleado._meta.db_table, Departamento._meta.db_table, Secretaria._meta.db_table
+
+def _reindexar(condicion=None, params=(), borrar=None):
+    # Borra las filas afectadas y las vuelve a insertar desde las tablas (dos sentencias por tanda)
+    empleado, departamento, secretaria = _tablas()
+    origen = f'FROM {empleado} e LEFT JOIN {departamento} d ON d.id = e.departamento_id LEFT JOIN {secretaria} s ON s.id = d.secretaria_id'
+    donde = f' WHERE {condicion}' if condicion else ''
+    with connection.cursor() as cursor:
+        if borrar is None:
+            cursor.execute(f'DELETE FROM {TABLA}' + (f' WHERE rowid IN (SELECT e.id {origen}{donde})' if condicion else ''), params)
+        else:
+            cursor.execute(f'DELETE FROM {TABLA} WHERE {borrar}', params)
+        cursor.execute(
+            f"INSERT INTO {TABLA} (rowid, legajo, nombre, departamento, secretaria) "
+            f"SELECT e.id, e.legajo, e.nombre_completo, COALESCE(d.nombre, ''), COALESCE(s.nombre, '') {origen}{donde}", params)
+
+def _por_lotes(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), LOTE):
+        yield ids[i:i + LOTE]
+
+def indexar_empleados(ids=None):
+    # ids=None reconstruye todo el índice. Los ids que ya no existen se quitan.
+    if not disponible(): return
+    if ids is None:
+        return _reindexar()
+    for lote in _por_lotes(ids):
+        marcas = ', '.join(['%s'] * len(lote))
+        _reindexar(f'e.id IN ({marcas})', lote, borrar=f'rowid IN ({marcas})')
+
+def indexar_departamentos(ids):
+    # Empleados de esos departamentos (nombre o secretaría cambiados)
+    if not disponible(): return
+    for lote in _por_lotes(ids):
+        _reindexar(f"d.id IN ({', '.join(['%s'] * len(lote))})", lote)
+
+def indexar_secretarias(ids):
+    if not disponible(): return
+    for lote in _por_lotes(ids):
+        _reindexar(f"s.id IN ({', '.join(['%s'] * len(lote))})", lote)
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+
+# ====================================================================
+# CACHÉ EN DISCO DE LOS PDF DE PERÍODOS CERRADOS
+# ====================================================================
+# Cada PDF se guarda en <REPORTES_CACHE_DIR>/<periodo_id>/<destinatario>-<etag>.pdf
+# El ETag combina: período, destinatario, hash de la plantilla y de su hoja de
+# estilos, huella de los datos y la fecha de la nota (el PDF lleva impresa la
+# fecha del día).
+# La huella del resumen por empleado se guarda en la caché con la versión de
+# ResumenHoras del período (conteos.version_resumen, leída de la base): un 304
+# ya no recorre el agregado. Lo que no pasa por el resumen (renombrar un
+# empleado o un departamento) cambia CLAVE_VERSION_MAESTROS desde las señales;
+# en otro worker con caché local se ve al vencer REPORTES_HUELLA_TIMEOUT.
+
+CLAVE_VERSION_MAESTROS = 'calculos:huella:maestros'
+
+def directorio_cache():
+    return getattr(settings, 'REPORTES_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache_reportes'))
+
+def directorio_periodo(periodo_id):
+    return os.path.join(directorio_cache(), str(periodo_id))
+
+@lru_cache(maxsize=16)
+def _hash_archivo(ruta, mtime_ns, tamanio):
+    with open(ruta, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def hash_archivo(ruta):
+    # Se recalcula solo si cambia la fecha de modificación o el tamaño del archivo
+    st = os.stat(ruta)
+    return _hash_archivo(ruta, st.st_mtime_ns, st.st_size)
+
+def hash_plantilla(nombre):
+    return hash_archivo(get_template(nombre).origin.name)
+
+def hash_hoja_pdf():
+    # La hoja de estilos del PDF vive aparte de la plantilla (ver render_pdf.py)
+    from django.contrib.staticfiles import finders
+    from .render_pdf import HOJA_PDF
+    ruta = finders.find(HOJA_PDF)
+    return hash_archivo(ruta) if ruta else ''
+
+def _huella_resumen(periodo):
+    from .reportes import UN_DECIMAL
+    from .resumenes import resumen_por_empleado
+    h = hashlib.sha256()
+    for fila in resumen_por_empleado(periodo).iterator():
+        # Con un decimal fijo: SQLite devuelve las sumas sin escala (39 y no 39.0) y el archivo en frío con escala
+        h.update(f"{fila['documento']}|{fila['nombre']}|{fila['departamento']}|{fila['total_horas'].quantize(UN_DECIMAL)}".encode())
+    return h.hexdigest()
+
+def huella_datos(periodo):
+    # Todo lo que se imprime en el PDF: datos del período y el resumen por empleado
+    from .conteos import version_resumen
+    clave = f"calculos:huella:{periodo.pk}:{version_resumen(periodo.pk)}:{cache.get(CLAVE_VERSION_MAESTROS) or 0}"
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = _huella_resumen(periodo)
+        cache.set(clave, resumen, getattr(settings, 'REPORTES_HUELLA_TIMEOUT', 3600))
+    return hashlib.sha256(f"{periodo.pk}|{periodo.nombre}|{periodo.fecha_inicio}|{periodo.fecha_fin}|{resumen}".encode()).hexdigest()
+
+class EntradaCache:
+    # 'huella': la de huella_datos(periodo) si ya se calculó (p. ej. varios destinatarios del mismo período)
+    def __init__(self, periodo, destinatario, plantilla, fecha_nota, huella=None):
+        self.periodo = periodo
+        self.destinatario = destinatario
+        clave = f"{periodo.pk}|{destinatario}|{hash_plantilla(plantilla)}|{hash_hoja_pdf()}|{huella or huella_datos(periodo)}|{fecha_nota}"
+        self.etag = hashlib.sha256(clave.encode()).hexdigest()
+        self.ruta = os.path.join(directorio_periodo(periodo.pk), f"{destinatario}-{self.etag}.pdf")
+
+    def leer(self):
+        try:
+            with open(self.ruta, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def guardar(self, contenido):
+        carpeta = os.path.dirname(self.ruta)
+        os.makedirs(carpeta, exist_ok=True)
+        # Escritura atómica: archivo temporal + rename, así nunca se sirve un PDF a medias
+        fd, tmp = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(contenido)
+            os.replace(tmp, self.ruta)
+        except OSError:
+            if os.path.exists(tmp): os.remove(tmp)
+            return
+        # Borramos versiones anteriores del mismo destinatario (otra fecha o datos viejos)
+        for archivo in os.listdir(carpeta):
+            if archivo.startswith(f"{self.destinatario}-") and archivo.endswith('.pdf') and os.path.join(carpeta, archivo) != self.ruta:
+                try: os.remove(os.path.join(carpeta, archivo))
+                except OSError: pass
+
+def invalidar_maestros():
+    cache.set(CLAVE_VERSION_MAESTROS, time.time_ns(), None)
+
+def invalidar_periodo(periodo_id):
+    if periodo_id:
+        shutil.rmtree(directorio_periodo(periodo_id), ignore_errors=True)
@@ -0,0 +1,107 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from .models import CierrePeriodo, Periodo, RegistroHora, ResumenHoras
+
+# ====================================================================
+# CIERRE Y REAPERTURA DE PERÍODOS
+# ====================================================================
+# Todo ocurre en una transacción: primero se toma el lock de escritura (con
+# SQLite en modo IMMEDIATE lo toma el BEGIN; en otras bases, select_for_update
+# sobre los períodos), luego se validan todos los registros con una sola
+# consulta agregada y recién ahí se marcan los períodos y se guarda la foto
+# inmutable de los totales (CierrePeriodo). RegistroHora.save() vuelve a
+# mirar 'cerrado' dentro de su propia transacción, así que ninguna carga en
+# curso entra después del cierre.
+# Reglas que impiden cerrar (validar):
+# - registros de más de 180hs sin confirmar, como en la carga manual;
+# - registros sin departamento de imputación: no tienen Secretaría, así que
+#   no entran en los totales ni en el lote por Secretaría, y con el período
+#   cerrado ya no se pueden corregir. save() completa el departamento con el
+#   del empleado; quedan vacíos los de empleados sin área y los cargados por
+#   caminos masivos.
+
+TOPE_HORAS = 180
+
+class ErrorCierre(Exception):
+    def __init__(self, errores):
+        self.errores = errores  # {período: [mensajes]}
+        super().__init__('; '.join(f"{p.nombre}: {' '.join(m)}" for p, m in errores.items()))
+
+def _totales(periodo_ids):
+    # Una consulta para todos los períodos: totales y problemas que impiden el cierre
+    filas = (RegistroHora.objects.filter(periodo_id__in=periodo_ids).values('periodo_id')
+        .annotate(
+            total_horas=Sum('cantidad_horas'), cantidad_registros=Count('pk'), cantidad_empleados=Count('empleado', distinct=True),
+            sin_confirmar=Count('pk', filter=Q(cantidad_horas__gt=TOPE_HORAS, confirmar_exceso=False)),
+            sin_departamento=Count('pk', filter=Q(departamento_imputacion__isnull=True)),
+        ).order_by())
+    return {f['periodo_id']: f for f in filas}
+
+def _detalle(periodo_ids):
+    detalle = {}
+    for f in (ResumenHoras.objects.filter(periodo_id__in=periodo_ids, cantidad_registros__gt=0)
+            .values('periodo_id', 'secretaria__nombre', 'departamento__nombre', 'total_horas', 'cantidad_registros')
+            .order_by('secretaria__nombre', 'departamento__nombre')):
+        detalle.setdefault(f['periodo_id'], []).append({
+            'secretaria': f['secretaria__nombre'], 'departamento': f['departamento__nombre'],
+            'total_horas': str(f['total_horas']), 'cantidad_registros': f['cantidad_registros'],
+        })
+    return detalle
+
+def _registrar(periodos, operacion, usuario):
+    ids = [p.pk for p in periodos]
+    totales, detalle = _totales(ids), _detalle(ids)
+    CierrePeriodo.objects.bulk_create([CierrePeriodo(
+        periodo=p, operacion=operacion, usuario=usuario,
+        total_horas=(totales.get(p.pk, {}).get('total_horas') or Decimal('0')).quantize(Decimal('0.1')),
+        cantidad_registros=totales.get(p.pk, {}).get('cantidad_registros', 0),
+        cantidad_empleados=totales.get(p.pk, {}).get('cantidad_empleados', 0),
+        detalle=detalle.get(p.pk, []),
+    ) for p in periodos])
+
+def _bloquear(periodos):
+    return list(Periodo.objects.select_for_update().filter(pk__in=[getattr(p, 'pk', p) for p in periodos]).order_by('fecha_inicio'))
+
+def validar(periodos):
+    # {período: [mensajes]} con los que no se pueden cerrar
+    totales = _totales([p.pk for p in periodos])
+    errores = {}
+    for p in periodos:
+        t = totales.get(p.pk, {})
+        mensajes = []
+        if t.get('sin_confirmar'):
+            mensajes.append(f"⚠️ {t['sin_confirmar']} registro(s) superan las {TOPE_HORAS}hs sin confirmar.")
+        if t.get('sin_departamento'):
+            mensajes.append(f"⚠️ {t['sin_departamento']} registro(s) sin departamento de imputación.")
+        if mensajes: errores[p] = mensajes
+    return errores
+
+def validar_reapertura(periodos):
+    return {p: ["⛔ Está archivado: sus registros ya no están en la base."] for p in periodos if p.archivado}
+
+def cerrar_periodos(periodos, usuario=None):
+    # Cierra todos o ninguno. Devuelve la lista de períodos cerrados (los ya cerrados se ignoran).
+    with transaction.atomic():
+        abiertos = [p for p in _bloquear(periodos) if not p.cerrado]
+        errores = validar(abiertos)
+        if errores:
+            raise ErrorCierre(errores)
+        for p in abiertos:
+            # save() y no update(): las señales invalidan las cachés de PDF y del dashboard
+            p.cerrado = True
+            p.save(update_fields=['cerrado'])
+        _registrar(abiertos, CierrePeriodo.CIERRE, usuario)
+    return abiertos
+
+def reabrir_periodos(periodos, usuario=None):
+    with transaction.atomic():
+        cerrados = [p for p in _bloquear(periodos) if p.cerrado]
+        errores = validar_reapertura(cerrados)
+        if errores:
+            raise ErrorCierre(errores)
+        for p in cerrados:
+            p.cerrado = False
+            p.save(update_fields=['cerrado'])
+        _registrar(cerrados, CierrePeriodo.REAPERTURA, usuario)
+    return cerrados
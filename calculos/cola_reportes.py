@@ -0,0 +1,151 @@
+import datetime
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import multiprocessing
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .cache_reportes import EntradaCache
+from .models import TrabajoReporte
+from .worker_pdf import inicializar, renderizar_html
+from .reportes import PLANTILLA_PDF, contexto_reporte, fecha_nota, html_reporte, normalizar_destinatario
+
+# ====================================================================
+# COLA LOCAL DE RENDERIZADO DE PDF (SIN BROKER EXTERNO)
+# ====================================================================
+# El request solo calcula la huella (en caché) y crea el trabajo. El contexto y
+# el HTML se arman en un hilo del proceso web (_hilos) y el paso pesado de
+# WeasyPrint va a un pool de procesos. El estado de cada trabajo queda en la
+# tabla TrabajoReporte, así cualquier worker puede consultarlo.
+# El ZIP de cierre de un período (lote_reportes) es otro trabajo más, con
+# destinatario CIERRE_ZIP: se arma en _hilos y se descarga igual que un PDF.
+
+CIERRE_ZIP = 'cierre'
+
+_pool = None
+_pool_lock = threading.Lock()
+_hilos = ThreadPoolExecutor(max_workers=2, thread_name_prefix='reportes')
+
+def obtener_pool(descartar=None):
+    global _pool
+    with _pool_lock:
+        if descartar is not None and _pool is descartar:
+            # Un hijo murió (p. ej. sin memoria): el pool queda inutilizable y hay que recrearlo
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            # 'spawn' evita heredar hilos y conexiones abiertas del servidor web
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'REPORTES_WORKERS', None),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=inicializar,
+            )
+        return _pool
+
+def enviar_al_pool(html_string, base_url):
+    # Future (concurrent.futures) con los bytes del PDF
+    pool = obtener_pool()
+    try:
+        return pool.submit(renderizar_html, html_string, base_url)
+    except BrokenProcessPool:
+        return obtener_pool(descartar=pool).submit(renderizar_html, html_string, base_url)
+
+def _marcar_error(trabajo_id, error):
+    TrabajoReporte.objects.filter(pk=trabajo_id).update(estado=TrabajoReporte.ERROR, error=error, actualizado=timezone.now())
+
+def _preparar(trabajo_id, entrada, nota, base_url):
+    # Corre en _hilos: consultas del contexto, HTML y envío al pool de procesos
+    try:
+        html_string = html_reporte(contexto_reporte(entrada.periodo, entrada.destinatario, nota))
+        futuro = enviar_al_pool(html_string, base_url)
+    except Exception as e:
+        _marcar_error(trabajo_id, str(e))
+        return
+    finally:
+        close_old_connections()
+    futuro.add_done_callback(partial(_finalizar, trabajo_id, entrada))
+
+def _finalizar(trabajo_id, entrada, futuro):
+    # Corre en el hilo del pool dentro del proceso web: como al final de un request,
+    # se cierran las conexiones vencidas o rotas de ese hilo
+    try:
+        entrada.guardar(futuro.result())
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoReporte.LISTO, archivo=entrada.ruta, actualizado=timezone.now())
+    except Exception as e:
+        _marcar_error(trabajo_id, str(e))
+    finally:
+        close_old_connections()
+
+def _generar_zip(trabajo_id, periodo, ruta, nota, base_url):
+    from .lote_reportes import generar_zip_cierre
+    carpeta = os.path.dirname(ruta)
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                generar_zip_cierre([periodo], f, base_url, nota=nota)
+            os.replace(tmp, ruta)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(estado=TrabajoReporte.LISTO, archivo=ruta, actualizado=timezone.now())
+        for archivo in os.listdir(carpeta):
+            if archivo.startswith(f"{CIERRE_ZIP}-") and archivo.endswith('.zip') and os.path.join(carpeta, archivo) != ruta:
+                try: os.remove(os.path.join(carpeta, archivo))
+                except OSError: pass
+    except Exception as e:
+        _marcar_error(trabajo_id, str(e))
+    finally:
+        close_old_connections()
+
+def expirar_trabajos_colgados():
+    # Si el proceso que renderizaba murió, el trabajo nunca se completa: lo marcamos como error
+    limite = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'REPORTES_TRABAJO_TIMEOUT', 300))
+    TrabajoReporte.objects.filter(estado__in=[TrabajoReporte.PENDIENTE, TrabajoReporte.PROCESANDO], actualizado__lt=limite).update(
+        estado=TrabajoReporte.ERROR, error="El renderizado no terminó a tiempo.", actualizado=timezone.now())
+
+def _reutilizable(periodo, destinatario, etag):
+    # Un trabajo en curso (o terminado, con su archivo todavía en disco) con la misma huella
+    existente = TrabajoReporte.objects.filter(periodo=periodo, destinatario=destinatario, etag=etag).exclude(estado=TrabajoReporte.ERROR).first()
+    if existente and (existente.estado != TrabajoReporte.LISTO or os.path.exists(existente.archivo)):
+        return existente
+    return None
+
+def encolar_reporte(periodo, destinatario, base_url):
+    destinatario = normalizar_destinatario(destinatario)
+    nota = fecha_nota()
+    entrada = EntradaCache(periodo, destinatario, PLANTILLA_PDF, nota)
+    expirar_trabajos_colgados()
+
+    existente = _reutilizable(periodo, destinatario, entrada.etag)
+    if existente:
+        return existente
+
+    if entrada.leer() is not None:
+        return TrabajoReporte.objects.create(periodo=periodo, destinatario=destinatario, etag=entrada.etag, estado=TrabajoReporte.LISTO, archivo=entrada.ruta)
+
+    trabajo = TrabajoReporte.objects.create(periodo=periodo, destinatario=destinatario, etag=entrada.etag, estado=TrabajoReporte.PROCESANDO)
+    # Después del commit: el hilo tiene que ver el trabajo creado
+    transaction.on_commit(lambda: _hilos.submit(_preparar, trabajo.pk, entrada, nota, base_url))
+    return trabajo
+
+def encolar_cierre(periodo, base_url):
+    # Misma huella que los PDF del período (datos, plantilla y fecha de la nota)
+    nota = fecha_nota()
+    entrada = EntradaCache(periodo, CIERRE_ZIP, PLANTILLA_PDF, nota)
+    expirar_trabajos_colgados()
+
+    existente = _reutilizable(periodo, CIERRE_ZIP, entrada.etag)
+    if existente:
+        return existente
+
+    ruta = os.path.splitext(entrada.ruta)[0] + '.zip'
+    trabajo = TrabajoReporte.objects.create(periodo=periodo, destinatario=CIERRE_ZIP, etag=entrada.etag, estado=TrabajoReporte.PROCESANDO)
+    transaction.on_commit(lambda: _hilos.submit(_generar_zip, trabajo.pk, periodo, ruta, nota, base_url))
+    return trabajo
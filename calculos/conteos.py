@@ -0,0 +1,80 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Max, Sum
+from django.utils.functional import cached_property
+from .models import RegistroHora, ResumenHoras
+
+# ====================================================================
+# CONTEOS DEL LISTADO DE REGISTROS Y OPCIONES DE FILTROS DEL ADMIN
+# ====================================================================
+# El listado de registros ya no hace COUNT(*) sobre RegistroHora:
+# - Si solo se filtra por período, departamento de imputación y/o la
+#   Secretaría del usuario (lo habitual), la cantidad sale de ResumenHoras
+#   (cantidad_registros por período y departamento), que es exacta y chica.
+#   Los registros sin período no están en el resumen: se cuentan aparte (índice).
+# - Con búsqueda u otros parámetros se hace el COUNT(*) y se guarda en la
+#   caché; la clave lleva la versión del resumen del período filtrado (o de
+#   todo el resumen), así cualquier alta, baja o cambio de registros la vence.
+#   Lo que no pasa por el resumen (p. ej. renombrar un empleado buscado) se
+#   ve al vencer CONTEOS_CACHE_TIMEOUT.
+# Las opciones de los filtros laterales también se guardan en la caché y se
+# invalidan desde las señales de Periodo / Departamento / Secretaria. Con la
+# caché en memoria local, otro worker puede verlas viejas hasta el timeout.
+
+CLAVE_VERSION_OPCIONES = 'calculos:opciones_filtro:version'
+
+def _timeout():
+    return getattr(settings, 'CONTEOS_CACHE_TIMEOUT', 300)
+
+# --- CONTEOS ---
+def desde_resumen(periodo_id=None, departamento_id=None, secretaria_id=None):
+    # Cantidad de registros con esos filtros (None = sin filtrar por ese campo)
+    filtros = {k: v for k, v in (('periodo_id', periodo_id), ('departamento_id', departamento_id), ('secretaria_id', secretaria_id)) if v is not None}
+    # Los períodos archivados conservan el resumen pero ya no tienen registros en la tabla
+    total = ResumenHoras.objects.filter(periodo__archivado=False, **filtros).aggregate(n=Sum('cantidad_registros'))['n'] or 0
+    if periodo_id is None:
+        filtros = {k.replace('departamento_id', 'departamento_imputacion_id'): v for k, v in filtros.items()}
+        total += RegistroHora.objects.filter(periodo__isnull=True, **filtros).count()
+    return total
+
+def version_resumen(periodo_id=None):
+    # Cambia con cada alta, baja o modificación de registros del período (o de cualquiera)
+    filas = ResumenHoras.objects.filter(periodo_id=periodo_id) if periodo_id is not None else ResumenHoras.objects.filter(periodo__archivado=False)
+    v = filas.aggregate(actualizado=Max('actualizado'), cantidad=Sum('cantidad_registros'))
+    return f"{v['actualizado'].timestamp() if v['actualizado'] else 0}:{v['cantidad'] or 0}"
+
+def contar_cacheado(queryset, periodo_id=None):
+    sql, params = queryset.order_by().query.sql_with_params()
+    clave = 'calculos:conteo:' + hashlib.sha256(f'{sql}|{params}|{version_resumen(periodo_id)}'.encode()).hexdigest()
+    cantidad = cache.get(clave)
+    if cantidad is None:
+        cantidad = queryset.count()
+        cache.set(clave, cantidad, _timeout())
+    return cantidad
+
+class PaginadorConteo(Paginator):
+    # 'conteo' (opcional): función que devuelve la cantidad total sin COUNT(*) sobre la lista
+    def __init__(self, *args, conteo=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._conteo = conteo
+
+    @cached_property
+    def count(self):
+        return self._conteo() if self._conteo is not None else super().count
+
+# --- OPCIONES DE FILTROS ---
+def opciones_filtro(modelo, orden, obtener):
+    version = cache.get(CLAVE_VERSION_OPCIONES) or 0
+    clave = f'calculos:opciones_filtro:{modelo._meta.label_lower}:{",".join(orden or ())}:{version}'
+    opciones = cache.get(clave)
+    if opciones is None:
+        opciones = obtener()
+        cache.set(clave, opciones, _timeout())
+    return opciones
+
+def invalidar_opciones_filtro():
+    # Nueva versión: las claves anteriores quedan huérfanas hasta vencer
+    cache.set(CLAVE_VERSION_OPCIONES, time.time_ns(), None)
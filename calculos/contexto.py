@@ -0,0 +1,31 @@
+from .models import Periodo, Secretaria
+
+# ====================================================================
+# CONTEXTO POR PETICIÓN: PERÍODO ACTIVO Y SECRETARÍA DEL USUARIO
+# ====================================================================
+# Cada valor se resuelve una sola vez por request (se memoriza en el propio
+# request). No se guarda entre requests: con varios workers una copia en la
+# caché local quedaría vieja tras cambiar el período activo o el perfil de un
+# usuario, y de estos valores dependen el período de las altas y el filtro de
+# filas del secretario. Las dos consultas son por índice y devuelven una fila.
+
+def _memorizar(request, atributo, obtener):
+    if request is not None and atributo in request.__dict__:
+        return request.__dict__[atributo]
+    valor = obtener()
+    if request is not None:
+        request.__dict__[atributo] = valor
+    return valor
+
+def periodo_activo(request=None):
+    return _memorizar(request, '_periodo_activo', lambda: Periodo.objects.filter(activo=True).first())
+
+def periodo_activo_id(request=None):
+    p = periodo_activo(request)
+    return p.pk if p else None
+
+def secretaria_usuario(request):
+    usuario = request.user
+    if not usuario.is_authenticated:
+        return None
+    return _memorizar(request, '_secretaria_usuario', lambda: Secretaria.objects.filter(perfilusuario__usuario=usuario).first())
@@ -0,0 +1,100 @@
+import datetime
+import random
+from decimal import Decimal
+from django.db import connection, transaction
+from .models import CierrePeriodo, Departamento, Empleado, PerfilUsuario, Periodo, RegistroHora, ResumenHoras, Secretaria, TrabajoReporte, empleados_modificados, registros_modificados
+
+# ====================================================================
+# DATOS SINTÉTICOS A ESCALA MUNICIPAL (PRUEBAS DE RENDIMIENTO)
+# ====================================================================
+# Con la misma semilla y los mismos parámetros se obtiene siempre el mismo
+# conjunto de datos. Todo se inserta con bulk_create: el resumen materializado,
+# las cachés y el índice de búsqueda se actualizan al final con las señales
+# registros_modificados / empleados_modificados, como en los demás caminos masivos.
+
+SECRETARIAS = (
+    'Gobierno', 'Hacienda', 'Obras Públicas', 'Servicios Públicos', 'Desarrollo Social', 'Salud',
+    'Cultura', 'Deportes', 'Producción', 'Ambiente', 'Planeamiento', 'Turismo', 'Educación', 'Seguridad',
+)
+AREAS = (
+    'Mesa de Entradas', 'Despacho', 'Personal', 'Compras', 'Tesorería', 'Contaduría', 'Rentas', 'Catastro',
+    'Mantenimiento', 'Talleres', 'Alumbrado', 'Barrido', 'Recolección', 'Espacios Verdes', 'Cementerio',
+    'Tránsito', 'Inspección', 'Bromatología', 'Acción Social', 'Atención Primaria', 'Biblioteca', 'Informática',
+)
+NOMBRES = (
+    'JUAN', 'MARÍA', 'CARLOS', 'ANA', 'JOSÉ', 'LAURA', 'LUIS', 'SILVIA', 'JORGE', 'GRACIELA', 'MIGUEL', 'PATRICIA',
+    'RAÚL', 'MÓNICA', 'DANIEL', 'CLAUDIA', 'HUGO', 'ANDREA', 'OMAR', 'VERÓNICA', 'SERGIO', 'ROMINA', 'WALTER', 'NATALIA',
+)
+APELLIDOS = (
+    'GÓMEZ', 'FERNÁNDEZ', 'RODRÍGUEZ', 'GONZÁLEZ', 'LÓPEZ', 'MARTÍNEZ', 'PÉREZ', 'SÁNCHEZ', 'ROMERO', 'SOSA',
+    'ÁLVAREZ', 'TORRES', 'RUIZ', 'RAMÍREZ', 'FLORES', 'BENÍTEZ', 'ACOSTA', 'MEDINA', 'HERRERA', 'AGUIRRE',
+    'BALTIERI', 'GIMÉNEZ', 'MOLINA', 'SILVA', 'CASTRO', 'ROJAS', 'ORTIZ', 'NÚÑEZ', 'LUNA', 'JUÁREZ',
+)
+LEGAJO_INICIAL = 10001
+LOTE = 2000
+
+def hay_datos():
+    return Empleado.objects.exists() or Periodo.objects.exists()
+
+def borrar_todo():
+    # DELETE directo: con cientos de miles de registros, el borrado en cascada de Django
+    # traería cada fila a memoria para disparar las señales por objeto
+    from .conteos import invalidar_opciones_filtro
+    with transaction.atomic(), connection.cursor() as cursor:
+        PerfilUsuario.objects.filter(secretaria__isnull=False).update(secretaria=None)
+        for modelo in (ResumenHoras, CierrePeriodo, TrabajoReporte, RegistroHora, Empleado, Periodo, Departamento, Secretaria):
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}')
+        empleados_modificados.send(sender=Empleado, empleado_ids=None)
+    invalidar_opciones_filtro()
+
+def nombre_empleado(azar):
+    return f"{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}, {azar.choice(NOMBRES)} {azar.choice(NOMBRES)}"
+
+def horas(azar):
+    # Mayoría de cargas chicas, algunas grandes y unas pocas por encima del tope (confirmadas)
+    valor = azar.choices((azar.randint(2, 40), azar.randint(40, 120), azar.randint(181, 240)), weights=(80, 19, 1))[0]
+    return Decimal(valor) + Decimal(azar.choice((0, 5))) / 10
+
+def generar(semilla=2024, secretarias=12, departamentos=150, empleados=5000, periodos=48, cobertura=0.85, desde=datetime.date(2021, 1, 1), salida=None):
+    # Devuelve {modelo: cantidad}. 'salida' recibe mensajes de avance (opcional).
+    azar = random.Random(semilla)
+    avisar = salida or (lambda mensaje: None)
+
+    with transaction.atomic():
+        secs = Secretaria.objects.bulk_create([
+            Secretaria(nombre=f"Secretaría de {SECRETARIAS[i % len(SECRETARIAS)]}" + (f" {i // len(SECRETARIAS) + 1}" if i >= len(SECRETARIAS) else ''))
+            for i in range(secretarias)])
+        deptos = Departamento.objects.bulk_create([
+            Departamento(nombre=f"{AREAS[i % len(AREAS)]} {i + 1:03}".upper(), secretaria=azar.choice(secs) if azar.random() > 0.02 else None)
+            for i in range(departamentos)])
+        emps = [Empleado(legajo=str(LEGAJO_INICIAL + i), nombre_completo=nombre_empleado(azar), departamento=azar.choice(deptos)) for i in range(empleados)]
+        for emp in emps: emp.secretaria_id = emp.departamento.secretaria_id  # bulk_create no pasa por save()
+        emps = Empleado.objects.bulk_create(emps, batch_size=LOTE)
+        avisar(f"{len(secs)} secretarías, {len(deptos)} departamentos, {len(emps)} empleados")
+
+        # Períodos mensuales: todos cerrados menos el último, que queda activo
+        pers = []
+        for i in range(periodos):
+            inicio = datetime.date(desde.year + (desde.month - 1 + i) // 12, (desde.month - 1 + i) % 12 + 1, 1)
+            fin = (inicio + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+            pers.append(Periodo(nombre=f"Período {inicio:%m/%Y}", fecha_inicio=inicio, fecha_fin=fin, activo=i == periodos - 1, cerrado=i < periodos - 1))
+        pers = Periodo.objects.bulk_create(pers)
+
+        total = 0
+        for periodo in pers:
+            lote = []
+            for emp in azar.sample(emps, round(len(emps) * cobertura)):
+                cantidad = horas(azar)
+                depto = emp.departamento if azar.random() > 0.1 else azar.choice(deptos)
+                lote.append(RegistroHora(periodo=periodo, empleado=emp, departamento_imputacion=depto, secretaria_id=depto.secretaria_id, cantidad_horas=cantidad, confirmar_exceso=cantidad > 180))
+            RegistroHora.objects.bulk_create(lote, batch_size=LOTE)
+            total += len(lote)
+        avisar(f"{len(pers)} períodos, {total} registros de horas")
+
+    registros_modificados.send(sender=RegistroHora, periodo_ids=[p.pk for p in pers])
+    empleados_modificados.send(sender=Empleado, empleado_ids=None)
+    from .cierres import _registrar
+    from .conteos import invalidar_opciones_filtro
+    _registrar([p for p in pers if p.cerrado], CierrePeriodo.CIERRE, None)
+    invalidar_opciones_filtro()
+    return {'secretarias': len(secs), 'departamentos': len(deptos), 'empleados': len(emps), 'periodos': len(pers), 'registros': total}
@@ -0,0 +1,60 @@
+import csv
+import importlib.util
+import io
+import re
+import tempfile
+from decimal import Decimal
+from .resumenes import resumen_por_empleado
+
+# ====================================================================
+# EXPORTACIÓN DE LA LIQUIDACIÓN (CSV / XLSX) EN STREAMING
+# ====================================================================
+# Mismos datos que el PDF (una fila por empleado), leídos con .iterator()
+# para que la memoria no crezca con el tamaño del período. El CSV se va
+# enviando en bloques; el XLSX se arma con openpyxl en modo write_only sobre
+# un archivo temporal (un .xlsx es un ZIP y no se puede emitir a medias).
+
+COLUMNAS = (('documento', 'Legajo'), ('nombre', 'Nombre'), ('departamento', 'Departamento'), ('total_horas', 'Total horas'))
+TAMANIO_BLOQUE = 64 * 1024
+FILAS_POR_LECTURA = 2000
+
+class ErrorExportacion(Exception):
+    pass
+
+def filas_liquidacion(periodo):
+    # Genera tuplas (legajo, nombre, departamento, total_horas) en el orden del PDF
+    for fila in resumen_por_empleado(periodo).iterator(chunk_size=FILAS_POR_LECTURA):
+        yield tuple(fila[clave].quantize(Decimal('0.1')) if clave == 'total_horas' else fila[clave] for clave, _ in COLUMNAS)
+
+def csv_en_streaming(filas):
+    # Acumula filas en un buffer chico y lo entrega cada TAMANIO_BLOQUE caracteres
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('﻿')  # BOM: Excel abre el archivo como UTF-8
+    escritor.writerow([titulo for _, titulo in COLUMNAS])
+    for fila in filas:
+        escritor.writerow(fila)
+        if buffer.tell() >= TAMANIO_BLOQUE:
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate()
+    yield buffer.getvalue()
+
+def xlsx_disponible():
+    # Sin openpyxl instalado el admin no ofrece el botón XLSX
+    return importlib.util.find_spec('openpyxl') is not None
+
+def xlsx_temporal(filas, titulo):
+    # Devuelve un archivo temporal (posicionado al inicio) con la planilla
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ErrorExportacion("❌ Para exportar a .xlsx hace falta instalar 'openpyxl'. Use la exportación CSV.")
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=re.sub(r'[\[\]:*?/\\]', '-', titulo)[:31] or 'Liquidación')
+    hoja.append([t for _, t in COLUMNAS])
+    for legajo, nombre, departamento, total in filas:
+        hoja.append([legajo, nombre, departamento, float(total)])
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
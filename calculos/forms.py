@@ -0,0 +1,79 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseModelFormSet
+from .cierres import validar, validar_reapertura
+from .models import Periodo
+
+class ImportarHorasForm(forms.Form):
+    archivo = forms.FileField(label="Archivo (CSV o XLSX)", help_text="Columnas: Legajo, Horas y opcionalmente Departamento y 'Confirmar >180hs'.")
+    periodo = forms.ModelChoiceField(queryset=Periodo.objects.filter(cerrado=False), label="Período", help_text="Solo se listan períodos abiertos.")
+    simular = forms.BooleanField(required=False, initial=True, label="Solo simular (no guarda, muestra las diferencias)")
+    omitir_cargadas = forms.BooleanField(required=False, label="Omitir filas ya cargadas", help_text="Saltea las filas iguales (legajo, departamento y horas) a un registro del período, p. ej. al volver a subir el mismo archivo.")
+
+# --- PERÍODOS: EL TILDE 'cerrado' SE VALIDA ANTES DE GUARDAR ---
+class PeriodoForm(forms.ModelForm):
+    # Mismas reglas que cerrar_periodos / reabrir_periodos: si no se puede, el formulario se rechaza sin guardar nada
+    def clean(self):
+        datos = super().clean()
+        if 'cerrado' in self.changed_data:
+            errores = (validar if datos.get('cerrado') else validar_reapertura)([self.instance])
+            if errores:
+                self.add_error('cerrado', ' '.join(m for ms in errores.values() for m in ms))
+        return datos
+
+# --- LISTADO EDITABLE DE REGISTROS: VALIDACIÓN EN MEMORIA ---
+class ModeloPrecargadoField(forms.ModelChoiceField):
+    # Con 'precargados' (dict pk -> objeto) resuelve la opción sin ir a la base
+    precargados = None
+    def to_python(self, value):
+        if self.precargados is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.precargados[str(value)]
+        except KeyError:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+
+class RegistroHoraListaForm(forms.ModelForm):
+    def _get_validation_exclusions(self):
+        # El departamento ya se validó contra las opciones precargadas: evitamos el SELECT
+        # por fila de ForeignKey.validate. RegistroHora.clean() se sigue ejecutando.
+        return super()._get_validation_exclusions() | {'departamento_imputacion'}
+
+class RegistrosEditablesFormSet(BaseModelFormSet):
+    def __init__(self, *args, queryset=None, **kwargs):
+        super().__init__(*args, queryset=queryset, **kwargs)
+        # Al guardar, clean() lee self.periodo.cerrado; save() y el historial del admin, el empleado y su
+        # departamento. Al mostrar se usa el mismo queryset del listado (una copia lo consultaría dos veces)
+        if self.is_bound and queryset is not None and not queryset.query.is_sliced:
+            self.queryset = queryset.select_related('periodo', 'empleado__departamento')
+        self._departamentos = None
+        # Registros de la página por pk, armado una sola vez para los ids ocultos de todas las filas
+        self._registros = {str(o.pk): o for o in self.get_queryset()} if self.is_bound else None
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # El id oculto de cada fila se resuelve con los registros ya leídos, no con un SELECT por fila
+        nombre = self.model._meta.pk.name
+        campo = form.fields.get(nombre)
+        if self.is_bound and isinstance(campo, forms.ModelChoiceField):
+            form.fields[nombre] = ModeloPrecargadoField(campo.queryset, initial=campo.initial, required=False, widget=campo.widget)
+            form.fields[nombre].precargados = self._registros
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        campo = form.fields.get('departamento_imputacion')
+        if isinstance(campo, ModeloPrecargadoField):
+            if self._departamentos is None:
+                # Al validar: todas las opciones permitidas. Al mostrar: solo las de la página.
+                self._departamentos = {str(d.pk): d for d in campo.queryset} if self.is_bound else {
+                    str(r.departamento_imputacion_id): r.departamento_imputacion for r in self.get_queryset() if r.departamento_imputacion_id}
+            campo.precargados = self._departamentos
+        return form
+
+    def clean(self):
+        super().clean()
+        # Re-chequeo de períodos cerrados con una sola consulta (y lock donde la base lo soporta)
+        ids = {f.instance.periodo_id for f in self.forms if f.has_changed() and f.instance.periodo_id}
+        cerrados = list(Periodo.objects.select_for_update().filter(pk__in=ids, cerrado=True).values_list('nombre', flat=True)) if ids else []
+        if cerrados:
+            raise ValidationError(f"⛔ ERROR: El período {', '.join(cerrados)} está CERRADO. No se pueden hacer cambios.")
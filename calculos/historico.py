@@ -0,0 +1,83 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from .contexto import periodo_activo
+from .models import Periodo, ResumenHoras
+from .resumenes import totales_por_periodo, totales_por_secretaria
+
+# ====================================================================
+# DATOS DEL DASHBOARD HISTÓRICO (API JSON)
+# ====================================================================
+# Los totales de los períodos cerrados se guardan en la caché de Django por
+# mucho tiempo (HISTORICO_CACHE_TIMEOUT) bajo una clave con la versión de la
+# base: la última actualización y los conteos del resumen más los períodos
+# cerrados (id, nombre y fecha). Un cierre, una reapertura, un renombre o un
+# recálculo cambian la clave en todos los workers, sin depender de señales
+# (que corren antes del commit) ni de una caché compartida. Los abiertos se
+# recalculan en cada pedido. Cada período lleva una versión (ms de la última
+# actualización de su resumen): con ?since=<versión> el cliente recibe solo
+# los que cambiaron.
+
+CLAVE_CERRADOS = 'calculos:historico:cerrados'
+
+def _timeout():
+    return getattr(settings, 'HISTORICO_CACHE_TIMEOUT', 86400)
+
+def _version(fecha):
+    return int(fecha.timestamp() * 1000) if fecha else 0
+
+def _serie(filas):
+    return [{
+        'id': f['periodo_id'], 'nombre': f['periodo__nombre'], 'fecha_inicio': f['periodo__fecha_inicio'].isoformat(),
+        'total_horas': round(f['total_horas'] or 0, 1), 'version': _version(f['actualizado']),
+    } for f in filas]
+
+def version_cerrados():
+    # Dos consultas chicas (el resumen y los períodos cerrados) contra la agregación de la serie
+    resumen = ResumenHoras.objects.aggregate(actualizado=Max('actualizado'), registros=Sum('cantidad_registros'), filas=Count('pk'))
+    periodos = list(Periodo.objects.filter(cerrado=True).order_by('pk').values_list('pk', 'nombre', 'fecha_inicio'))
+    return hashlib.sha256(repr((_version(resumen['actualizado']), resumen['registros'], resumen['filas'], periodos)).encode()).hexdigest()[:16]
+
+def serie_cerrados():
+    clave = f'{CLAVE_CERRADOS}:{version_cerrados()}'
+    serie = cache.get(clave)
+    if serie is None:
+        serie = _serie(totales_por_periodo(cerrado=True))
+        cache.set(clave, serie, _timeout())
+    return serie
+
+def invalidar_cerrados():
+    # Solo hace falta para medir con la caché vacía (benchmark): los cambios ya cambian la clave
+    cache.delete(f'{CLAVE_CERRADOS}:{version_cerrados()}')
+
+def torta_periodo(periodo):
+    if periodo is None:
+        return {'periodo': 'No Definido', 'labels': ['Sin Datos'], 'datos': [1]}
+    filas = list(totales_por_secretaria(periodo))
+    labels = [f['secretaria_nombre'] for f in filas]
+    datos = [round(f['total_horas'] or 0, 1) for f in filas]
+    if not any(datos): labels = ['Sin Datos']; datos = [1]
+    return {'periodo': periodo.nombre, 'labels': labels, 'datos': datos}
+
+def serie_abiertos():
+    return _serie(totales_por_periodo(cerrado=False))
+
+def torta_activo(request=None):
+    return torta_periodo(periodo_activo(request))
+
+def armar_datos(cerrados, abiertos, torta, desde=None):
+    # 'orden' siempre viaja completo (id y nombre) para que el cliente descarte períodos
+    # borrados y tome los renombres; 'periodos' trae solo lo nuevo si hay 'desde'
+    serie = sorted(cerrados + abiertos, key=lambda p: (p['fecha_inicio'], p['id']))
+    return {
+        'version': max((p['version'] for p in serie), default=0),
+        'completo': desde is None,
+        'orden': [[p['id'], p['nombre']] for p in serie],
+        'periodos': [p for p in serie if desde is None or p['version'] > desde],
+        'torta': torta,
+    }
+
+def datos_historico(request=None, desde=None):
+    # Las tres partes son independientes: la vista async (vistas_async.py) las pide a la vez
+    return armar_datos(serie_cerrados(), serie_abiertos(), torta_activo(request), desde)
@@ -0,0 +1,186 @@
+import csv
+import io
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Sum
+from .models import Departamento, Empleado, Periodo, RegistroHora, registros_modificados
+
+# ====================================================================
+# IMPORTACIÓN MASIVA DE HORAS (CSV / XLSX) PARA RegistroHora
+# ====================================================================
+# Las filas se leen en streaming; empleados y departamentos se resuelven con
+# diccionarios precargados (2 consultas en total) y las reglas de negocio
+# (período cerrado, >180hs) se validan en la misma pasada. La escritura es
+# por lotes con bulk_create dentro de una única transacción: si hay un solo
+# error no se guarda nada.
+# - 'secretaria' (la del usuario del admin): solo se aceptan empleados y
+#   departamentos de imputación de esa Secretaría, como en el alta manual.
+# - Las filas iguales (empleado, departamento y horas) a un registro que ya
+#   está en el período se informan como 'ya_cargadas' (cada registro existente
+#   cubre una sola fila del archivo), también en la simulación. Se cargan igual:
+#   dos cargas reales de las mismas horas son válidas. Solo con
+#   omitir_cargadas=True (p. ej. al volver a subir el mismo archivo) se saltean.
+
+COLUMNAS = {
+    'legajo': ('legajo', 'nº identificación', 'n° identificación', 'numero de legajo', 'número de legajo'),
+    'departamento': ('departamento', 'departamento (imputación)', 'departamento imputacion'),
+    'horas': ('horas', 'cantidad de horas', 'cantidad_horas'),
+    'confirmar': ('confirmar >180hs', 'confirmar', 'confirmar_exceso'),
+}
+VALORES_SI = {'si', 'sí', 's', 'x', '1', 'true', 'verdadero'}
+TOPE_HORAS = Decimal('180')
+MAXIMO_HORAS = Decimal('999.9')  # max_digits=4, decimal_places=1
+
+class ErrorImportacion(Exception):
+    pass
+
+class ResultadoImportacion:
+    def __init__(self, periodo, simulacion):
+        self.periodo = periodo
+        self.simulacion = simulacion
+        self.filas_leidas = 0
+        self.creados = 0
+        self.errores = []    # [(número de fila, mensaje)]
+        self.ya_cargadas = []  # [(número de fila, mensaje)]: iguales a un registro del período
+        self.omitir_cargadas = False  # si esas filas se saltearon
+        self.diferencias = []  # una fila por empleado afectado
+
+    @property
+    def guardado(self):
+        return not self.simulacion and not self.errores
+
+# --- LECTURA EN STREAMING ---
+def _normalizar_encabezados(encabezados):
+    indices = {}
+    for i, nombre in enumerate(encabezados):
+        nombre = str(nombre or '').strip().lower()
+        for clave, alias in COLUMNAS.items():
+            if nombre in alias and clave not in indices:
+                indices[clave] = i
+    for requerida in ('legajo', 'horas'):
+        if requerida not in indices:
+            raise ErrorImportacion(f"❌ Falta la columna '{COLUMNAS[requerida][0].title()}' en el archivo.")
+    return indices
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096); texto.seek(0)
+    try: dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error: dialecto = csv.excel
+    yield from csv.reader(texto, dialecto)
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion("❌ Para importar archivos .xlsx hace falta instalar 'openpyxl'. Guarde la planilla como CSV o instale la librería.")
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+def leer_filas(archivo, nombre_archivo):
+    # Devuelve un iterador de (número de fila, dict con legajo/departamento/horas/confirmar)
+    filas = _filas_xlsx(archivo) if nombre_archivo.lower().endswith('.xlsx') else _filas_csv(archivo)
+    try:
+        indices = _normalizar_encabezados(next(filas))
+    except StopIteration:
+        raise ErrorImportacion("❌ El archivo está vacío.")
+    for numero, fila in enumerate(filas, start=2):
+        if not any(c not in (None, '') for c in fila):
+            continue
+        yield numero, {clave: (fila[i] if i < len(fila) else None) for clave, i in indices.items()}
+
+# --- VALIDACIÓN Y CARGA ---
+def _texto_legajo(valor):
+    # Excel devuelve los números como float (1234.0)
+    if isinstance(valor, float) and valor.is_integer(): valor = int(valor)
+    return str(valor).strip() if valor is not None else ''
+
+def _horas(valor):
+    try:
+        horas = Decimal(str(valor).strip().replace(',', '.')).quantize(Decimal('0.1'))
+    except (InvalidOperation, ValueError):
+        return None
+    return horas if Decimal('0') < horas <= MAXIMO_HORAS else None
+
+def importar_registros(filas, periodo, simulacion=False, tamanio_lote=500, secretaria=None, omitir_cargadas=False):
+    resultado = ResultadoImportacion(periodo, simulacion)
+    resultado.omitir_cargadas = omitir_cargadas
+    if periodo.cerrado:
+        raise ErrorImportacion(f"⛔ ERROR: El período {periodo.nombre} está CERRADO. No se pueden cargar horas.")
+
+    empleados = {legajo: (pk, depto_id, nombre, sec_id) for pk, legajo, depto_id, nombre, sec_id in Empleado.objects.values_list('pk', 'legajo', 'departamento_id', 'nombre_completo', 'secretaria_id')}
+    departamentos, secretarias = {}, {}  # nombre -> id, id -> secretaría (copia denormalizada de cada registro)
+    for pk, nombre, secretaria_id in Departamento.objects.values_list('pk', 'nombre', 'secretaria_id'):
+        departamentos[nombre.upper()] = pk; secretarias[pk] = secretaria_id
+    horas_nuevas = {}
+
+    with transaction.atomic():
+        # Re-chequeo dentro de la transacción: el período pudo cerrarse mientras leíamos el archivo
+        if Periodo.objects.filter(pk=periodo.pk, cerrado=True).exists():
+            raise ErrorImportacion(f"⛔ ERROR: El período {periodo.nombre} fue CERRADO durante la importación.")
+        existentes = Counter(RegistroHora.objects.filter(periodo=periodo).values_list('empleado_id', 'departamento_imputacion_id', 'cantidad_horas'))
+
+        lote = []
+        for numero, fila in filas:
+            resultado.filas_leidas += 1
+            legajo = _texto_legajo(fila.get('legajo'))
+            empleado = empleados.get(legajo)
+            horas = _horas(fila.get('horas'))
+            confirmar = str(fila.get('confirmar') or '').strip().lower() in VALORES_SI
+            nombre_depto = str(fila.get('departamento') or '').strip().upper()
+            depto_id = departamentos.get(nombre_depto) if nombre_depto else (empleado[1] if empleado else None)
+
+            if empleado is None:
+                resultado.errores.append((numero, f"Legajo '{legajo}' inexistente.")); continue
+            if horas is None:
+                resultado.errores.append((numero, f"Cantidad de horas inválida: '{fila.get('horas')}'.")); continue
+            if nombre_depto and depto_id is None:
+                resultado.errores.append((numero, f"Departamento '{nombre_depto}' inexistente.")); continue
+            if secretaria is not None and empleado[3] != secretaria.pk:
+                resultado.errores.append((numero, f"⛔ El legajo {legajo} no pertenece a {secretaria.nombre}.")); continue
+            if secretaria is not None and secretarias.get(depto_id) != secretaria.pk:
+                resultado.errores.append((numero, f"⛔ El departamento de imputación del legajo {legajo} no pertenece a {secretaria.nombre}.")); continue
+            if horas > TOPE_HORAS and not confirmar:
+                resultado.errores.append((numero, f"⚠️ {horas}hs para el legajo {legajo}: supera las 180hs sin confirmar.")); continue
+            if existentes[(empleado[0], depto_id, horas)]:
+                existentes[(empleado[0], depto_id, horas)] -= 1
+                resultado.ya_cargadas.append((numero, f"Legajo {legajo}: {horas}hs ya cargadas en {periodo.nombre}."))
+                if omitir_cargadas: continue
+
+            horas_nuevas[empleado[0]] = horas_nuevas.get(empleado[0], Decimal('0')) + horas
+            if resultado.simulacion or resultado.errores:
+                continue
+            lote.append(RegistroHora(periodo=periodo, empleado_id=empleado[0], departamento_imputacion_id=depto_id, secretaria_id=secretarias.get(depto_id), cantidad_horas=horas, confirmar_exceso=confirmar))
+            if len(lote) >= tamanio_lote:
+                RegistroHora.objects.bulk_create(lote); resultado.creados += len(lote); lote = []
+
+        if lote and not resultado.errores and not resultado.simulacion:
+            RegistroHora.objects.bulk_create(lote); resultado.creados += len(lote)
+
+        if resultado.errores:
+            # Todo o nada: descartamos lo que se haya escrito
+            transaction.set_rollback(True)
+            resultado.creados = 0
+        elif not resultado.simulacion:
+            transaction.on_commit(lambda: registros_modificados.send(sender=RegistroHora, periodo_ids=[periodo.pk]))
+
+    resultado.diferencias = _diferencias(periodo, horas_nuevas, empleados, ya_guardado=resultado.guardado)
+    return resultado
+
+def _diferencias(periodo, horas_nuevas, empleados, ya_guardado):
+    # Horas actuales vs. importadas por empleado (lo que muestra la simulación)
+    if not horas_nuevas:
+        return []
+    actuales = dict(RegistroHora.objects.filter(periodo=periodo, empleado_id__in=list(horas_nuevas))
+        .values_list('empleado_id').annotate(total=Sum('cantidad_horas')).order_by())
+    legajos = {pk: (legajo, nombre) for legajo, (pk, _, nombre, _) in empleados.items() if pk in horas_nuevas}
+    filas = []
+    for empleado_id, nuevas in horas_nuevas.items():
+        total = actuales.get(empleado_id) or Decimal('0')
+        previas = total - nuevas if ya_guardado else total
+        filas.append({'legajo': legajos[empleado_id][0], 'nombre': legajos[empleado_id][1], 'horas_actuales': previas.quantize(Decimal('0.1')), 'horas_importadas': nuevas, 'total_resultante': (previas + nuevas).quantize(Decimal('0.1'))})
+    return sorted(filas, key=lambda f: f['nombre'])
@@ -0,0 +1,162 @@
+import contextvars
+import datetime
+import heapq
+import json
+import logging
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# ====================================================================
+# INSTRUMENTACIÓN POR PETICIÓN (OPCIONAL: INSTRUMENTACION_ACTIVA)
+# ====================================================================
+# El middleware mide el tiempo total de cada request y, con un execute_wrapper
+# en cada conexión, la cantidad de consultas, el tiempo de SQL y las más
+# lentas. Las etapas que se marcan con etapa() (plantilla y WeasyPrint del PDF)
+# suman su tiempo aparte. Lo que supera INSTRUMENTACION_UMBRAL_MS va al log
+# rotativo 'calculos.lentas' (una línea JSON por request) y cada medición se
+# agrega a las muestras por nombre de URL que muestra el panel de rendimiento.
+# Las muestras viven en la caché de Django: con la caché en memoria local
+# cada proceso junta las suyas, y dos requests simultáneos del mismo nombre
+# pueden pisarse una muestra (es estadística, no contabilidad).
+# Con respuestas en streaming se mide hasta que la vista devuelve la respuesta.
+
+registro_lentas = logging.getLogger('calculos.lentas')
+_actual = contextvars.ContextVar('medicion', default=None)
+
+CLAVE_URLS = 'calculos:instrumentacion:urls'
+MUESTRAS_POR_URL = 500
+CONSULTAS_LENTAS = 5
+LARGO_SQL = 500
+PERCENTILES = (50, 90, 95, 99)
+
+def activa():
+    return getattr(settings, 'INSTRUMENTACION_ACTIVA', False)
+
+def umbral_ms():
+    return getattr(settings, 'INSTRUMENTACION_UMBRAL_MS', 1000)
+
+def clave_muestras(nombre):
+    return f'calculos:instrumentacion:muestras:{nombre}'
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql_ms = 0.0
+        self.lentas = []  # heap de (ms, orden, sql): quedan las CONSULTAS_LENTAS más lentas
+        self.etapas = {}
+
+    # Firma de connection.execute_wrapper
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.sql_ms += ms
+            entrada = (ms, self.consultas, sql)
+            if len(self.lentas) < CONSULTAS_LENTAS: heapq.heappush(self.lentas, entrada)
+            elif ms > self.lentas[0][0]: heapq.heapreplace(self.lentas, entrada)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+@contextmanager
+def etapa(nombre):
+    # Suma el tiempo del bloque a la medición del request en curso (si la hay)
+    medicion = _actual.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.etapas[nombre] = medicion.etapas.get(nombre, 0) + (time.perf_counter() - inicio) * 1000
+
+# --- MUESTRAS POR NOMBRE DE URL ---
+def agregar_muestra(nombre, total_ms, consultas, sql_ms):
+    muestras = cache.get(clave_muestras(nombre)) or []
+    muestras.append((round(total_ms, 1), consultas, round(sql_ms, 1)))
+    cache.set(clave_muestras(nombre), muestras[-MUESTRAS_POR_URL:], None)
+    urls = cache.get(CLAVE_URLS) or set()
+    if nombre not in urls:
+        cache.set(CLAVE_URLS, urls | {nombre}, None)
+
+def percentil(ordenados, p):
+    # Método del rango más cercano
+    return ordenados[max(0, -(-len(ordenados) * p // 100) - 1)]
+
+def estadisticas():
+    # [{url, cantidad, p50..p99, max, consultas (promedio), sql_ms (promedio)}] ordenado por p95
+    filas = []
+    for nombre in cache.get(CLAVE_URLS) or ():
+        muestras = cache.get(clave_muestras(nombre))
+        if not muestras: continue
+        tiempos = sorted(m[0] for m in muestras)
+        fila = {'url': nombre, 'cantidad': len(muestras), 'max': tiempos[-1],
+                'consultas': round(sum(m[1] for m in muestras) / len(muestras), 1), 'sql_ms': round(sum(m[2] for m in muestras) / len(muestras), 1)}
+        fila.update((f'p{p}', percentil(tiempos, p)) for p in PERCENTILES)
+        filas.append(fila)
+    return sorted(filas, key=lambda f: -f['p95'])
+
+def reiniciar():
+    cache.delete_many([clave_muestras(n) for n in cache.get(CLAVE_URLS) or ()] + [CLAVE_URLS])
+
+def ultimas_lentas(cantidad=20, tamanio=256 * 1024):
+    # Últimas entradas del log rotativo (solo se lee la cola del archivo actual)
+    ruta = getattr(settings, 'INSTRUMENTACION_LOG', None)
+    if not ruta or not os.path.exists(ruta): return []
+    with open(ruta, 'rb') as f:
+        f.seek(max(0, os.path.getsize(ruta) - tamanio))
+        lineas = f.read().decode('utf-8', 'replace').splitlines()[-cantidad:]
+    entradas = []
+    for linea in reversed(lineas):
+        try: entradas.append(json.loads(linea))
+        except ValueError: pass  # primera línea cortada
+    return entradas
+
+# --- MIDDLEWARE ---
+class InstrumentacionMiddleware:
+    def __init__(self, get_response):
+        if not activa():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if getattr(settings, 'INSTRUMENTACION_LOG', None):
+            os.makedirs(os.path.dirname(settings.INSTRUMENTACION_LOG), exist_ok=True)
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        self.registrar(request, response, medicion)
+        return response
+
+    def registrar(self, request, response, medicion):
+        total = medicion.total_ms()
+        coincidencia = getattr(request, 'resolver_match', None)
+        nombre = coincidencia.view_name if coincidencia else 'sin ruta'
+        agregar_muestra(nombre, total, medicion.consultas, medicion.sql_ms)
+        if total < umbral_ms():
+            return
+        usuario = getattr(request, 'user', None)
+        registro_lentas.warning(json.dumps({
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'url': nombre, 'metodo': request.method, 'ruta': request.get_full_path(), 'estado': response.status_code,
+            'usuario': usuario.get_username() if usuario is not None and usuario.is_authenticated else None,
+            'ms': round(total, 1), 'consultas': medicion.consultas, 'sql_ms': round(medicion.sql_ms, 1),
+            'etapas': {k: round(v, 1) for k, v in medicion.etapas.items()},
+            'consultas_lentas': [{'ms': round(ms, 2), 'sql': sql[:LARGO_SQL]} for ms, _, sql in sorted(medicion.lentas, reverse=True)],
+        }, ensure_ascii=False))
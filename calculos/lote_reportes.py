@@ -0,0 +1,65 @@
+import re
+import zipfile
+from collections import defaultdict
+from django.conf import settings
+from .cache_reportes import EntradaCache, huella_datos
+from .cola_reportes import obtener_pool
+from .worker_pdf import renderizar_html
+from .reportes import ENCABEZADOS, PLANTILLA_PDF, contexto_reporte, fecha_nota, html_reporte, normalizar_destinatario
+from .resumenes import resumen_por_empleado
+
+# ====================================================================
+# GENERACIÓN EN LOTE DE TODOS LOS PDF DE CIERRE DE UN PERÍODO
+# ====================================================================
+# Dos consultas agregadas por período (general y por Secretaría, mismo criterio
+# que FiltroSecretariaMixin), agrupadas en memoria; la huella de los datos se
+# calcula una vez por período y los renders se reparten en el pool de procesos.
+# Desde el admin, el ZIP se arma en segundo plano (cola_reportes.encolar_cierre).
+
+def _nombre_archivo(texto):
+    return re.sub(r'[^\w\-]+', '_', texto).strip('_')
+
+def base_url_por_defecto():
+    return getattr(settings, 'REPORTES_BASE_URL', 'http://127.0.0.1:8000/')
+
+def trabajos_periodo(periodo, destinatario_secretarias='andrea', nota=None):
+    # Devuelve [(ruta_en_zip, entrada_cache_o_None, html, pdf_cacheado)] para todos los PDF del período
+    nota = nota or fecha_nota()
+    filas = list(resumen_por_empleado(periodo))
+    carpeta = _nombre_archivo(periodo.nombre)
+    huella = huella_datos(periodo)
+    trabajos = []
+
+    # 1. Reportes generales, uno por destinatario (se aprovecha la caché en disco)
+    for destinatario in ENCABEZADOS:
+        entrada = EntradaCache(periodo, destinatario, PLANTILLA_PDF, nota, huella)
+        pdf = entrada.leer()
+        html = None if pdf is not None else html_reporte(contexto_reporte(periodo, destinatario, nota, filas))
+        trabajos.append((f"{carpeta}/Reporte_{carpeta}_{destinatario.title()}.pdf", entrada, html, pdf))
+
+    # 2. Un reporte por Secretaría
+    por_secretaria = defaultdict(list)
+    for fila in resumen_por_empleado(periodo, por_secretaria=True):
+        por_secretaria[fila['secretaria_nombre']].append(fila)
+    destinatario_secretarias = normalizar_destinatario(destinatario_secretarias)
+    for nombre, filas_secretaria in por_secretaria.items():
+        context = contexto_reporte(periodo, destinatario_secretarias, nota, filas_secretaria, secretaria=nombre)
+        trabajos.append((f"{carpeta}/Secretarias/{_nombre_archivo(nombre)}.pdf", None, html_reporte(context), None))
+    return trabajos
+
+def generar_zip_cierre(periodos, destino, base_url=None, destinatario_secretarias='andrea', nota=None):
+    # 'destino' puede ser una ruta o un archivo abierto en modo binario. Devuelve la cantidad de PDF.
+    base_url = base_url or base_url_por_defecto()
+    nota = nota or fecha_nota()
+    trabajos = [t for periodo in periodos for t in trabajos_periodo(periodo, destinatario_secretarias, nota)]
+
+    pool = obtener_pool()
+    futuros = {ruta: pool.submit(renderizar_html, html, base_url) for ruta, _, html, _ in trabajos if html is not None}
+
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for ruta, entrada, html, pdf in trabajos:
+            if pdf is None:
+                pdf = futuros[ruta].result()
+                if entrada is not None: entrada.guardar(pdf)
+            zf.writestr(ruta, pdf)
+    return len(trabajos)
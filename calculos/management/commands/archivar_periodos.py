@@ -0,0 +1,66 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from calculos import archivo, backups
+from calculos.models import Periodo
+
+class Command(BaseCommand):
+    help = 'Pasa los registros de los períodos cerrados más viejos al archivo en frío (un archivo columnar por período) y los borra de la base.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, help='Antigüedad mínima (meses desde el fin del período). Por defecto ARCHIVO_ANTIGUEDAD_MESES.')
+        parser.add_argument('--periodo', type=int, action='append', dest='periodos', help='ID de período cerrado a archivar sin importar su antigüedad (se puede repetir).')
+        parser.add_argument('--simular', action='store_true', help='Solo listar los períodos que se archivarían.')
+        parser.add_argument('--vacuum', action='store_true', help='Al terminar, compactar la base SQLite (VACUUM bloquea la base mientras dura).')
+        parser.add_argument('--sin-backup', action='store_true', help='No hacer la copia de seguridad (base + archivo) al terminar. Hasta la próxima, los registros archivados solo están en ARCHIVO_DIR.')
+        parser.add_argument('--verificar', action='store_true', help='No archivar: comprobar los archivos contra el manifiesto y el resumen.')
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            return self.verificar()
+        if options['periodos']:
+            periodos = list(Periodo.objects.filter(pk__in=options['periodos'], cerrado=True, archivado=False).order_by('fecha_inicio'))
+            if len(periodos) != len(set(options['periodos'])):
+                raise CommandError('❌ Algún período no existe, no está cerrado o ya está archivado.')
+        else:
+            limite = archivo.fecha_limite(meses=options['meses'])
+            periodos = list(archivo.candidatos(limite))
+            self.stdout.write(f'Períodos cerrados que terminaron antes del {limite:%d/%m/%Y}: {len(periodos)}')
+
+        for periodo in periodos:
+            if options['simular']:
+                self.stdout.write(f'   {periodo.nombre} ({periodo.fecha_inicio:%d/%m/%Y} - {periodo.fecha_fin:%d/%m/%Y})')
+                continue
+            try:
+                filas, tamanio = archivo.archivar_periodo(periodo)
+            except archivo.ErrorArchivo as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'🗄️ {periodo.nombre}: {filas} registros → {tamanio / 1024:.0f} KB'))
+
+        if options['vacuum'] and periodos and not options['simular'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write('Base compactada (VACUUM).')
+        if not options['simular']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(periodos)} período(s) archivado(s) en {archivo.directorio_archivo()}'))
+        if periodos and not options['simular']:
+            self.copia_de_seguridad(options['sin_backup'])
+
+    def copia_de_seguridad(self, omitir):
+        # Los registros borrados solo quedan en ARCHIVO_DIR: se respaldan enseguida junto con la base
+        if omitir:
+            self.stdout.write(self.style.WARNING('⚠️ Sin copia de seguridad: los registros archivados solo están en ARCHIVO_DIR hasta el próximo crear_backup.'))
+            return
+        try:
+            ruta, *_ = backups.crear_backup()
+        except Exception as e:
+            raise CommandError(f'❌ Los períodos se archivaron pero falló la copia de seguridad ({e}). Corra crear_backup antes de seguir: los registros archivados solo están en ARCHIVO_DIR.')
+        self.stdout.write(self.style.SUCCESS(f'📦 Copia de seguridad de la base y del archivo: {os.path.basename(ruta)}'))
+
+    def verificar(self):
+        problemas = archivo.verificar()
+        for periodo, problema in problemas:
+            self.stdout.write(self.style.ERROR(f'❌ {periodo.nombre}: {problema}'))
+        if problemas:
+            raise CommandError(f'❌ {len(problemas)} problema(s) en el archivo.')
+        self.stdout.write(self.style.SUCCESS(f'✅ {Periodo.objects.filter(archivado=True).count()} período(s) archivado(s) verificados.'))
@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+import django
+import tablib
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from calculos.admin import EmpleadoResource
+from calculos.historico import invalidar_cerrados
+from calculos.models import Departamento, Empleado, Periodo, RegistroHora, Secretaria
+from calculos.reportes import contexto_reporte, html_reporte
+
+class Command(BaseCommand):
+    help = 'Mide tiempos y cantidad de consultas de los caminos principales (admin, PDF, histórico, importación) y guarda el resultado en JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--usuario', help='Superusuario con el que se navega el admin (por defecto, el primero).')
+        parser.add_argument('--filas-importacion', type=int, default=2000, help='Filas del archivo de empleados (mitad existentes modificados, mitad nuevos).')
+        parser.add_argument('--sin-pdf', action='store_true', help='No medir el renderizado con WeasyPrint (el más lento).')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto: benchmarks/benchmark_<fecha>.json).')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior contra el cual comparar.')
+
+    def handle(self, *args, **options):
+        usuario = self.superusuario(options['usuario'])
+        cerrado = Periodo.objects.filter(cerrado=True).order_by('-fecha_inicio').first()
+        if cerrado is None or not RegistroHora.objects.exists():
+            raise CommandError('❌ No hay datos para medir. Cargue un conjunto con "generar_datos_prueba".')
+
+        # Client de pruebas sobre la base real: 'testserver' tiene que ser un host permitido
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], REPORTES_CACHE_DIR=carpeta):
+            self.cliente = Client()
+            self.cliente.force_login(usuario)
+            self.repeticiones = options['repeticiones']
+            self.resultados = {}
+            self.medir_admin(cerrado)
+            self.medir_pdf(cerrado, carpeta, options['sin_pdf'])
+            self.medir_historico()
+            self.medir_importacion(options['filas_importacion'])
+
+        datos = {
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'entorno': {'python': platform.python_version(), 'django': django.get_version(), 'sqlite': sqlite3.sqlite_version, 'base': str(settings.DATABASES['default']['NAME'])},
+            'volumen': {m._meta.model_name: m.objects.count() for m in (Secretaria, Departamento, Empleado, Periodo, RegistroHora)},
+            'repeticiones': self.repeticiones,
+            'resultados': self.resultados,
+        }
+        salida = options['salida'] or os.path.join(settings.BASE_DIR, 'benchmarks', f"benchmark_{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+
+        anterior = self.leer_anterior(options['comparar'])
+        self.informe(anterior)
+        self.stdout.write(self.style.SUCCESS(f'✅ Resultados guardados en: {salida}'))
+
+    def superusuario(self, nombre):
+        usuarios = User.objects.filter(is_superuser=True, is_active=True)
+        usuario = usuarios.filter(username=nombre).first() if nombre else usuarios.order_by('pk').first()
+        if usuario is None:
+            raise CommandError('❌ Hace falta un superusuario activo (createsuperuser o --usuario).')
+        return usuario
+
+    def leer_anterior(self, ruta):
+        if not ruta: return None
+        try:
+            with open(ruta, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'❌ No se pudo leer {ruta}: {e}')
+
+    # --- MEDICIÓN ---
+    def medir(self, nombre, funcion, preparar=None):
+        # Cada repetición: preparar() (fuera de la medición), tiempo de funcion() y consultas de la última
+        tiempos = []
+        for _ in range(self.repeticiones):
+            if preparar: preparar()
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        self.resultados[nombre] = {
+            'ms_min': round(min(tiempos), 1), 'ms_mediana': round(statistics.median(tiempos), 1), 'ms_max': round(max(tiempos), 1),
+            'consultas': len(ctx.captured_queries),
+        }
+        self.stdout.write(f"   {nombre:<42} {self.resultados[nombre]['ms_mediana']:>9.1f} ms   {len(ctx.captured_queries):>5} consultas")
+
+    def get(self, url):
+        def pedir():
+            respuesta = self.cliente.get(url)
+            if respuesta.status_code != 200:
+                raise CommandError(f'❌ {url} respondió {respuesta.status_code}.')
+            b''.join(respuesta) if respuesta.streaming else respuesta.content
+        return pedir
+
+    def medir_admin(self, cerrado):
+        self.medir('admin: registros (período activo)', self.get(reverse('admin:calculos_registrohora_changelist')))
+        self.medir('admin: registros (período cerrado)', self.get(reverse('admin:calculos_registrohora_changelist') + f'?periodo__id__exact={cerrado.pk}'))
+        self.medir('admin: registros (búsqueda)', self.get(reverse('admin:calculos_registrohora_changelist') + '?q=GOMEZ'))
+        self.medir('admin: empleados', self.get(reverse('admin:calculos_empleado_changelist')))
+        self.medir('admin: departamentos', self.get(reverse('admin:calculos_departamento_changelist')))
+
+    def medir_pdf(self, periodo, carpeta, sin_pdf):
+        self.medir('pdf: contexto + HTML (sin WeasyPrint)', lambda: html_reporte(contexto_reporte(periodo, 'andrea')))
+        if sin_pdf: return
+        url = reverse('reporte_pdf', args=[periodo.pk, 'andrea'])
+        vaciar = lambda: [os.remove(os.path.join(raiz, a)) for raiz, _, archivos in os.walk(carpeta) for a in archivos]
+        self.medir('pdf: completo (caché de PDF vacía)', self.get(url), preparar=vaciar)
+        self.medir('pdf: desde la caché de PDF', self.get(url))
+
+    def medir_historico(self):
+        self.medir('histórico: página', self.get(reverse('reporte_historico')))
+        self.medir('histórico: datos (caché vacía)', self.get(reverse('reporte_historico_datos')), preparar=invalidar_cerrados)
+        self.medir('histórico: datos (caché llena)', self.get(reverse('reporte_historico_datos')))
+
+    def medir_importacion(self, filas):
+        # dry_run: import-export deshace la transacción, la base queda igual
+        existentes = list(Empleado.objects.select_related('departamento').order_by('pk')[:filas // 2])
+        filas_archivo = [(e.legajo, f'{e.nombre_completo} (MOD)', e.departamento.nombre if e.departamento else '') for e in existentes]
+        filas_archivo += [(f'B{i:07}', f'EMPLEADO NUEVO {i}', f'DEPARTAMENTO BENCHMARK {i % 20}') for i in range(filas - len(existentes))]
+
+        def importar():
+            # before_import puede modificar el Dataset: uno nuevo por repetición
+            datos = tablib.Dataset(*filas_archivo, headers=['Nº identificación', 'Nombre del empleado', 'Departamento'])
+            resultado = EmpleadoResource().import_data(datos, dry_run=True)
+            if resultado.has_errors() or resultado.has_validation_errors():
+                raise CommandError('❌ La importación de prueba tuvo errores.')
+        self.medir(f'importación de empleados ({filas} filas)', importar)
+
+    # --- INFORME ---
+    def informe(self, anterior):
+        if anterior is None: return
+        self.stdout.write(f"\nComparación con la corrida del {anterior.get('fecha', '?')}:")
+        previos = anterior.get('resultados', {})
+        for nombre, actual in self.resultados.items():
+            previo = previos.get(nombre)
+            if previo is None:
+                self.stdout.write(f'   {nombre:<42} (nuevo)')
+                continue
+            variacion = (actual['ms_mediana'] - previo['ms_mediana']) / max(previo['ms_mediana'], 0.1) * 100
+            linea = f"   {nombre:<42} {previo['ms_mediana']:>9.1f} → {actual['ms_mediana']:>9.1f} ms ({variacion:+.0f}%)   consultas {previo['consultas']} → {actual['consultas']}"
+            estilo = self.style.ERROR if variacion > 20 or actual['consultas'] > previo['consultas'] else self.style.SUCCESS if variacion < -20 else str
+            self.stdout.write(estilo(linea))
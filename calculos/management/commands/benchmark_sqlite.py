@@ -0,0 +1,123 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from calculos import datos_prueba
+from calculos.importacion import importar_registros
+from calculos.models import Departamento, Empleado, Periodo, RegistroHora
+from calculos.resumenes import resumen_por_empleado
+
+# Cada perfil corre sobre una base temporal con el esquema real (migrate) y un
+# conjunto de generar_datos_prueba; varios hilos leen el resumen por empleado de
+# los períodos cerrados mientras un hilo escribe por los caminos reales:
+# - guardado: RegistroHora.save() (alta + delta del resumen en la misma transacción)
+# - importacion: importar_registros por lotes (bulk_create + recálculo del período)
+# Los dos perfiles usan el mismo 'timeout': solo cambian los PRAGMA y el modo de transacción.
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de SQLite con la configuración por defecto y con la de settings (SQLITE_PRAGMAS) sobre el esquema real: lectores de reportes + guardados e importaciones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lectores', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=5, help='Duración de cada fase (guardado e importación) por perfil.')
+        parser.add_argument('--empleados', type=int, default=2000, help='Empleados del conjunto de prueba.')
+        parser.add_argument('--periodos', type=int, default=6, help='Períodos del conjunto de prueba (el último queda abierto).')
+        parser.add_argument('--filas-importacion', type=int, default=200, help='Filas por cada importación.')
+
+    def handle(self, *args, **options):
+        opciones = settings.DATABASES['default'].get('OPTIONS', {})
+        timeout = opciones.get('timeout', 5)
+        perfiles = {'por defecto': {'timeout': timeout}, 'settings': opciones}
+        self.stdout.write(f"Timeout de lock para los dos perfiles: {timeout} s")
+        resultados = {}
+        for nombre, perfil in perfiles.items():
+            with tempfile.TemporaryDirectory() as carpeta, self.base_temporal(os.path.join(carpeta, 'bench.sqlite3'), perfil):
+                datos_prueba.generar(semilla=7, secretarias=6, departamentos=40, empleados=options['empleados'], periodos=options['periodos'], cobertura=0.85)
+                resultados[nombre] = {fase: self.medir(fase, options) for fase in ('guardado', 'importacion')}
+            for fase, (lecturas, escrituras, bloqueos) in resultados[nombre].items():
+                unidad = 'registros' if fase == 'guardado' else 'filas importadas'
+                self.stdout.write(f"{nombre:<12} {fase:<12} lecturas/s: {lecturas / options['segundos']:>8.1f}   {unidad}/s: {escrituras / options['segundos']:>8.1f}   'database is locked': {bloqueos}")
+
+        base, nuevo = resultados['por defecto'], resultados['settings']
+        for fase in ('guardado', 'importacion'):
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {fase.title()}: lecturas x{nuevo[fase][0] / max(base[fase][0], 1):.1f}, escrituras x{nuevo[fase][1] / max(base[fase][1], 1):.1f} con {options['lectores']} lectores y 1 escritor."))
+
+    @contextmanager
+    def base_temporal(self, ruta, opciones):
+        # Mismo dict que usan las conexiones nuevas de todos los hilos (como hace el runner de tests)
+        ajustes = connections.settings['default']
+        previos = ajustes['NAME'], ajustes['OPTIONS']
+        connections.close_all()
+        ajustes['NAME'], ajustes['OPTIONS'] = ruta, opciones
+        cache.clear()  # huellas y versiones de la base real no sirven acá
+        try:
+            call_command('migrate', verbosity=0, interactive=False)
+            yield
+        finally:
+            connections.close_all()
+            ajustes['NAME'], ajustes['OPTIONS'] = previos
+            cache.clear()
+
+    def medir(self, fase, options):
+        cerrados = list(Periodo.objects.filter(cerrado=True))
+        activo = Periodo.objects.get(activo=True)
+        empleados = list(Empleado.objects.values_list('pk', 'legajo', 'departamento_id'))
+        departamentos = list(Departamento.objects.values_list('pk', 'nombre', 'secretaria_id'))
+        fin = time.monotonic() + options['segundos']
+        contadores = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+        candado = threading.Lock()
+
+        def sumar(clave, cantidad=1):
+            with candado: contadores[clave] += cantidad
+
+        def en_hilo(funcion):
+            def envuelta():
+                try:
+                    funcion()
+                finally:
+                    connections.close_all()  # cada hilo tiene su conexión
+            return threading.Thread(target=envuelta)
+
+        def leer():
+            azar = random.Random()
+            while time.monotonic() < fin:
+                try:
+                    list(resumen_por_empleado(azar.choice(cerrados)))
+                    sumar('lecturas')
+                except OperationalError:
+                    sumar('bloqueos')
+
+        def guardar():
+            azar = random.Random(1)
+            while time.monotonic() < fin:
+                pk, _, _ = azar.choice(empleados)
+                depto, _, secretaria = azar.choice(departamentos)
+                try:
+                    RegistroHora(periodo=activo, empleado_id=pk, departamento_imputacion_id=depto, secretaria_id=secretaria, cantidad_horas=Decimal(azar.randint(1, 80))).save()
+                    sumar('escrituras')
+                except OperationalError:
+                    sumar('bloqueos')
+
+        def importar():
+            azar = random.Random(2)
+            while time.monotonic() < fin:
+                filas = [(i, {'legajo': legajo, 'departamento': azar.choice(departamentos)[1], 'horas': f'{azar.uniform(1, 80):.1f}'})
+                         for i, (_, legajo, _) in enumerate(azar.sample(empleados, min(options['filas_importacion'], len(empleados))), start=2)]
+                try:
+                    sumar('escrituras', importar_registros(filas, activo).creados)
+                except OperationalError:
+                    sumar('bloqueos')
+
+        hilos = [en_hilo(leer) for _ in range(options['lectores'])] + [en_hilo(guardar if fase == 'guardado' else importar)]
+        for h in hilos: h.start()
+        for h in hilos: h.join()
+        return contadores['lecturas'], contadores['escrituras'], contadores['bloqueos']
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from asgiref.sync import ThreadSensitiveContext
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from calculos import instrumentacion
+from calculos.cola_reportes import obtener_pool
+from calculos.models import Periodo
+from calculos.render_pdf import precalentar
+from calculos.worker_pdf import renderizar_html
+
+# Prueba de carga en el mismo proceso (sin servidor HTTP): 'usuarios' clientes
+# piden reportes sin pausa durante 'segundos' y un cliente aparte pide el admin
+# cada INTERVALO_ADMIN, para ver si los reportes lo dejan sin atender.
+# - wsgi: vistas de views.py a través de un pool de 'hilos' hilos (como un worker
+#   WSGI con hilos: los pedidos que no entran esperan un hilo libre).
+# - asgi: vistas async (vistas_async.py) en un solo event loop, como un worker ASGI.
+# Cada modo arranca con la caché de PDF vacía: los primeros pedidos renderizan.
+
+INTERVALO_ADMIN = 0.25
+
+class Command(BaseCommand):
+    help = 'Prueba de carga de los reportes (PDF y dashboard histórico) bajo WSGI y bajo ASGI, con el admin en paralelo; compara rendimiento y latencias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20, help='Clientes concurrentes pidiendo reportes.')
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos del worker WSGI simulado.')
+        parser.add_argument('--segundos', type=float, default=10, help='Duración de cada modo.')
+        parser.add_argument('--periodos', type=int, default=3, help='Cantidad de períodos cerrados (los más recientes) cuyos PDF se piden.')
+        parser.add_argument('--modo', choices=('wsgi', 'asgi'), action='append', dest='modos', help='Medir solo ese modo (se puede repetir). Por defecto, los dos.')
+        parser.add_argument('--sin-pdf', action='store_true', help='Pedir solo el dashboard histórico.')
+        parser.add_argument('--usuario', help='Superusuario con el que se navega (por defecto, el primero).')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.filter(is_superuser=True, is_active=True)
+        self.usuario = usuarios.filter(username=options['usuario']).first() if options['usuario'] else usuarios.order_by('pk').first()
+        if self.usuario is None:
+            raise CommandError('❌ Hace falta un superusuario activo (createsuperuser o --usuario).')
+        periodos = list(Periodo.objects.filter(cerrado=True).order_by('-fecha_inicio')[:options['periodos']])
+        if not periodos:
+            raise CommandError('❌ No hay períodos cerrados. Cargue un conjunto con "generar_datos_prueba".')
+        if instrumentacion.activa():
+            self.stdout.write(self.style.WARNING('⚠️ INSTRUMENTACION_ACTIVA: bajo ASGI la cadena de middleware corre en un hilo y la comparación no es representativa.'))
+
+        self.urls = [reverse('reporte_historico_datos')]
+        if not options['sin_pdf']:
+            self.urls += [reverse('reporte_pdf', args=[p.pk, d]) for p in periodos for d in ('andrea', 'edith')]
+        self.segundos = options['segundos']
+        self.usuarios = options['usuarios']
+
+        # Fuentes y hoja de estilos listas en este proceso (wsgi) y en el pool (asgi) antes de medir
+        precalentar()
+        resultados = {}
+        for modo in options['modos'] or ('wsgi', 'asgi'):
+            if modo == 'asgi' and not options['sin_pdf']:
+                obtener_pool().submit(renderizar_html, '<p>.</p>', 'http://testserver/').result()
+            with tempfile.TemporaryDirectory() as carpeta, override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], REPORTES_CACHE_DIR=carpeta):
+                if modo == 'wsgi':
+                    resultados[modo] = self.medir_wsgi(options['hilos'])
+                else:
+                    resultados[modo] = asyncio.run(self.medir_asgi())
+            self.informe(modo, resultados[modo])
+
+        if len(resultados) == 2 and resultados['wsgi']['pedidos_por_segundo']:
+            self.stdout.write(f"\nASGI / WSGI: {resultados['asgi']['pedidos_por_segundo'] / resultados['wsgi']['pedidos_por_segundo']:.2f}x pedidos por segundo")
+        if options['salida']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['salida'])), exist_ok=True)
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump({'usuarios': self.usuarios, 'hilos': options['hilos'], 'segundos': self.segundos, 'urls': self.urls, 'resultados': resultados}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en: {options['salida']}"))
+
+    # --- MODOS ---
+    def medir_wsgi(self, hilos):
+        clientes = []
+        for _ in range(self.usuarios + 1):
+            cliente = Client()
+            cliente.force_login(self.usuario)
+            clientes.append(cliente)
+
+        async def correr():
+            pool = ThreadPoolExecutor(max_workers=hilos)
+            loop = asyncio.get_running_loop()
+            def pedidor(cliente):
+                return lambda url: loop.run_in_executor(pool, lambda: cliente.get(url).status_code)
+            try:
+                return await self.correr([pedidor(c) for c in clientes[:-1]], pedidor(clientes[-1]))
+            finally:
+                pool.shutdown(wait=True)
+        return asyncio.run(correr())
+
+    async def medir_asgi(self):
+        clientes = []
+        for _ in range(self.usuarios + 1):
+            cliente = AsyncClient()
+            await cliente.aforce_login(self.usuario)
+            clientes.append(cliente)
+        def pedidor(cliente):
+            async def pedir(url):
+                # Como ASGIHandler: cada request con su hilo para las partes sync (AsyncClient no lo hace)
+                async with ThreadSensitiveContext():
+                    return (await cliente.get(url)).status_code
+            return pedir
+        return await self.correr([pedidor(c) for c in clientes[:-1]], pedidor(clientes[-1]))
+
+    # --- CARGA ---
+    async def correr(self, pedidores, pedidor_admin):
+        fin = time.perf_counter() + self.segundos
+        reportes, admin, errores = [], [], []
+
+        async def medir(pedir, url, tiempos):
+            inicio = time.perf_counter()
+            try:
+                estado = await pedir(url)
+            except Exception as e:
+                errores.append(f'{url}: {e!r}')
+                return
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if estado != 200: errores.append(f'{url}: HTTP {estado}')
+
+        async def usuario(pedir, azar):
+            while time.perf_counter() < fin:
+                await medir(pedir, azar.choice(self.urls), reportes)
+
+        async def sonda_admin():
+            while time.perf_counter() < fin:
+                await medir(pedidor_admin, reverse('admin:index'), admin)
+                await asyncio.sleep(INTERVALO_ADMIN)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(sonda_admin(), *(usuario(p, random.Random(i)) for i, p in enumerate(pedidores)))
+        duracion = time.perf_counter() - inicio
+        return {
+            'pedidos': len(reportes), 'pedidos_por_segundo': round(len(reportes) / duracion, 1), 'errores': len(errores), 'primeros_errores': errores[:5],
+            'reportes_ms': _percentiles(reportes), 'admin_ms': _percentiles(admin),
+        }
+
+    def informe(self, modo, r):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{modo.upper()} ({self.usuarios} usuarios, {self.segundos:g} s)'))
+        self.stdout.write(f"   Reportes: {r['pedidos']} pedidos, {r['pedidos_por_segundo']}/s, {r['errores']} errores")
+        for nombre in ('reportes_ms', 'admin_ms'):
+            p = r[nombre]
+            if p: self.stdout.write(f"   {nombre[:-3].title():<9} p50 {p['p50']:>8.1f} ms   p95 {p['p95']:>8.1f} ms   p99 {p['p99']:>8.1f} ms   max {p['max']:>8.1f} ms")
+        for error in r['primeros_errores']:
+            self.stdout.write(self.style.ERROR(f'   ❌ {error}'))
+
+def _percentiles(tiempos):
+    if not tiempos: return {}
+    ordenados = sorted(tiempos)
+    return {**{f'p{p}': round(instrumentacion.percentil(ordenados, p), 1) for p in (50, 95, 99)}, 'max': round(ordenados[-1], 1)}
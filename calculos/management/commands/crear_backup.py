@@ -1,56 +1,55 @@
 import os
-import shutil
-from datetime import datetime
 from django.core.management.base import BaseCommand
-from django.conf import settings
+from calculos import backups
 
 class Command(BaseCommand):
-    help = 'Genera una copia de seguridad de la base de datos SQLite y limpia las antiguas.'
+    help = 'Genera una copia de seguridad en línea (consistente y comprimida) de la base SQLite y aplica la retención escalonada.'
 
-    def handle(self, *args, **options):
-        # 1. Configuración
-        db_path = settings.DATABASES['default']['NAME']
-        backup_dir = os.path.join(settings.BASE_DIR, 'backups')
-        
-        # 2. Crear carpeta de backups si no existe
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-            self.stdout.write(self.style.WARNING(f'📁 Carpeta creada: {backup_dir}'))
+    def add_arguments(self, parser):
+        parser.add_argument('--paginas', type=int, default=256, help='Páginas copiadas por tanda (-1 = todo de una vez).')
+        parser.add_argument('--pausa', type=float, default=0.01, help='Segundos de pausa entre tandas, para no frenar a los escritores.')
+        parser.add_argument('--horarios', type=int, help='Horas con un backup por hora a conservar.')
+        parser.add_argument('--diarios', type=int, help='Días con un backup por día a conservar.')
+        parser.add_argument('--mensuales', type=int, help='Meses con un backup por mes a conservar.')
+        parser.add_argument('--incremental', action='store_true', help='Guardar solo los bloques que cambiaron desde el último snapshot (ver restaurar_backup).')
+        parser.add_argument('--sin-limpieza', action='store_true', help='No borrar backups viejos.')
 
-        # 3. Nombre del archivo con Fecha y Hora
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        backup_filename = f"db_backup_{timestamp}.sqlite3"
-        backup_path = os.path.join(backup_dir, backup_filename)
+    def handle(self, *args, **options):
+        # 1. Verificar la base original
+        if not os.path.exists(backups.ruta_base_datos()):
+            self.stdout.write(self.style.ERROR('❌ No se encontró la base de datos original.'))
+            return
 
-        # 4. Realizar la copia
+        # 2. Copia en línea + compresión + checksum
+        if options['incremental']:
+            return self.backup_incremental(options)
         try:
-            if os.path.exists(db_path):
-                shutil.copy2(db_path, backup_path)
-                self.stdout.write(self.style.SUCCESS(f'✅ Backup creado exitosamente: {backup_filename}'))
-            else:
-                self.stdout.write(self.style.ERROR('❌ No se encontró la base de datos original.'))
-                return
+            ruta, digest, tamanio, comprimido = backups.crear_backup(paginas=options['paginas'], pausa=options['pausa'])
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'❌ Error al crear backup: {str(e)}'))
             return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Backup creado exitosamente: {os.path.basename(ruta)} ({tamanio / 1048576:.1f} MB → {comprimido / 1048576:.1f} MB, sha256 {digest[:12]}…)'))
 
-        # 5. Limpieza (Borrar backups de más de 30 días)
-        self.limpiar_backups_antiguos(backup_dir)
+        # 3. Retención escalonada (horaria / diaria / mensual)
+        if options['sin_limpieza']:
+            return
+        borrados = backups.aplicar_retencion(horarios=options['horarios'], diarios=options['diarios'], mensuales=options['mensuales'])
+        if borrados:
+            self.stdout.write(self.style.WARNING(f'🗑️ Se eliminaron {len(borrados)} backups fuera de la política de retención.'))
 
-    def limpiar_backups_antiguos(self, directorio):
-        dias_a_mantener = 30
-        ahora = datetime.now().timestamp()
-        
-        count = 0
-        for archivo in os.listdir(directorio):
-            ruta_completa = os.path.join(directorio, archivo)
-            if os.path.isfile(ruta_completa) and archivo.startswith("db_backup_"):
-                # Obtener fecha de creación/modificación
-                file_time = os.path.getmtime(ruta_completa)
-                # Si es más viejo que X días (dias * 24h * 60m * 60s)
-                if (ahora - file_time) > (dias_a_mantener * 86400):
-                    os.remove(ruta_completa)
-                    count += 1
-        
-        if count > 0:
-            self.stdout.write(self.style.WARNING(f'🗑️ Se eliminaron {count} backups antiguos (>30 días).'))
\ No newline at end of file
+    def backup_incremental(self, options):
+        try:
+            ruta, total, nuevos, bytes_nuevos = backups.crear_incremental(paginas=options['paginas'], pausa=options['pausa'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Error al crear backup incremental: {str(e)}'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Snapshot incremental creado: {os.path.basename(ruta)} ({nuevos} de {total} bloques nuevos, {bytes_nuevos / 1048576:.2f} MB agregados)'))
+
+        if options['sin_limpieza']:
+            return
+        borrados = backups.aplicar_retencion(incremental=True, horarios=options['horarios'], diarios=options['diarios'], mensuales=options['mensuales'])
+        bloques = backups.recolectar_bloques()
+        if borrados or bloques:
+            self.stdout.write(self.style.WARNING(f'🗑️ Se eliminaron {len(borrados)} snapshots y {bloques} bloques sin uso.'))
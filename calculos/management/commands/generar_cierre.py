@@ -0,0 +1,31 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from calculos.lote_reportes import base_url_por_defecto, generar_zip_cierre
+from calculos.models import Periodo
+
+class Command(BaseCommand):
+    help = 'Genera en una sola pasada todos los PDF de cierre de un período (ambos destinatarios y uno por Secretaría) en un ZIP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo_id', type=int, help='ID del período (debe estar CERRADO).')
+        parser.add_argument('--salida', help='Ruta del ZIP a generar (por defecto: cierres/Cierre_<periodo>.zip).')
+        parser.add_argument('--destinatario-secretarias', default='andrea', help='Encabezado usado en los PDF por Secretaría (andrea/edith).')
+        parser.add_argument('--base-url', default=None, help=f'URL base para resolver recursos estáticos (por defecto: {base_url_por_defecto()}).')
+
+    def handle(self, *args, **options):
+        try:
+            periodo = Periodo.objects.get(pk=options['periodo_id'])
+        except Periodo.DoesNotExist:
+            raise CommandError(f"❌ No existe el período {options['periodo_id']}.")
+        if not periodo.cerrado:
+            raise CommandError(f'❌ El período "{periodo.nombre}" debe estar CERRADO antes de generar los reportes.')
+
+        salida = options['salida']
+        if not salida:
+            carpeta = os.path.join(settings.BASE_DIR, 'cierres')
+            os.makedirs(carpeta, exist_ok=True)
+            salida = os.path.join(carpeta, f"Cierre_{periodo.pk}.zip")
+
+        cantidad = generar_zip_cierre([periodo], salida, options['base_url'], options['destinatario_secretarias'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {cantidad} reportes generados en: {salida}'))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from calculos import datos_prueba
+
+class Command(BaseCommand):
+    help = 'Carga un conjunto de datos sintético y reproducible a escala municipal (secretarías, departamentos, empleados, períodos y registros de horas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=2024, help='Misma semilla y parámetros = mismos datos.')
+        parser.add_argument('--secretarias', type=int, default=12)
+        parser.add_argument('--departamentos', type=int, default=150)
+        parser.add_argument('--empleados', type=int, default=5000)
+        parser.add_argument('--periodos', type=int, default=48, help='Períodos mensuales; todos cerrados menos el último.')
+        parser.add_argument('--cobertura', type=float, default=0.85, help='Fracción de empleados con horas en cada período.')
+        parser.add_argument('--limpiar', action='store_true', help='⚠️ Borra TODOS los datos de la aplicación antes de generar.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['cobertura'] <= 1:
+            raise CommandError('❌ La cobertura debe estar entre 0 y 1.')
+        if datos_prueba.hay_datos():
+            if not options['limpiar']:
+                raise CommandError('❌ La base ya tiene datos. Use --limpiar para borrarlos (solo en una copia de prueba).')
+            datos_prueba.borrar_todo()
+            self.stdout.write(self.style.WARNING('🗑️ Datos anteriores eliminados.'))
+
+        inicio = time.perf_counter()
+        cantidades = datos_prueba.generar(
+            semilla=options['semilla'], secretarias=options['secretarias'], departamentos=options['departamentos'],
+            empleados=options['empleados'], periodos=options['periodos'], cobertura=options['cobertura'],
+            salida=lambda mensaje: self.stdout.write(f'   {mensaje}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Datos de prueba generados en {time.perf_counter() - inicio:.1f}s: {cantidades['registros']} registros de {cantidades['empleados']} empleados en {cantidades['periodos']} períodos."))
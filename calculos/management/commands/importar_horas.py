@@ -0,0 +1,44 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from calculos.contexto import periodo_activo
+from calculos.importacion import ErrorImportacion, importar_registros, leer_filas
+from calculos.models import Periodo
+
+class Command(BaseCommand):
+    help = 'Importa horas extras desde una planilla CSV/XLSX (columnas: Legajo, Horas, Departamento, Confirmar >180hs).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV o XLSX.')
+        parser.add_argument('--periodo', type=int, help='ID del período (por defecto: el período activo).')
+        parser.add_argument('--simular', action='store_true', help='Valida y muestra las diferencias sin guardar nada.')
+        parser.add_argument('--omitir-cargadas', action='store_true', help='Saltear las filas iguales (legajo, departamento y horas) a un registro del período.')
+
+    def handle(self, *args, **options):
+        if options['periodo']:
+            periodo = Periodo.objects.filter(pk=options['periodo']).first()
+        else:
+            periodo = periodo_activo()
+        if periodo is None:
+            raise CommandError('❌ No se encontró el período (o no hay período activo).')
+        if not os.path.exists(options['archivo']):
+            raise CommandError(f"❌ No existe el archivo: {options['archivo']}")
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_registros(leer_filas(archivo, options['archivo']), periodo, simulacion=options['simular'], omitir_cargadas=options['omitir_cargadas'])
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+
+        for fila in resultado.diferencias:
+            self.stdout.write(f"{fila['legajo']:>10}  {fila['nombre'][:40]:<40} {fila['horas_actuales']:>7} +{fila['horas_importadas']:>6} = {fila['total_resultante']:>7}")
+        for numero, mensaje in resultado.ya_cargadas:
+            self.stdout.write(self.style.WARNING(f"Fila {numero} {'omitida' if resultado.omitir_cargadas else 'igual a un registro existente'}: {mensaje}"))
+        for numero, mensaje in resultado.errores:
+            self.stdout.write(self.style.ERROR(f'Fila {numero}: {mensaje}'))
+
+        if resultado.errores:
+            raise CommandError(f'❌ {len(resultado.errores)} error(es): no se guardó ninguna fila.')
+        if resultado.simulacion:
+            self.stdout.write(self.style.WARNING(f'🔎 Simulación: {resultado.filas_leidas} fila(s) válidas, nada fue guardado.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {resultado.creados} registro(s) cargados en {periodo.nombre}.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from calculos.models import ResumenHoras
+from calculos.resumenes import recalcular_resumen
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el resumen materializado de horas (período / secretaría / departamento).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', type=int, action='append', dest='periodos', help='ID de período a recalcular (se puede repetir). Sin esta opción se recalculan todos.')
+
+    def handle(self, *args, **options):
+        recalcular_resumen(options['periodos'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Resumen reconstruido: {ResumenHoras.objects.count()} filas.'))
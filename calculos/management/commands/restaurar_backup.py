@@ -0,0 +1,55 @@
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from calculos import backups
+
+class Command(BaseCommand):
+    help = 'Reconstruye un backup (completo o incremental), verifica checksums e integridad y opcionalmente reemplaza la base activa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', nargs='?', help='Nombre del archivo (db_backup_*.sqlite3.gz o db_incremental_*.json). Sin nombre: el más reciente.')
+        parser.add_argument('--hasta', help="Restaurar el último snapshot anterior a esta fecha ('AAAA-MM-DD HH:MM').")
+        parser.add_argument('--destino', help='Archivo donde escribir la base restaurada (por defecto, dentro de la carpeta de backups).')
+        parser.add_argument('--reemplazar', action='store_true', help='Volcar la base restaurada sobre la base activa.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help='No pedir confirmación antes de reemplazar la base activa.')
+        parser.add_argument('--listar', action='store_true', help='Solo listar los snapshots disponibles.')
+
+    def handle(self, *args, **options):
+        if options['listar']:
+            for fecha, tipo, ruta in backups.listar_snapshots():
+                self.stdout.write(f"{fecha:%Y-%m-%d %H:%M:%S}  {tipo:<11}  {os.path.basename(ruta)}")
+            return
+
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = datetime.strptime(options['hasta'], '%Y-%m-%d %H:%M')
+            except ValueError:
+                raise CommandError("❌ Formato de fecha inválido. Use 'AAAA-MM-DD HH:MM'.")
+
+        try:
+            fecha, tipo, ruta = backups.buscar_snapshot(options['snapshot'], hasta)
+            destino = options['destino'] or os.path.join(backups.directorio_backups(), f"restaurado_{fecha:%Y-%m-%d_%H-%M-%S}.sqlite3")
+            carpeta_archivo = backups.restaurar(tipo, ruta, destino)
+        except backups.ErrorRestauracion as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'✅ Snapshot {os.path.basename(ruta)} ({tipo}) restaurado y verificado en {destino}'))
+        if carpeta_archivo:
+            self.stdout.write(self.style.SUCCESS(f'✅ Archivo en frío del snapshot restaurado en {carpeta_archivo}'))
+
+        if not options['reemplazar']:
+            return
+        if options['interactive']:
+            respuesta = input(f"⚠️ Se va a reemplazar la base activa ({backups.ruta_base_datos()}) por el snapshot del {fecha:%Y-%m-%d %H:%M:%S}.\n"
+                              "   Todo lo cargado después se pierde. Escriba 'si' para continuar: ")
+            if respuesta.strip().lower() not in ('si', 'sí'):
+                self.stdout.write('⛔ Reemplazo cancelado. La base restaurada queda en ' + destino)
+                return
+        connections.close_all()
+        backups.reemplazar_base(destino)
+        self.stdout.write(self.style.WARNING('⚠️ La base activa fue reemplazada por el snapshot restaurado y se vació la caché.'))
+        if carpeta_archivo:
+            backups.reemplazar_archivo(carpeta_archivo)
+            self.stdout.write(self.style.WARNING('⚠️ Los archivos del snapshot se copiaron sobre ARCHIVO_DIR.'))
+        self.stdout.write(self.style.WARNING('⚠️ Reinicie el servidor: sus procesos pueden tener datos de la base anterior en memoria.'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0002_perfilusuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.CharField(max_length=20, verbose_name='Destinatario')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Renderizando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('etag', models.CharField(blank=True, max_length=64, verbose_name='Huella del PDF')),
+                ('archivo', models.CharField(blank=True, max_length=500, verbose_name='Archivo generado')),
+                ('error', models.TextField(blank=True, verbose_name='Detalle del error')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Reporte',
+                'verbose_name_plural': 'Trabajos de Reportes',
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
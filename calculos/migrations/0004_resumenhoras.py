@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def poblar_resumen(apps, schema_editor):
+    RegistroHora = apps.get_model('calculos', 'RegistroHora')
+    ResumenHoras = apps.get_model('calculos', 'ResumenHoras')
+    filas = (RegistroHora.objects.exclude(periodo__isnull=True)
+        .values('periodo_id', 'departamento_imputacion_id', 'departamento_imputacion__secretaria_id')
+        .annotate(total=Sum('cantidad_horas'), cantidad=Count('pk')).order_by())
+    ResumenHoras.objects.bulk_create([
+        ResumenHoras(periodo_id=f['periodo_id'], departamento_id=f['departamento_imputacion_id'], secretaria_id=f['departamento_imputacion__secretaria_id'], total_horas=f['total'], cantidad_registros=f['cantidad'])
+        for f in filas
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0003_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenHoras',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_horas', models.DecimalField(decimal_places=1, default=0, max_digits=12, verbose_name='Total de Horas')),
+                ('cantidad_registros', models.PositiveIntegerField(default=0, verbose_name='Cantidad de Registros')),
+                ('departamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='calculos.departamento', verbose_name='Departamento')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período')),
+                ('secretaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='calculos.secretaria', verbose_name='Secretaría')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Horas',
+                'verbose_name_plural': 'Resúmenes de Horas',
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'departamento'), name='resumen_periodo_departamento_unico'), models.UniqueConstraint(condition=models.Q(('departamento__isnull', True)), fields=('periodo',), name='resumen_periodo_sin_departamento_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0004_resumenhoras'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registrohora',
+            name='periodo',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período'),
+        ),
+        migrations.AlterField(
+            model_name='resumenhoras',
+            name='periodo',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período'),
+        ),
+        migrations.AlterField(
+            model_name='trabajoreporte',
+            name='periodo',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período'),
+        ),
+        migrations.AddIndex(
+            model_name='registrohora',
+            index=models.Index(fields=['periodo', 'empleado', 'departamento_imputacion', 'cantidad_horas'], name='registro_periodo_empleado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrohora',
+            index=models.Index(fields=['periodo', 'departamento_imputacion', 'cantidad_horas'], name='registro_periodo_depto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trabajoreporte',
+            index=models.Index(fields=['periodo', 'destinatario', '-creado'], name='trabajo_periodo_dest_idx'),
+        ),
+    ]
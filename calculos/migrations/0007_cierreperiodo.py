@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0006_resumenhoras_actualizado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierrePeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operacion', models.CharField(choices=[('cierre', 'Cierre'), ('reapertura', 'Reapertura')], default='cierre', max_length=20, verbose_name='Operación')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('total_horas', models.DecimalField(decimal_places=1, default=0, max_digits=12, verbose_name='Total de Horas')),
+                ('cantidad_registros', models.PositiveIntegerField(default=0, verbose_name='Cantidad de Registros')),
+                ('cantidad_empleados', models.PositiveIntegerField(default=0, verbose_name='Cantidad de Empleados')),
+                ('detalle', models.JSONField(blank=True, default=list, verbose_name='Totales por Secretaría / Departamento')),
+                ('periodo', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='calculos.periodo', verbose_name='Período')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Cierre de Período',
+                'verbose_name_plural': 'Cierres de Períodos',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['periodo', '-fecha'], name='cierre_periodo_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Índice de texto completo de empleados (ver calculos/busqueda.py). Solo SQLite:
+# en otras bases el admin sigue usando search_fields.
+
+CREAR = """
+CREATE VIRTUAL TABLE IF NOT EXISTS calculos_empleado_busqueda USING fts5(
+    legajo, nombre, departamento, secretaria,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+)
+"""
+CARGAR = """
+INSERT INTO calculos_empleado_busqueda (rowid, legajo, nombre, departamento, secretaria)
+SELECT e.id, e.legajo, e.nombre_completo, COALESCE(d.nombre, ''), COALESCE(s.nombre, '')
+FROM calculos_empleado e
+LEFT JOIN calculos_departamento d ON d.id = e.departamento_id
+LEFT JOIN calculos_secretaria s ON s.id = d.secretaria_id
+"""
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREAR)
+    schema_editor.execute(CARGAR)
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS calculos_empleado_busqueda')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0007_cierreperiodo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def completar_secretarias(apps, schema_editor):
+    # Un UPDATE por tabla con la Secretaría del departamento (antes de crear el índice)
+    Departamento = apps.get_model('calculos', 'Departamento')
+    secretaria_de = lambda campo: Subquery(Departamento.objects.filter(pk=OuterRef(campo)).values('secretaria_id')[:1])
+    apps.get_model('calculos', 'Empleado').objects.update(secretaria_id=secretaria_de('departamento_id'))
+    apps.get_model('calculos', 'RegistroHora').objects.update(secretaria_id=secretaria_de('departamento_imputacion_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0008_busqueda_empleados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empleado',
+            name='secretaria',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='calculos.secretaria', verbose_name='Secretaría'),
+        ),
+        migrations.AddField(
+            model_name='registrohora',
+            name='secretaria',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='calculos.secretaria', verbose_name='Secretaría'),
+        ),
+        migrations.RunPython(completar_secretarias, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='registrohora',
+            index=models.Index(fields=['secretaria', 'periodo'], name='registro_sec_periodo_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0009_secretaria_denormalizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='periodo',
+            name='archivado',
+            field=models.BooleanField(default=False, editable=False, verbose_name='¿Archivado?'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0010_periodo_archivado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cierreperiodo',
+            name='periodo',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='calculos.periodo', verbose_name='Período'),
+        ),
+    ]
@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver, Signal
+from django.utils import timezone
 
 # --- MODELO SECRETARÍA ---
 class Secretaria(models.Model):
@@ -24,11 +25,17 @@ class Periodo(models.Model):
     fecha_fin = models.DateField(verbose_name="Fecha Fin")
     activo = models.BooleanField(default=True, verbose_name="¿Activo? (Período Actual)")
     cerrado = models.BooleanField(default=False, verbose_name="¿Cerrado? (Bloquea ediciones)")
+    # Registros movidos al archivo en frío (ver archivo.py): ya no están en RegistroHora
+    archivado = models.BooleanField(default=False, editable=False, verbose_name="¿Archivado?")
     
     def clean(self):
         if self.activo: self.__class__.objects.filter(activo=True).exclude(pk=self.pk).update(activo=False)
-    def save(self, *args, **kwargs): self.clean(); super().save(*args, **kwargs)
-    def __str__(self): return f"{self.nombre} ({'🔒 CERRADO' if self.cerrado else '🟢 ABIERTO'})"
+    def save(self, *args, **kwargs):
+        # Con update_fields (p. ej. cerrar/reabrir) solo se desactivan los demás si se toca 'activo'
+        campos = kwargs.get('update_fields')
+        if campos is None or 'activo' in campos: self.clean()
+        super().save(*args, **kwargs)
+    def __str__(self): return f"{self.nombre} ({'🗄️ ARCHIVADO' if self.archivado else '🔒 CERRADO' if self.cerrado else '🟢 ABIERTO'})"
     class Meta: verbose_name = "Período"; verbose_name_plural = "Períodos"; ordering = ['-fecha_inicio']
 
 # --- MODELO EMPLEADO ---
@@ -37,16 +44,29 @@ class Empleado(models.Model):
     legajo = models.CharField(max_length=20, unique=True, verbose_name="Número de Legajo")
     departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, verbose_name="Departamento Habitual", null=True, blank=True)
     fecha_ingreso = models.DateField(auto_now_add=True, verbose_name="Fecha de Ingreso")
+    # Copia de departamento.secretaria para filtrar por Secretaría sin JOIN (ver "SECRETARÍA DENORMALIZADA")
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.SET_NULL, verbose_name="Secretaría", null=True, blank=True, editable=False, related_name='+')
+
+    def save(self, *args, **kwargs):
+        self.secretaria_id = self.departamento.secretaria_id if self.departamento_id else None
+        campos = kwargs.get('update_fields')
+        if campos is not None and 'departamento' in campos: kwargs['update_fields'] = {*campos, 'secretaria'}
+        super().save(*args, **kwargs)
     def __str__(self): return f"{self.nombre_completo} ({self.departamento.nombre if self.departamento else 'Sin Área'})"
     class Meta: verbose_name = "Empleado"; verbose_name_plural = "Empleados"; ordering = ['nombre_completo']
 
 # --- MODELO HORAS EXTRAS ---
+CAMPOS_RESUMEN = ('periodo_id', 'departamento_imputacion_id', 'cantidad_horas')  # los que afectan a ResumenHoras
+
 class RegistroHora(models.Model):
-    periodo = models.ForeignKey(Periodo, on_delete=models.CASCADE, verbose_name="Período", null=True, blank=True)
+    # Sin índice propio: los índices compuestos de Meta empiezan por 'periodo'
+    periodo = models.ForeignKey(Periodo, on_delete=models.CASCADE, verbose_name="Período", null=True, blank=True, db_index=False)
     empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, verbose_name="Empleado")
     departamento_imputacion = models.ForeignKey(Departamento, on_delete=models.CASCADE, verbose_name="Departamento (Imputación)", null=True, blank=True)
     cantidad_horas = models.DecimalField(max_digits=4, decimal_places=1, verbose_name="Cantidad de Horas")
     confirmar_exceso = models.BooleanField(default=False, verbose_name="Confirmar >180hs", help_text="Marque si carga más de 180hs.")
+    # Copia de departamento_imputacion.secretaria (ver "SECRETARÍA DENORMALIZADA"); índice propio en Meta
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.SET_NULL, verbose_name="Secretaría", null=True, blank=True, editable=False, related_name='+', db_index=False)
 
     def clean(self):
         if self.periodo and self.periodo.cerrado:
@@ -58,18 +78,120 @@ class RegistroHora(models.Model):
     def save(self, *args, **kwargs):
         if not self.departamento_imputacion_id and self.empleado.departamento:
             self.departamento_imputacion = self.empleado.departamento
-        if not self.periodo:
-            p_activo = Periodo.objects.filter(activo=True).first()
-            if p_activo: self.periodo = p_activo
-        self.full_clean()
-        super().save(*args, **kwargs)
+        if not self.periodo_id:
+            # Asignamos solo el id: clean() vuelve a leer el período y ve su estado real de 'cerrado'.
+            # Directo de la base (sin caché): otro worker puede haber cambiado el período activo
+            p_activo_id = Periodo.objects.filter(activo=True).values_list('pk', flat=True).first()
+            if p_activo_id: self.periodo_id = p_activo_id
+        self.secretaria_id = self.departamento_imputacion.secretaria_id if self.departamento_imputacion_id else None
+        campos = kwargs.get('update_fields')
+        if campos is not None and 'departamento_imputacion' in campos: kwargs['update_fields'] = {*campos, 'secretaria'}
+        with transaction.atomic():
+            # Re-chequeo dentro de la transacción (y con lock donde la base lo soporta): un
+            # cierre que se confirmó mientras se completaba el formulario no se saltea
+            if self.periodo_id and Periodo.objects.select_for_update().filter(pk=self.periodo_id, cerrado=True).exists():
+                raise ValidationError("⛔ ERROR: Este período está CERRADO. No se pueden hacer cambios.")
+            self.full_clean()
+            previo = self._valores_previos()
+            super().save(*args, **kwargs)
+            # Resumen materializado en la misma transacción: si falla, el registro no se guarda
+            self._aplicar_delta_resumen(previo)
+
+    def _valores_previos(self):
+        # Los leídos en from_db; si la instancia no vino de la base (o con campos diferidos), desde la fila
+        previo = getattr(self, '_valores_originales', None)
+        if self.pk and (previo is None or len(previo) < len(CAMPOS_RESUMEN)):
+            previo = RegistroHora.objects.filter(pk=self.pk).values(*CAMPOS_RESUMEN).first()
+        return previo
+
+    def _aplicar_delta_resumen(self, previo):
+        from .resumenes import aplicar_delta
+        if previo:
+            aplicar_delta(previo['periodo_id'], previo['departamento_imputacion_id'], -previo['cantidad_horas'], -1)
+        aplicar_delta(self.periodo_id, self.departamento_imputacion_id, self.cantidad_horas, 1)
+        self._valores_originales = {f: getattr(self, f) for f in CAMPOS_RESUMEN}
         
     def delete(self, *args, **kwargs):
         if self.periodo and self.periodo.cerrado: raise ValidationError("⛔ ERROR: Período CERRADO.")
         super().delete(*args, **kwargs)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guardamos los valores leídos para poder calcular deltas del resumen sin otra consulta
+        instance = super().from_db(db, field_names, values)
+        instance._valores_originales = {f: getattr(instance, f) for f in CAMPOS_RESUMEN if f in field_names}
+        return instance
+
     def __str__(self): return f"{self.empleado} - {self.cantidad_horas}hs"
-    class Meta: verbose_name = "Registro de Hora"; verbose_name_plural = "Registros de Horas"; ordering = ['periodo', 'empleado']
+    class Meta:
+        verbose_name = "Registro de Hora"; verbose_name_plural = "Registros de Horas"; ordering = ['periodo', 'empleado']
+        indexes = [
+            # Resumen por empleado del PDF / lote / exportación: cubre el GROUP BY sin leer la tabla
+            models.Index(fields=['periodo', 'empleado', 'departamento_imputacion', 'cantidad_horas'], name='registro_periodo_empleado_idx'),
+            # Filtro por Secretaría (vía departamento) y recálculo de ResumenHoras
+            models.Index(fields=['periodo', 'departamento_imputacion', 'cantidad_horas'], name='registro_periodo_depto_idx'),
+            # Listado de un secretario (con o sin filtro de período)
+            models.Index(fields=['secretaria', 'periodo'], name='registro_sec_periodo_idx'),
+        ]
+
+# --- RESUMEN MATERIALIZADO: HORAS POR PERÍODO / SECRETARÍA / DEPARTAMENTO ---
+class ResumenHoras(models.Model):
+    periodo = models.ForeignKey(Periodo, on_delete=models.CASCADE, verbose_name="Período", db_index=False)  # cubierto por la restricción única
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Secretaría")
+    departamento = models.ForeignKey(Departamento, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Departamento")
+    total_horas = models.DecimalField(max_digits=12, decimal_places=1, default=0, verbose_name="Total de Horas")
+    cantidad_registros = models.PositiveIntegerField(default=0, verbose_name="Cantidad de Registros")
+    # Versión de la fila para el dashboard (?since=). Los UPDATE directos deben fijarla a mano.
+    actualizado = models.DateTimeField(auto_now=True, verbose_name="Actualizado")
+
+    def __str__(self): return f"{self.periodo_id}/{self.departamento_id}: {self.total_horas}hs"
+    class Meta:
+        verbose_name = "Resumen de Horas"; verbose_name_plural = "Resúmenes de Horas"
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'departamento'], name='resumen_periodo_departamento_unico'),
+            models.UniqueConstraint(fields=['periodo'], condition=models.Q(departamento__isnull=True), name='resumen_periodo_sin_departamento_unico'),
+        ]
+
+# --- TRABAJOS DE RENDERIZADO DE REPORTES (COLA EN SEGUNDO PLANO) ---
+class TrabajoReporte(models.Model):
+    PENDIENTE = 'pendiente'; PROCESANDO = 'procesando'; LISTO = 'listo'; ERROR = 'error'
+    ESTADOS = [(PENDIENTE, 'Pendiente'), (PROCESANDO, 'Renderizando'), (LISTO, 'Listo'), (ERROR, 'Error')]
+    periodo = models.ForeignKey(Periodo, on_delete=models.CASCADE, verbose_name="Período", db_index=False)
+    destinatario = models.CharField(max_length=20, verbose_name="Destinatario")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE, verbose_name="Estado")
+    etag = models.CharField(max_length=64, blank=True, verbose_name="Huella del PDF")
+    archivo = models.CharField(max_length=500, blank=True, verbose_name="Archivo generado")
+    error = models.TextField(blank=True, verbose_name="Detalle del error")
+    creado = models.DateTimeField(auto_now_add=True, verbose_name="Creado")
+    actualizado = models.DateTimeField(auto_now=True, verbose_name="Actualizado")
+
+    def __str__(self): return f"Reporte {self.periodo_id}/{self.destinatario} ({self.get_estado_display()})"
+    class Meta:
+        verbose_name = "Trabajo de Reporte"; verbose_name_plural = "Trabajos de Reportes"; ordering = ['-creado']
+        # Último trabajo por período y destinatario (columna de estado en PeriodoAdmin)
+        indexes = [models.Index(fields=['periodo', 'destinatario', '-creado'], name='trabajo_periodo_dest_idx')]
+
+# --- CIERRES Y REAPERTURAS DE PERÍODOS (FOTO INMUTABLE DE LOS TOTALES) ---
+class CierrePeriodo(models.Model):
+    CIERRE = 'cierre'; REAPERTURA = 'reapertura'
+    OPERACIONES = [(CIERRE, 'Cierre'), (REAPERTURA, 'Reapertura')]
+    # PROTECT: el historial de cierres es la auditoría del período; no se borra con él
+    periodo = models.ForeignKey(Periodo, on_delete=models.PROTECT, verbose_name="Período", db_index=False)
+    operacion = models.CharField(max_length=20, choices=OPERACIONES, default=CIERRE, verbose_name="Operación")
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Usuario")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+    total_horas = models.DecimalField(max_digits=12, decimal_places=1, default=0, verbose_name="Total de Horas")
+    cantidad_registros = models.PositiveIntegerField(default=0, verbose_name="Cantidad de Registros")
+    cantidad_empleados = models.PositiveIntegerField(default=0, verbose_name="Cantidad de Empleados")
+    detalle = models.JSONField(default=list, blank=True, verbose_name="Totales por Secretaría / Departamento")
+
+    def save(self, *args, **kwargs):
+        if self.pk: raise ValidationError("⛔ Los cierres registrados no se modifican.")
+        super().save(*args, **kwargs)
+    def __str__(self): return f"{self.get_operacion_display()} de {self.periodo} - {self.total_horas}hs"
+    class Meta:
+        verbose_name = "Cierre de Período"; verbose_name_plural = "Cierres de Períodos"; ordering = ['-fecha']
+        indexes = [models.Index(fields=['periodo', '-fecha'], name='cierre_periodo_fecha_idx')]
 
 # --- NUEVO: PERFIL DE USUARIO PARA SECRETARIOS ---
 class PerfilUsuario(models.Model):
@@ -83,4 +205,119 @@ class PerfilUsuario(models.Model):
 @receiver(post_save, sender=User)
 def crear_o_guardar_perfil_usuario(sender, instance, created, **kwargs):
     # Usamos get_or_create para evitar errores con usuarios viejos
-    PerfilUsuario.objects.get_or_create(usuario=instance)
\ No newline at end of file
+    PerfilUsuario.objects.get_or_create(usuario=instance)
+
+# --- CACHÉ DE REPORTES PDF: INVALIDACIÓN ---
+@receiver([post_save, post_delete], sender=RegistroHora)
+def invalidar_cache_por_registro(sender, instance, **kwargs):
+    from .cache_reportes import invalidar_periodo
+    invalidar_periodo(instance.periodo_id)
+
+@receiver([post_save, post_delete], sender=Periodo)
+def invalidar_cache_por_periodo(sender, instance, **kwargs):
+    # Al reabrir (o borrar) un período, sus PDF dejan de ser válidos
+    if not instance.cerrado or kwargs.get('signal') is post_delete:
+        from .cache_reportes import invalidar_periodo
+        invalidar_periodo(instance.pk)
+
+@receiver([post_save, post_delete], sender=Empleado)
+@receiver([post_save, post_delete], sender=Departamento)
+def invalidar_huella_por_maestros(sender, **kwargs):
+    # Nombres y departamentos impresos en el PDF que no cambian el resumen
+    from .cache_reportes import invalidar_maestros
+    invalidar_maestros()
+
+
+# --- RESUMEN MATERIALIZADO: MANTENIMIENTO INCREMENTAL ---
+# Los caminos masivos (bulk_create / update) no pasan por save(): deben enviar
+# esta señal con los períodos afectados para recalcular resumen y caché.
+registros_modificados = Signal()  # kwargs: periodo_ids
+
+# Altas y cambios: RegistroHora.save(), dentro de su transacción. Las bajas (también
+# las de queryset.delete() y en cascada) llegan acá dentro de la transacción del borrado.
+@receiver(post_delete, sender=RegistroHora)
+def actualizar_resumen_por_borrado(sender, instance, **kwargs):
+    from .resumenes import aplicar_delta
+    aplicar_delta(instance.periodo_id, instance.departamento_imputacion_id, -instance.cantidad_horas, -1)
+
+@receiver(post_save, sender=Departamento)
+def actualizar_resumen_por_departamento(sender, instance, **kwargs):
+    # Si el departamento cambió de Secretaría, el resumen se mueve con él
+    ResumenHoras.objects.filter(departamento=instance).exclude(secretaria_id=instance.secretaria_id).update(secretaria_id=instance.secretaria_id, actualizado=timezone.now())
+
+@receiver(registros_modificados)
+def recalcular_por_cambio_masivo(sender, periodo_ids, **kwargs):
+    from .resumenes import recalcular_resumen
+    from .cache_reportes import invalidar_periodo
+    recalcular_resumen(periodo_ids)
+    for periodo_id in periodo_ids: invalidar_periodo(periodo_id)
+
+# --- ADMIN: OPCIONES DE LOS FILTROS LATERALES EN CACHÉ (ver conteos.py) ---
+@receiver([post_save, post_delete], sender=Periodo)
+@receiver([post_save, post_delete], sender=Departamento)
+@receiver([post_save, post_delete], sender=Secretaria)
+def invalidar_opciones_filtro(sender, **kwargs):
+    from .conteos import invalidar_opciones_filtro
+    invalidar_opciones_filtro()
+
+# --- SECRETARÍA DENORMALIZADA EN EMPLEADO Y REGISTRO DE HORAS ---
+# Empleado.secretaria y RegistroHora.secretaria copian la Secretaría del
+# departamento (habitual / de imputación) para que el filtro de los secretarios
+# no necesite JOIN. save() las completa; los caminos masivos (bulk_create /
+# bulk_update) las asignan ellos mismos. Borrar una Secretaría las pone en NULL
+# por su propio on_delete.
+@receiver(post_save, sender=Departamento)
+def mover_secretaria_del_departamento(sender, instance, **kwargs):
+    # Si el departamento cambió de Secretaría: un UPDATE por tabla (solo las filas desactualizadas)
+    Empleado.objects.filter(departamento=instance).exclude(secretaria_id=instance.secretaria_id).update(secretaria_id=instance.secretaria_id)
+    RegistroHora.objects.filter(departamento_imputacion=instance).exclude(secretaria_id=instance.secretaria_id).update(secretaria_id=instance.secretaria_id)
+
+@receiver(pre_delete, sender=Departamento)
+def quitar_secretaria_de_empleados(sender, instance, **kwargs):
+    # Sus empleados quedan sin departamento (SET_NULL con un UPDATE directo): también sin Secretaría.
+    # Los registros imputados a él se borran en cascada.
+    Empleado.objects.filter(departamento=instance).update(secretaria=None)
+
+
+# --- BÚSQUEDA DE EMPLEADOS (FTS5): SINCRONIZACIÓN ---
+# Los caminos masivos (bulk_create / bulk_update / update) no disparan post_save:
+# deben enviar esta señal con los empleados afectados (None = reconstruir todo).
+empleados_modificados = Signal()  # kwargs: empleado_ids
+
+@receiver([post_save, post_delete], sender=Empleado)
+def indexar_empleado(sender, instance, **kwargs):
+    from .busqueda import indexar_empleados
+    indexar_empleados([instance.pk])
+
+@receiver(post_save, sender=Departamento)
+def indexar_empleados_del_departamento(sender, instance, **kwargs):
+    from .busqueda import indexar_departamentos
+    indexar_departamentos([instance.pk])
+
+@receiver(post_save, sender=Secretaria)
+def indexar_empleados_de_la_secretaria(sender, instance, **kwargs):
+    from .busqueda import indexar_secretarias
+    indexar_secretarias([instance.pk])
+
+@receiver(pre_delete, sender=Departamento)
+@receiver(pre_delete, sender=Secretaria)
+def recordar_empleados_a_indexar(sender, instance, **kwargs):
+    # Al borrar, la FK de los empleados pasa a NULL con un UPDATE directo: anotamos a quiénes reindexar
+    filtro = {'departamento': instance} if sender is Departamento else {'departamento__secretaria': instance}
+    instance._empleados_a_indexar = list(Empleado.objects.filter(**filtro).values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=Secretaria)
+def indexar_empleados_tras_borrado(sender, instance, **kwargs):
+    from .busqueda import indexar_empleados
+    indexar_empleados(getattr(instance, '_empleados_a_indexar', []))
+
+@receiver(empleados_modificados)
+def indexar_por_cambio_masivo(sender, empleado_ids, **kwargs):
+    from .busqueda import indexar_empleados
+    indexar_empleados(empleado_ids)
+
+@receiver(empleados_modificados)
+def invalidar_huella_por_cambio_masivo(sender, **kwargs):
+    from .cache_reportes import invalidar_maestros
+    invalidar_maestros()
@@ -0,0 +1,125 @@
+import logging
+import mimetypes
+import os
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+try:
+    from weasyprint.urls import URLFetcher, URLFetcherResponse
+except ImportError:  # WeasyPrint anterior a URLFetcher: el fetcher es una función que devuelve un dict
+    from weasyprint import default_url_fetcher
+    URLFetcher = None
+
+# ====================================================================
+# SERVICIO DE RENDERIZADO DE PDF (WEASYPRINT PRECALENTADO)
+# ====================================================================
+# Lo caro y fijo de cada PDF se hace una sola vez: la configuración de fuentes
+# (fontconfig carga todas las fuentes del sistema), el parseo de la hoja de
+# estilos (static/css/reporte_pdf.css, antes inline en la plantilla) y la
+# lectura de los estáticos (logo), que se sirven desde memoria en vez de
+# pedirlos por HTTP al propio servidor. FontConfiguration y el fetcher no son
+# seguros entre hilos, así que los renders de un mismo proceso van de a uno
+# (WeasyPrint es Python puro: con el GIL dos hilos tampoco rendían en
+# paralelo; el paralelismo real está en el pool de procesos de cola_reportes).
+# precalentar() se llama al arrancar wsgi/asgi y en el initializer del pool.
+
+log = logging.getLogger(__name__)
+
+HOJA_PDF = 'css/reporte_pdf.css'
+RECURSOS_PDF = ('logo.png',)
+
+_candado = threading.RLock()
+_recursos = None
+
+# --- ESTÁTICOS EN MEMORIA ---
+def nombre_estatico(url):
+    # '/static/logo.png' (con cualquier host) -> 'logo.png'; None si no es un estático
+    prefijo = '/' + urlsplit(settings.STATIC_URL).path.strip('/') + '/'
+    ruta = urlsplit(url).path
+    return ruta[len(prefijo):] if ruta.startswith(prefijo) else None
+
+def estatico_de_url(url):
+    nombre = nombre_estatico(url)
+    return leer_estatico(nombre) if nombre else None
+
+@lru_cache(maxsize=64)
+def leer_estatico(nombre):
+    # (contenido, tipo MIME) o None. Los estáticos cambian con un deploy, que reinicia los procesos.
+    ruta = finders.find(nombre)
+    if ruta is None or not os.path.isfile(ruta):
+        return None
+    with open(ruta, 'rb') as f:
+        return f.read(), mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+
+if URLFetcher is not None:
+    class FetcherEstaticos(URLFetcher):
+        def fetch(self, url, headers=None):
+            recurso = estatico_de_url(url)
+            if recurso is None:
+                return super().fetch(url, headers)
+            return URLFetcherResponse(url, recurso[0], {'Content-Type': recurso[1]})
+
+    def _nuevo_fetcher():
+        return FetcherEstaticos()
+else:
+    def _nuevo_fetcher():
+        def fetcher(url, *args, **kwargs):
+            recurso = estatico_de_url(url)
+            if recurso is None:
+                return default_url_fetcher(url, *args, **kwargs)
+            return {'string': recurso[0], 'mime_type': recurso[1], 'redirected_url': url}
+        return fetcher
+
+# --- RECURSOS DEL PROCESO ---
+class Recursos:
+    def __init__(self):
+        self.fuentes = FontConfiguration()
+        self.fetcher = _nuevo_fetcher()
+        self.hoja = CSS(string=hoja_de_estilos(), font_config=self.fuentes, url_fetcher=self.fetcher)
+        self.imagenes = {}  # caché de imágenes decodificadas de WeasyPrint
+
+def hoja_de_estilos():
+    recurso = leer_estatico(HOJA_PDF)
+    if recurso is None:
+        raise FileNotFoundError(f"No se encontró el estático '{HOJA_PDF}'.")
+    return recurso[0].decode('utf-8')
+
+def recursos():
+    global _recursos
+    with _candado:
+        if _recursos is None:
+            _recursos = Recursos()
+        return _recursos
+
+def renderizar(html_string, base_url):
+    with _candado:
+        r = recursos()
+        return HTML(string=html_string, base_url=base_url, url_fetcher=r.fetcher).write_pdf(
+            stylesheets=[r.hoja], font_config=r.fuentes, cache=r.imagenes)
+
+def descartar():
+    # Tras cambiar la hoja de estilos o los estáticos sin reiniciar (p. ej. en desarrollo)
+    global _recursos
+    with _candado:
+        _recursos = None
+        leer_estatico.cache_clear()
+
+def precalentar():
+    # Carga fuentes, hoja y estáticos, y renderiza un documento mínimo (la primera
+    # maquetación inicializa Pango). Un error acá no debe impedir que arranque el servidor.
+    if not getattr(settings, 'REPORTES_PRECALENTAR', True):
+        return
+    inicio = time.perf_counter()
+    try:
+        for nombre in RECURSOS_PDF: leer_estatico(nombre)
+        imagenes = ''.join(f'<img src="{settings.STATIC_URL}{nombre}">' for nombre in RECURSOS_PDF)
+        renderizar(f'<p>Precalentamiento</p><table><tr><td>-</td></tr></table>{imagenes}', 'http://localhost/')
+    except Exception:
+        log.warning('No se pudo precalentar el renderizado de PDF.', exc_info=True)
+        return
+    log.info('Renderizado de PDF precalentado en %.0f ms.', (time.perf_counter() - inicio) * 1000)
@@ -0,0 +1,49 @@
+import datetime
+from decimal import Decimal
+import locale
+from django.template.loader import render_to_string
+from .instrumentacion import etapa
+from .resumenes import resumen_por_empleado
+
+try: locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
+except: pass
+
+PLANTILLA_PDF = 'reportes/pdf_horas.html'
+UN_DECIMAL = Decimal('0.1')
+
+# Encabezados de la nota según el destinatario del reporte
+ENCABEZADOS = {
+    'andrea': {'linea1': 'A la', 'nombre': 'SRA. BALTIERI ANDREA SOLEDAD', 'cargo': 'A/C del Área Sueldos', 'organismo': 'del Gobierno de la Ciudad de Chajarí', 'ubicacion': 'S / D'},
+    'edith': {'linea1': 'A la SRA. SHORT, EDITH MARISA', 'nombre': '', 'cargo': 'Encargada del Área Sueldos', 'organismo': 'del Gobierno de la Ciudad de Chajarí', 'ubicacion': 'S / D'},
+}
+
+def normalizar_destinatario(destinatario):
+    # Cualquier valor distinto de 'andrea' se trata como 'edith' (comportamiento histórico de la vista)
+    return 'andrea' if destinatario == 'andrea' else 'edith'
+
+def fecha_nota(fecha=None):
+    fecha = fecha or datetime.date.today()
+    return f"Chajarí, {fecha.day} de {fecha.strftime('%B')} de {fecha.year}"
+
+def totalizar(filas):
+    # SQLite devuelve las sumas sin escala: se normalizan a un decimal como el campo original
+    filas = [dict(f, total_horas=f['total_horas'].quantize(UN_DECIMAL)) for f in filas]
+    return filas, sum((f['total_horas'] for f in filas), Decimal('0.0'))
+
+def contexto_reporte(periodo, destinatario, nota=None, filas=None, secretaria=None):
+    # 'filas' permite reutilizar un resumen ya calculado (generación en lote)
+    lista_final, total_general = totalizar(resumen_por_empleado(periodo) if filas is None else filas)
+    return {
+        'periodo': periodo, 'registros': lista_final, 'encabezado': ENCABEZADOS[normalizar_destinatario(destinatario)],
+        'fecha_nota': nota or fecha_nota(), 'total_general': total_general, 'secretaria': secretaria,
+    }
+
+def html_reporte(context):
+    with etapa('plantilla'):
+        return render_to_string(PLANTILLA_PDF, context)
+
+def renderizar_pdf(context, base_url):
+    html = html_reporte(context)
+    from .render_pdf import renderizar
+    with etapa('weasyprint'):
+        return renderizar(html, base_url)
@@ -0,0 +1,95 @@
+from django.db.models import Case, CharField, Count, F, FloatField, Max, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Departamento, Periodo, RegistroHora, ResumenHoras
+
+# ====================================================================
+# CAPA DE RESÚMENES: AGREGADOS CALCULADOS EN LA BASE DE DATOS
+# ====================================================================
+# Una fila por empleado (GROUP BY en SQL), compartida por el PDF, la
+# generación en lote, el dashboard histórico y las exportaciones.
+
+def resumen_por_empleado(periodo, secretaria=None, por_secretaria=False):
+    # Claves de cada fila: nombre, documento, departamento, total_horas, cargas
+    # (+ secretaria_pk / secretaria_nombre si por_secretaria=True)
+    if periodo.archivado:
+        from .archivo import resumen_por_empleado as desde_archivo
+        return desde_archivo(periodo, secretaria, por_secretaria)
+    qs = RegistroHora.objects.filter(periodo=periodo)
+    agrupar = {
+        'empleado_pk': F('empleado_id'), 'nombre': F('empleado__nombre_completo'),
+        'documento': F('empleado__legajo'), 'depto_habitual': F('empleado__departamento__nombre'),
+    }
+    if secretaria is not None:
+        qs = qs.filter(departamento_imputacion__secretaria=secretaria)
+    if por_secretaria:
+        # Mismo criterio que FiltroSecretariaMixin: la secretaría del departamento de imputación
+        qs = qs.filter(departamento_imputacion__secretaria__isnull=False)
+        agrupar.update(secretaria_pk=F('departamento_imputacion__secretaria_id'), secretaria_nombre=F('departamento_imputacion__secretaria__nombre'))
+
+    return (qs.values(**agrupar)
+        .annotate(total_horas=Sum('cantidad_horas'), cargas=Count('pk'))
+        # Una sola carga: se muestra el departamento de imputación; varias: el habitual del empleado
+        .annotate(departamento=Coalesce(
+            Case(When(cargas=1, then=Max('departamento_imputacion__nombre')), default=F('depto_habitual'), output_field=CharField()),
+            Value('-'), output_field=CharField()))
+        .order_by(*(['secretaria_nombre'] if por_secretaria else []), 'nombre', 'empleado_pk'))
+
+# Dashboard: se lee del resumen materializado, no de RegistroHora
+def totales_por_periodo(cerrado=None):
+    qs = ResumenHoras.objects.filter(cantidad_registros__gt=0)
+    if cerrado is not None:
+        qs = qs.filter(periodo__cerrado=cerrado)
+    return (qs.values('periodo_id', 'periodo__nombre', 'periodo__fecha_inicio')
+        .annotate(total_horas=Sum(Cast('total_horas', FloatField())), actualizado=Max('actualizado'))
+        .order_by('periodo__fecha_inicio', 'periodo_id'))
+
+def totales_por_secretaria(periodo):
+    return (ResumenHoras.objects.filter(periodo=periodo, cantidad_registros__gt=0)
+        .exclude(secretaria__isnull=True)
+        .values(secretaria_nombre=Coalesce('secretaria__nombre', Value('SIN SECRETARÍA', output_field=CharField())))
+        .annotate(total_horas=Sum(Cast('total_horas', FloatField())))
+        .order_by('secretaria_nombre'))
+
+# ====================================================================
+# MANTENIMIENTO DEL RESUMEN MATERIALIZADO (ResumenHoras)
+# ====================================================================
+def aplicar_delta(periodo_id, departamento_id, horas, cantidad):
+    if not periodo_id or not horas and not cantidad:
+        return
+    filas = ResumenHoras.objects.filter(periodo_id=periodo_id, departamento_id=departamento_id)
+    cambios = {'total_horas': F('total_horas') + horas, 'cantidad_registros': F('cantidad_registros') + cantidad, 'actualizado': timezone.now()}
+    # Al restar nunca creamos filas: en un borrado en cascada el período puede no existir ya
+    if filas.update(**cambios) or cantidad <= 0:
+        return
+    secretaria_id = Departamento.objects.filter(pk=departamento_id).values_list('secretaria_id', flat=True).first() if departamento_id else None
+    try:
+        with transaction.atomic():
+            ResumenHoras.objects.create(periodo_id=periodo_id, departamento_id=departamento_id, secretaria_id=secretaria_id, total_horas=horas, cantidad_registros=cantidad)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        filas.update(**cambios)
+
+def agregado_por_departamento(periodo_ids=None):
+    registros = RegistroHora.objects.exclude(periodo__isnull=True)
+    if periodo_ids is not None:
+        registros = registros.filter(periodo_id__in=periodo_ids)
+    return (registros.values('periodo_id', 'departamento_imputacion_id', 'departamento_imputacion__secretaria_id')
+        .annotate(total=Sum('cantidad_horas'), cantidad=Count('pk')).order_by())
+
+def recalcular_resumen(periodo_ids=None):
+    # Reconstruye desde RegistroHora los períodos indicados (o todos si periodo_ids es None)
+    # Los archivados no tienen registros en la tabla: su resumen se conserva como está
+    archivados = set(Periodo.objects.filter(archivado=True).values_list('pk', flat=True))
+    resumen = ResumenHoras.objects.exclude(periodo_id__in=archivados)
+    if periodo_ids is not None:
+        periodo_ids = [p for p in periodo_ids if p and p not in archivados]
+        resumen = resumen.filter(periodo_id__in=periodo_ids)
+    filas = agregado_por_departamento(periodo_ids)
+    with transaction.atomic():
+        resumen.delete()
+        ResumenHoras.objects.bulk_create([
+            ResumenHoras(periodo_id=f['periodo_id'], departamento_id=f['departamento_imputacion_id'], secretaria_id=f['departamento_imputacion__secretaria_id'], total_horas=f['total'], cantidad_registros=f['cantidad'])
+            for f in filas.iterator()
+        ], batch_size=500)
@@ -1,3 +1,1392 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import ProtectedError, Sum
+from decimal import Decimal
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from . import archivo, backups, busqueda, cola_reportes, conteos, contexto, datos_prueba, exportacion, historico, instrumentacion, lote_reportes, render_pdf
+from .importacion import ErrorImportacion, importar_registros
+from .models import CierrePeriodo, Departamento, Empleado, PerfilUsuario, Periodo, RegistroHora, ResumenHoras, Secretaria, TrabajoReporte, registros_modificados
+from .reportes import contexto_reporte
+from .cierres import ErrorCierre, cerrar_periodos
+from .resumenes import agregado_por_departamento, recalcular_resumen, resumen_por_empleado, totales_por_periodo, totales_por_secretaria
 
-# Create your tests here.
+# ====================================================================
+# PLANES DE CONSULTA: LAS RUTAS FRECUENTES DEBEN USAR LOS ÍNDICES
+# ====================================================================
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+class PlanesDeConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.secretaria = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.periodo = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31))
+
+    def plan(self, qs):
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return '\n'.join(fila[-1] for fila in cursor.fetchall())
+
+    def assertUsaIndice(self, qs, indice, tabla='calculos_registrohora'):
+        plan = self.plan(qs)
+        self.assertIn(indice, plan)
+        self.assertNotIn(f'SCAN {tabla}', plan)
+
+    def test_resumen_por_empleado_usa_indice_cubriente(self):
+        self.assertUsaIndice(resumen_por_empleado(self.periodo), 'COVERING INDEX registro_periodo_empleado_idx')
+
+    def test_resumen_por_secretaria_usa_indice_cubriente(self):
+        self.assertUsaIndice(resumen_por_empleado(self.periodo, por_secretaria=True), 'COVERING INDEX registro_periodo_empleado_idx')
+
+    def test_listado_filtrado_por_secretaria(self):
+        # Mismo filtro que FiltroSecretariaMixin: la Secretaría denormalizada, sin JOIN con departamento
+        qs = RegistroHora.objects.filter(periodo=self.periodo, secretaria=self.secretaria).select_related('empleado')
+        self.assertUsaIndice(qs, 'registro_sec_periodo_idx')
+        self.assertNotIn('calculos_departamento', str(qs.query))
+
+    def test_recalculo_de_resumen_usa_indice_cubriente(self):
+        self.assertUsaIndice(agregado_por_departamento([self.periodo.pk]), 'COVERING INDEX registro_periodo_depto_idx')
+
+    def test_torta_del_dashboard_no_recorre_el_resumen(self):
+        self.assertNotIn('SCAN calculos_resumenhoras', self.plan(totales_por_secretaria(self.periodo)))
+
+    def test_estado_de_trabajos_en_listado_de_periodos(self):
+        request = RequestFactory().get('/admin/calculos/periodo/')
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        qs = admin.site._registry[Periodo].get_queryset(request)
+        self.assertUsaIndice(qs, 'trabajo_periodo_dest_idx', tabla='U0')
+
+
+# ====================================================================
+# RESUMEN POR EMPLEADO: MISMO RESULTADO QUE LA AGRUPACIÓN EN PYTHON
+# ====================================================================
+def agrupar_en_python(registros):
+    # Agrupación original de la vista del PDF, antes del GROUP BY en SQL
+    por_empleado = {}
+    for r in registros.select_related('empleado__departamento', 'departamento_imputacion').order_by('empleado__nombre_completo', 'empleado_id'):
+        por_empleado.setdefault(r.empleado_id, []).append(r)
+    filas = []
+    for cargas in por_empleado.values():
+        empleado = cargas[0].empleado
+        if len(cargas) == 1:
+            depto = cargas[0].departamento_imputacion.nombre if cargas[0].departamento_imputacion else "-"
+        else:
+            depto = empleado.departamento.nombre if empleado.departamento else "-"
+        filas.append({'nombre': empleado.nombre_completo, 'documento': empleado.legajo, 'departamento': depto, 'total_horas': sum(c.cantidad_horas for c in cargas)})
+    return filas
+
+class ResumenPorEmpleadoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datos_prueba.generar(semilla=11, secretarias=3, departamentos=8, empleados=60, periodos=2, cobertura=0.9, desde=datetime.date(2024, 1, 1))
+        cls.periodo = Periodo.objects.get(activo=True)
+        con_secretaria = Departamento.objects.filter(secretaria__isnull=False).order_by('pk')
+        sin_secretaria = Departamento.objects.create(nombre='SIN SECRETARÍA')
+        # Casos borde: sin departamento habitual ni de imputación, varias cargas, homónimos
+        sin_depto = Empleado.objects.create(legajo='900', nombre_completo='AAA, SIN DEPARTAMENTO')
+        RegistroHora.objects.create(periodo=cls.periodo, empleado=sin_depto, cantidad_horas=Decimal('7.5'))
+        varias = Empleado.objects.create(legajo='901', nombre_completo='AAA, VARIAS CARGAS')
+        RegistroHora.objects.create(periodo=cls.periodo, empleado=varias, departamento_imputacion=con_secretaria[0], cantidad_horas=Decimal('3'))
+        RegistroHora.objects.create(periodo=cls.periodo, empleado=varias, departamento_imputacion=con_secretaria[1], cantidad_horas=Decimal('4.5'))
+        for legajo in ('902', '903'):
+            homonimo = Empleado.objects.create(legajo=legajo, nombre_completo='AAA, HOMÓNIMO', departamento=con_secretaria[2])
+            RegistroHora.objects.create(periodo=cls.periodo, empleado=homonimo, cantidad_horas=Decimal('10'))
+            RegistroHora.objects.create(periodo=cls.periodo, empleado=homonimo, departamento_imputacion=sin_secretaria, cantidad_horas=Decimal('2'))
+
+    def sql(self, **kwargs):
+        return [{k: f[k] for k in ('nombre', 'documento', 'departamento', 'total_horas')} for f in resumen_por_empleado(self.periodo, **kwargs)]
+
+    def test_general(self):
+        esperado = agrupar_en_python(RegistroHora.objects.filter(periodo=self.periodo))
+        self.assertEqual(self.sql(), esperado)
+        self.assertGreater(len(esperado), 50)
+        self.assertIn({'nombre': 'AAA, SIN DEPARTAMENTO', 'documento': '900', 'departamento': '-', 'total_horas': Decimal('7.5')}, esperado)
+        self.assertIn({'nombre': 'AAA, VARIAS CARGAS', 'documento': '901', 'departamento': '-', 'total_horas': Decimal('7.5')}, esperado)
+
+    def test_por_secretaria(self):
+        agrupado = {}
+        for fila in resumen_por_empleado(self.periodo, por_secretaria=True):
+            agrupado.setdefault(fila['secretaria_nombre'], []).append({k: fila[k] for k in ('nombre', 'documento', 'departamento', 'total_horas')})
+        esperado = {}
+        for secretaria in Secretaria.objects.order_by('nombre'):
+            filas = agrupar_en_python(RegistroHora.objects.filter(periodo=self.periodo, departamento_imputacion__secretaria=secretaria))
+            if filas: esperado[secretaria.nombre] = filas
+            self.assertEqual(self.sql(secretaria=secretaria), filas)
+        self.assertEqual(list(agrupado), list(esperado))
+        self.assertEqual(agrupado, esperado)
+
+
+# ====================================================================
+# RESUMEN MATERIALIZADO: MANTENIMIENTO INCREMENTAL = RECÁLCULO COMPLETO
+# ====================================================================
+class ResumenIncrementalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.salud = Secretaria.objects.create(nombre='Salud')
+        cls.alumbrado = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.obras)
+        cls.hospital = Departamento.objects.create(nombre='HOSPITAL', secretaria=cls.salud)
+        cls.suelto = Departamento.objects.create(nombre='SIN SECRETARÍA')
+        cls.enero = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False)
+        cls.febrero = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        cls.empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=cls.alumbrado)
+        cls.sin_depto = Empleado.objects.create(legajo='200', nombre_completo='PÉREZ, ANA')
+
+    def foto(self):
+        return list(ResumenHoras.objects.filter(cantidad_registros__gt=0).order_by('periodo_id', 'departamento_id').values_list('periodo_id', 'departamento_id', 'secretaria_id', 'total_horas', 'cantidad_registros'))
+
+    def assertIgualAlRecalculo(self):
+        incremental = self.foto()
+        recalcular_resumen()
+        self.assertEqual(incremental, self.foto())
+
+    def test_altas_cambios_y_bajas(self):
+        uno = RegistroHora.objects.create(periodo=self.enero, empleado=self.empleado, cantidad_horas=Decimal('10'))
+        dos = RegistroHora.objects.create(periodo=self.enero, empleado=self.sin_depto, cantidad_horas=Decimal('5'))
+        tres = RegistroHora.objects.create(periodo=self.enero, empleado=self.empleado, departamento_imputacion=self.hospital, cantidad_horas=Decimal('3'))
+        self.assertIgualAlRecalculo()
+        uno.cantidad_horas = Decimal('12.5'); uno.save()
+        self.assertIgualAlRecalculo()
+        uno.departamento_imputacion = self.suelto; uno.save()
+        self.assertIgualAlRecalculo()
+        dos.periodo = self.febrero; dos.save()
+        self.assertIgualAlRecalculo()
+        # Con campos diferidos los valores previos se leen de la fila
+        tres = RegistroHora.objects.defer('cantidad_horas').get(pk=tres.pk)
+        tres.periodo, tres.departamento_imputacion, tres.cantidad_horas = self.febrero, self.alumbrado, Decimal('4')
+        tres.save()
+        self.assertIgualAlRecalculo()
+        self.hospital.secretaria = self.obras; self.hospital.save()
+        self.assertIgualAlRecalculo()
+        uno.delete()
+        self.assertIgualAlRecalculo()
+        RegistroHora.objects.filter(pk=dos.pk).delete()
+        self.assertIgualAlRecalculo()
+        self.assertEqual(self.foto(), [(self.febrero.pk, self.alumbrado.pk, self.obras.pk, Decimal('4'), 1)])
+
+    def test_el_resumen_va_en_la_transaccion_del_registro(self):
+        registro = RegistroHora.objects.create(periodo=self.enero, empleado=self.empleado, cantidad_horas=Decimal('10'))
+        antes = self.foto()
+        with mock.patch('calculos.resumenes.aplicar_delta', side_effect=RuntimeError('resumen bloqueado')):
+            with self.assertRaises(RuntimeError):
+                RegistroHora.objects.create(periodo=self.enero, empleado=self.sin_depto, cantidad_horas=Decimal('5'))
+            registro.cantidad_horas = Decimal('20')
+            with self.assertRaises(RuntimeError):
+                registro.save()
+        self.assertEqual(list(RegistroHora.objects.values_list('cantidad_horas', flat=True)), [Decimal('10')])
+        self.assertEqual(self.foto(), antes)
+
+
+# ====================================================================
+# ADMIN SIN N+1: LA CANTIDAD DE CONSULTAS NO DEPENDE DE LAS FILAS
+# ====================================================================
+class ConsultasAdminTests(TestCase):
+    GRANDE = 150  # más que una página del listado (100 filas)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.periodo = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=True)
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.secretario = User.objects.create_user('secretario', password='clave', is_staff=True)
+        cls.secretario.user_permissions.add(*Permission.objects.filter(content_type__app_label='calculos', codename__in=[
+            'view_registrohora', 'change_registrohora', 'view_empleado', 'view_departamento']))
+        PerfilUsuario.objects.filter(usuario=cls.secretario).update(secretaria=cls.obras)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def sembrar(self, cantidad, secretaria=None):
+        # Cada empleado con su propio departamento y secretaría: el peor caso para __str__.
+        # Con 'secretaria', todos en esa (lo que ve su secretario)
+        inicio = Empleado.objects.count()
+        secretarias = [secretaria] * cantidad if secretaria else Secretaria.objects.bulk_create([Secretaria(nombre=f'Secretaría {inicio + i}') for i in range(cantidad)])
+        departamentos = Departamento.objects.bulk_create([Departamento(nombre=f'Depto {inicio + i}', secretaria=s) for i, s in enumerate(secretarias)])
+        empleados = Empleado.objects.bulk_create([Empleado(legajo=str(inicio + i), nombre_completo=f'Empleado {inicio + i:04}', departamento=d, secretaria=d.secretaria) for i, d in enumerate(departamentos)])
+        RegistroHora.objects.bulk_create([RegistroHora(periodo=self.periodo, empleado=e, departamento_imputacion=e.departamento, secretaria=e.secretaria, cantidad_horas=Decimal('10')) for e in empleados])
+        registros_modificados.send(sender=RegistroHora, periodo_ids=[self.periodo.pk])
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConsultasFijas(self, url, secretario=False):
+        # El secretario ve solo su Secretaría: se siembra también en otras para que el filtro trabaje
+        def sembrar(cantidad):
+            self.sembrar(cantidad)
+            if secretario: self.sembrar(cantidad, self.obras)
+        if secretario: self.client.force_login(self.secretario)
+        sembrar(5)
+        self.consultas(url)  # el primer pedido llena cachés (content types, sesión)
+        pocas = self.consultas(url)
+        sembrar(self.GRANDE)
+        self.assertEqual(self.consultas(url), pocas, f'{url}: la cantidad de consultas crece con las filas')
+
+    def test_listado_de_registros_editable(self):
+        self.assertConsultasFijas('/admin/calculos/registrohora/')
+
+    def test_listado_de_empleados(self):
+        self.assertConsultasFijas('/admin/calculos/empleado/')
+
+    def test_listado_de_departamentos(self):
+        self.assertConsultasFijas('/admin/calculos/departamento/')
+
+    def test_autocompletado_de_empleados(self):
+        self.assertConsultasFijas('/admin/autocomplete/?app_label=calculos&model_name=registrohora&field_name=empleado')
+
+    def test_autocompletado_de_departamentos(self):
+        self.assertConsultasFijas('/admin/autocomplete/?app_label=calculos&model_name=registrohora&field_name=departamento_imputacion')
+
+    def test_desplegable_de_departamentos_en_empleado(self):
+        self.assertConsultasFijas('/admin/calculos/empleado/add/')
+
+    def test_formulario_de_registro(self):
+        self.sembrar(1)
+        registro = RegistroHora.objects.first()
+        self.assertConsultasFijas(f'/admin/calculos/registrohora/{registro.pk}/change/')
+
+    # --- Secretario: listados filtrados por su Secretaría ---
+    def test_secretario_listado_de_registros_editable(self):
+        self.assertConsultasFijas('/admin/calculos/registrohora/', secretario=True)
+        cl = self.client.get('/admin/calculos/registrohora/').context['cl']
+        self.assertEqual((cl.result_count, len(cl.result_list)), (5 + self.GRANDE, 100))
+        self.assertEqual({r.secretaria_id for r in cl.result_list}, {self.obras.pk})
+
+    def test_secretario_listado_de_empleados(self):
+        self.assertConsultasFijas('/admin/calculos/empleado/', secretario=True)
+
+    def test_secretario_autocompletados(self):
+        self.assertConsultasFijas('/admin/autocomplete/?app_label=calculos&model_name=registrohora&field_name=empleado', secretario=True)
+        self.assertConsultasFijas('/admin/autocomplete/?app_label=calculos&model_name=registrohora&field_name=departamento_imputacion', secretario=True)
+
+    def test_secretario_formulario_de_registro(self):
+        self.sembrar(1, self.obras)
+        registro = RegistroHora.objects.get(secretaria=self.obras)
+        self.assertConsultasFijas(f'/admin/calculos/registrohora/{registro.pk}/change/', secretario=True)
+
+
+class GuardadoEnLoteTests(TestCase):
+    URL = '/admin/calculos/registrohora/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.alumbrado, cls.bacheo = Departamento.objects.create(nombre='ALUMBRADO'), Departamento.objects.create(nombre='BACHEO')
+        cls.cerrado = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False)
+        cls.periodo = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        empleados = [Empleado.objects.create(legajo=str(i), nombre_completo=f'Empleado {i}', departamento=cls.alumbrado) for i in range(3)]
+        cls.registros = [RegistroHora.objects.create(periodo=cls.periodo, empleado=e, cantidad_horas=Decimal('10')) for e in empleados]
+        cls.viejo = RegistroHora.objects.create(periodo=cls.cerrado, empleado=empleados[0], cantidad_horas=Decimal('10'))
+        Periodo.objects.filter(pk=cls.cerrado.pk).update(cerrado=True)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def guardar(self, cambios, url=URL):
+        # cambios: {registro: {campo: valor}}; el resto de la fila viaja como está
+        datos = {'form-TOTAL_FORMS': len(cambios), 'form-INITIAL_FORMS': len(cambios), '_save': 'Guardar'}
+        for i, (r, campos) in enumerate(cambios.items()):
+            fila = {'id': r.pk, 'cantidad_horas': r.cantidad_horas, 'departamento_imputacion': r.departamento_imputacion_id, **({'confirmar_exceso': 'on'} if r.confirmar_exceso else {}), **campos}
+            datos.update({f'form-{i}-{k}': v for k, v in fila.items() if v is not None})
+        return self.client.post(url, datos)
+
+    def resumen(self):
+        return list(ResumenHoras.objects.order_by('periodo_id', 'departamento_id').values_list('periodo_id', 'departamento_id', 'total_horas', 'cantidad_registros'))
+
+    def test_resumen_por_deltas(self):
+        uno, dos, tres = self.registros
+        with mock.patch('calculos.resumenes.recalcular_resumen', wraps=recalcular_resumen) as recalculo, self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.guardar({uno: {'cantidad_horas': '15'}, dos: {'departamento_imputacion': self.bacheo.pk}, tres: {}})
+        self.assertEqual(respuesta.status_code, 302)
+        recalculo.assert_not_called()
+        self.assertEqual(RegistroHora.objects.get(pk=uno.pk).cantidad_horas, Decimal('15'))
+        obtenido = self.resumen()
+        self.assertIn((self.periodo.pk, self.bacheo.pk, Decimal('10'), 1), obtenido)
+        recalcular_resumen()
+        self.assertEqual(obtenido, self.resumen())
+
+    def test_mas_de_180_sin_confirmar(self):
+        uno = self.registros[0]
+        respuesta = self.guardar({uno: {'cantidad_horas': '200'}})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('confirmar_exceso', respuesta.context['cl'].formset.errors[0])
+        self.assertEqual(RegistroHora.objects.get(pk=uno.pk).cantidad_horas, Decimal('10'))
+        self.assertEqual(self.guardar({uno: {'cantidad_horas': '200', 'confirmar_exceso': 'on'}}).status_code, 302)
+        self.assertEqual(ResumenHoras.objects.get(periodo=self.periodo, departamento=self.alumbrado).total_horas, Decimal('220'))
+
+    def test_periodo_cerrado(self):
+        resumen = self.resumen()
+        respuesta = self.guardar({self.viejo: {'cantidad_horas': '12'}}, f'{self.URL}?periodo__id__exact={self.cerrado.pk}')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['cl'].formset.total_error_count())
+        self.assertEqual(RegistroHora.objects.get(pk=self.viejo.pk).cantidad_horas, Decimal('10'))
+        self.assertEqual(self.resumen(), resumen)
+        # Cerrado entre que se armó el listado y se guardó: el re-chequeo del formset lo frena
+        Periodo.objects.filter(pk=self.periodo.pk).update(cerrado=True)
+        respuesta = self.guardar({self.registros[0]: {'cantidad_horas': '12'}})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(RegistroHora.objects.get(pk=self.registros[0].pk).cantidad_horas, Decimal('10'))
+
+
+# ====================================================================
+# DATOS DE PRUEBA Y BENCHMARK
+# ====================================================================
+class DatosPruebaTests(TestCase):
+    PARAMETROS = dict(semilla=7, secretarias=3, departamentos=8, empleados=40, periodos=4, cobertura=0.5)
+
+    def huella(self):
+        return list(RegistroHora.objects.order_by('periodo__fecha_inicio', 'empleado__legajo')
+            .values_list('periodo__nombre', 'empleado__legajo', 'empleado__nombre_completo', 'departamento_imputacion__nombre', 'cantidad_horas'))
+
+    def test_misma_semilla_mismos_datos(self):
+        datos_prueba.generar(**self.PARAMETROS)
+        primera = self.huella()
+        datos_prueba.borrar_todo()
+        self.assertFalse(datos_prueba.hay_datos())
+        datos_prueba.generar(**self.PARAMETROS)
+        self.assertEqual(self.huella(), primera)
+        self.assertEqual(len(primera), 4 * 20)
+
+    def test_resumen_y_periodos_coherentes(self):
+        datos_prueba.generar(**self.PARAMETROS)
+        self.assertEqual(ResumenHoras.objects.aggregate(t=Sum('total_horas'))['t'], RegistroHora.objects.aggregate(t=Sum('cantidad_horas'))['t'])
+        self.assertEqual(list(Periodo.objects.filter(activo=True).values_list('cerrado', flat=True)), [False])
+        self.assertEqual(Periodo.objects.filter(cerrado=True).count(), 3)
+
+    def test_benchmark_guarda_json(self):
+        datos_prueba.generar(**self.PARAMETROS)
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'resultado.json')
+            call_command('benchmark', repeticiones=1, filas_importacion=10, salida=salida, stdout=io.StringIO())
+            with open(salida, encoding='utf-8') as f:
+                resultado = json.load(f)
+        self.assertEqual(resultado['volumen']['registrohora'], 80)
+        self.assertIn('admin: registros (período activo)', resultado['resultados'])
+        self.assertIn('pdf: completo (caché de PDF vacía)', resultado['resultados'])
+        self.assertTrue(all({'ms_mediana', 'consultas'} <= set(r) for r in resultado['resultados'].values()))
+
+
+# ====================================================================
+# INSTRUMENTACIÓN POR REQUEST
+# ====================================================================
+class InstrumentacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        datos_prueba.generar(semilla=3, secretarias=2, departamentos=4, empleados=15, periodos=2, cobertura=1)
+        cls.cerrado = Periodo.objects.get(cerrado=True)
+
+    def setUp(self):
+        instrumentacion.reiniciar()
+        self.client.force_login(self.usuario)
+
+    def test_desactivada_no_toma_muestras(self):
+        self.client.get('/admin/calculos/registrohora/')
+        self.assertEqual(instrumentacion.estadisticas(), [])
+
+    @override_settings(INSTRUMENTACION_ACTIVA=True, INSTRUMENTACION_UMBRAL_MS=0, INSTRUMENTACION_LOG=None)
+    def test_registra_consultas_y_peticiones_lentas(self):
+        with self.assertLogs('calculos.lentas') as log:
+            self.client.get('/admin/calculos/registrohora/')
+            self.client.get('/admin/calculos/registrohora/')
+        fila, = instrumentacion.estadisticas()
+        self.assertEqual((fila['url'], fila['cantidad']), ('admin:calculos_registrohora_changelist', 2))
+        entrada = json.loads(log.records[0].getMessage())
+        self.assertGreater(entrada['consultas'], 0)
+        self.assertEqual(entrada['usuario'], 'admin')
+        self.assertEqual(len(entrada['consultas_lentas']), instrumentacion.CONSULTAS_LENTAS)
+
+    @override_settings(INSTRUMENTACION_ACTIVA=True, INSTRUMENTACION_UMBRAL_MS=0, INSTRUMENTACION_LOG=None)
+    def test_etapas_del_pdf(self):
+        with tempfile.TemporaryDirectory() as carpeta, self.settings(REPORTES_CACHE_DIR=carpeta), self.assertLogs('calculos.lentas') as log:
+            self.client.get(f'/reporte/pdf/{self.cerrado.pk}/andrea/')
+        self.assertLessEqual({'huella', 'datos', 'plantilla', 'weasyprint'}, set(json.loads(log.records[0].getMessage())['etapas']))
+
+    def test_percentiles(self):
+        tiempos = list(range(1, 101))
+        self.assertEqual([instrumentacion.percentil(tiempos, p) for p in (50, 90, 99)], [50, 90, 99])
+        self.assertEqual(instrumentacion.percentil([7], 95), 7)
+
+    def test_panel_solo_superusuario(self):
+        self.assertEqual(self.client.get('/admin/rendimiento/').status_code, 200)
+        User.objects.create_user('staff', password='clave', is_staff=True)
+        self.client.force_login(User.objects.get(username='staff'))
+        self.assertEqual(self.client.get('/admin/rendimiento/').status_code, 403)
+
+
+# ====================================================================
+# SERVICIO DE RENDERIZADO DE PDF
+# ====================================================================
+class RenderPdfTests(TestCase):
+    def test_estaticos_desde_memoria(self):
+        contenido, tipo = render_pdf.estatico_de_url('http://servidor:8000/static/logo.png')
+        self.assertEqual(tipo, 'image/png')
+        self.assertTrue(contenido.startswith(b'\x89PNG'))
+        self.assertIsNone(render_pdf.estatico_de_url('http://servidor:8000/reporte/pdf/1/andrea/'))
+        self.assertIsNone(render_pdf.estatico_de_url('http://servidor:8000/static/no-existe.png'))
+
+    def test_recursos_una_vez_por_proceso(self):
+        render_pdf.descartar()
+        primeros = render_pdf.recursos()
+        pdf = render_pdf.renderizar('<p>Hola</p><img src="/static/logo.png">', 'http://servidor:8000/')
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertIs(render_pdf.recursos(), primeros)
+
+    def test_plantilla_sin_estilos_inline(self):
+        # La hoja se parsea una vez (render_pdf.HOJA_PDF): un <style> en la plantilla se parsearía en cada PDF
+        from django.template.loader import get_template
+        from .reportes import PLANTILLA_PDF
+        with open(get_template(PLANTILLA_PDF).origin.name, encoding='utf-8') as f:
+            self.assertNotIn('<style', f.read())
+        self.assertIn('@page', render_pdf.hoja_de_estilos())
+
+
+# ====================================================================
+# CACHÉ DE REPORTES PDF: ETAG Y HUELLA DE LOS DATOS
+# ====================================================================
+@mock.patch('calculos.views.renderizar_pdf', return_value=b'%PDF-1.7 prueba')
+class CacheReportesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.depto = Departamento.objects.create(nombre='ALUMBRADO')
+        cls.periodo = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31))
+        cls.empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=cls.depto)
+        cls.registro = RegistroHora.objects.create(periodo=cls.periodo, empleado=cls.empleado, cantidad_horas=Decimal('10'))
+        Periodo.objects.filter(pk=cls.periodo.pk).update(cerrado=True)
+
+    def setUp(self):
+        cache.clear()
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(REPORTES_CACHE_DIR=carpeta.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.url = f'/reporte/pdf/{self.periodo.pk}/andrea/'
+
+    def pedir(self, etag=None):
+        with mock.patch('calculos.resumenes.resumen_por_empleado', wraps=resumen_por_empleado) as agregado:
+            respuesta = self.client.get(self.url, **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+        return respuesta, agregado.call_count
+
+    def test_304_sin_recorrer_el_resumen(self, renderizar):
+        respuesta, agregados = self.pedir()
+        self.assertEqual((respuesta.status_code, agregados, renderizar.call_count), (200, 1, 1))
+        respuesta, agregados = self.pedir(respuesta['ETag'])
+        self.assertEqual((respuesta.status_code, agregados, renderizar.call_count), (304, 0, 1))
+
+    def test_cambios_de_datos_cambian_el_etag(self, renderizar):
+        etag = self.pedir()[0]['ETag']
+        # Camino masivo: actualización directa + señal (recalcula el resumen)
+        RegistroHora.objects.filter(pk=self.registro.pk).update(cantidad_horas=Decimal('12'))
+        registros_modificados.send(sender=RegistroHora, periodo_ids=[self.periodo.pk])
+        respuesta = self.pedir(etag)[0]
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        etag = respuesta['ETag']
+        # Renombrar al empleado no toca el resumen pero sí el PDF
+        self.empleado.nombre_completo = 'GÓMEZ, JUAN JOSÉ'; self.empleado.save()
+        respuesta = self.pedir(etag)[0]
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(renderizar.call_count, 3)
+
+
+# ====================================================================
+# DASHBOARD HISTÓRICO: CACHÉ DE LOS PERÍODOS CERRADOS
+# ====================================================================
+class HistoricoCerradosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        depto = Departamento.objects.create(nombre='ALUMBRADO')
+        empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=depto)
+        cls.enero = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False)
+        cls.febrero = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        for periodo in (cls.enero, cls.febrero):
+            RegistroHora.objects.create(periodo=periodo, empleado=empleado, departamento_imputacion=depto, cantidad_horas=Decimal('10'))
+
+    def setUp(self):
+        cache.clear()
+
+    def cerrados(self):
+        with mock.patch('calculos.historico.totales_por_periodo', wraps=totales_por_periodo) as consulta:
+            ids = [p['id'] for p in historico.serie_cerrados()]
+        return ids, consulta.call_count
+
+    def test_cierre_y_dashboard(self):
+        self.assertEqual(self.cerrados(), ([], 1))
+        self.assertEqual(self.cerrados(), ([], 0))
+        cerrar_periodos([self.enero])
+        self.assertEqual(self.cerrados(), ([self.enero.pk], 1))
+        datos = self.client.get(reverse('reporte_historico_datos')).json()
+        self.assertEqual(datos['orden'], [[self.enero.pk, 'Período 01'], [self.febrero.pk, 'Período 02']])
+
+    def test_cambios_sin_senales_cambian_la_clave(self):
+        # Como otro worker con su propia caché local: sin invalidación, la versión de la base alcanza
+        self.assertEqual(self.cerrados(), ([], 1))
+        Periodo.objects.filter(pk=self.enero.pk).update(cerrado=True)
+        self.assertEqual(self.cerrados(), ([self.enero.pk], 1))
+        Periodo.objects.filter(pk=self.enero.pk).update(nombre='Enero 2025')
+        self.assertIn([self.enero.pk, 'Enero 2025'], self.client.get(reverse('reporte_historico_datos')).json()['orden'])
+        RegistroHora.objects.filter(periodo=self.enero).update(cantidad_horas=Decimal('12'))
+        recalcular_resumen([self.enero.pk])
+        self.assertEqual(historico.serie_cerrados()[0]['total_horas'], 12)
+        Periodo.objects.filter(pk=self.enero.pk).update(cerrado=False)
+        self.assertEqual(self.cerrados(), ([], 1))
+
+
+# ====================================================================
+# CIERRE Y REAPERTURA DESDE EL ADMIN
+# ====================================================================
+class CierreDesdeAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        depto = Departamento.objects.create(nombre='ALUMBRADO')
+        empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=depto)
+        cls.enero = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False)
+        cls.febrero = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        RegistroHora.objects.create(periodo=cls.enero, empleado=empleado, departamento_imputacion=depto, cantidad_horas=Decimal('10'))
+        # Más de 180hs sin confirmar: solo entra por un camino masivo
+        RegistroHora.objects.bulk_create([RegistroHora(periodo=cls.febrero, empleado=empleado, departamento_imputacion=depto, cantidad_horas=Decimal('200'))])
+        cls.admin = User.objects.create_superuser('admin', password='clave')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def editar(self, periodo, **cambios):
+        datos = {'nombre': periodo.nombre, 'fecha_inicio': periodo.fecha_inicio, 'fecha_fin': periodo.fecha_fin, **({'activo': 'on'} if periodo.activo else {}), **cambios}
+        return self.client.post(reverse('admin:calculos_periodo_change', args=[periodo.pk]), datos)
+
+    def test_cierre_invalido_se_rechaza_sin_guardar(self):
+        respuesta = self.editar(self.febrero, nombre='Febrero', cerrado='on')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('180hs sin confirmar', str(respuesta.context['adminform'].form.errors['cerrado']))
+        self.assertEqual(Periodo.objects.filter(pk=self.febrero.pk).values_list('nombre', 'cerrado').get(), ('Período 02', False))
+        self.assertFalse(CierrePeriodo.objects.exists())
+        # Listado editable: el mismo rechazo
+        respuesta = self.client.post(reverse('admin:calculos_periodo_changelist'), {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1, 'form-0-id': self.febrero.pk, 'form-0-activo': 'on', 'form-0-cerrado': 'on', '_save': 'Guardar'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['cl'].formset.errors[0]['cerrado'])
+        self.assertFalse(Periodo.objects.get(pk=self.febrero.pk).cerrado)
+
+    def test_cierre_y_reapertura_desde_el_formulario(self):
+        self.assertEqual(self.editar(self.enero, cerrado='on').status_code, 302)
+        self.assertTrue(Periodo.objects.get(pk=self.enero.pk).cerrado)
+        self.assertEqual(self.editar(self.enero).status_code, 302)
+        self.assertFalse(Periodo.objects.get(pk=self.enero.pk).cerrado)
+        self.assertEqual(list(CierrePeriodo.objects.order_by('pk').values_list('operacion', 'usuario', 'total_horas')),
+                         [(CierrePeriodo.CIERRE, self.admin.pk, Decimal('10')), (CierrePeriodo.REAPERTURA, self.admin.pk, Decimal('10'))])
+        # Un período archivado no se reabre
+        cerrar_periodos([self.enero]); Periodo.objects.filter(pk=self.enero.pk).update(archivado=True)
+        self.assertIn('archivado', str(self.editar(Periodo.objects.get(pk=self.enero.pk)).context['adminform'].form.errors['cerrado']))
+
+    def test_falla_del_cierre_deshace_el_guardado(self):
+        # Validó bien, pero entre la validación y el cierre alguien cargó horas: no queda nada a medias
+        with mock.patch('calculos.admin.cerrar_periodos', side_effect=ErrorCierre({self.enero: ['⚠️ cambió']})):
+            with self.assertRaises(ErrorCierre):
+                self.editar(self.enero, nombre='Enero', cerrado='on')
+        self.assertEqual(Periodo.objects.filter(pk=self.enero.pk).values_list('nombre', 'cerrado').get(), ('Período 01', False))
+
+    def test_historial_de_cierres_protegido(self):
+        cerrar_periodos([self.enero])
+        with self.assertRaises(ProtectedError):
+            Periodo.objects.get(pk=self.enero.pk).delete()
+
+
+class ColaReportesTests(TransactionTestCase):
+    def setUp(self):
+        datos_prueba.generar(semilla=7, secretarias=1, departamentos=2, empleados=5, periodos=2, cobertura=1)
+        self.cerrado = Periodo.objects.filter(cerrado=True).first()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(REPORTES_CACHE_DIR=carpeta.name)
+        ajustes.enable(); self.addCleanup(ajustes.disable)
+        # Un solo hilo para armar el HTML y un Future ya resuelto en lugar del pool de procesos
+        self.hilo = ThreadPoolExecutor(max_workers=1)
+        parche = mock.patch.object(cola_reportes, '_hilos', self.hilo)
+        parche.start(); self.addCleanup(parche.stop)
+        self.url = f'/reporte/pdf/{self.cerrado.pk}/andrea/encolar/'
+
+    def enviar(self, pdf=b'%PDF-1.7 cola', error=None):
+        def enviar_al_pool(html, base_url):
+            futuro = Future()
+            futuro.set_exception(error) if error else futuro.set_result(pdf)
+            return futuro
+        return mock.patch.object(cola_reportes, 'enviar_al_pool', side_effect=enviar_al_pool)
+
+    def esperar(self):
+        self.hilo.shutdown(wait=True)
+
+    def test_encolar_estado_y_descarga(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertContains(self.client.get('/admin/calculos/periodo/'), f'formaction="{self.url}?volver=')
+        with self.enviar() as enviar:
+            respuesta = self.client.post(self.url)
+            self.esperar()
+        self.assertEqual((respuesta.status_code, respuesta.json()['estado']), (202, TrabajoReporte.PROCESANDO))
+        self.assertEqual(enviar.call_count, 1)
+        estado = self.client.get(respuesta.json()['url_estado']).json()
+        self.assertEqual(estado['estado'], TrabajoReporte.LISTO)
+        descarga = self.client.get(estado['url_descarga'])
+        self.assertEqual(b''.join(descarga.streaming_content), b'%PDF-1.7 cola')
+        # Misma huella: se reutiliza el trabajo terminado
+        otra = self.client.post(self.url)
+        self.assertEqual((otra.status_code, otra.json()['id']), (200, estado['id']))
+        # Desde el admin vuelve al listado
+        volver = self.client.post(self.url + '?volver=/admin/calculos/periodo/')
+        self.assertRedirects(volver, '/admin/calculos/periodo/')
+
+    def test_error_del_renderizado(self):
+        with self.enviar(error=RuntimeError('sin memoria')):
+            trabajo_id = self.client.post(self.url).json()['id']
+            self.esperar()
+        estado = self.client.get(f'/reporte/trabajo/{trabajo_id}/').json()
+        self.assertEqual((estado['estado'], estado['error'], estado['url_descarga']), (TrabajoReporte.ERROR, 'sin memoria', None))
+        self.assertEqual(self.client.get(f'/reporte/trabajo/{trabajo_id}/descargar/').status_code, 404)
+
+
+    def test_zip_de_cierre_en_segundo_plano(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(lote_reportes, 'obtener_pool', return_value=pool), \
+             mock.patch.object(lote_reportes, 'renderizar_html', return_value=b'%PDF-1.7 lote') as renderizar, \
+             mock.patch.object(lote_reportes, 'huella_datos', wraps=lote_reportes.huella_datos) as huella:
+            respuesta = self.client.post('/admin/calculos/periodo/', {'action': 'descargar_cierre_zip', '_selected_action': [self.cerrado.pk]})
+            self.esperar()
+        self.assertRedirects(respuesta, '/admin/calculos/periodo/')
+        self.assertEqual(huella.call_count, 1)  # una vez por período, no por destinatario
+        trabajo = TrabajoReporte.objects.get(destinatario=cola_reportes.CIERRE_ZIP)
+        self.assertEqual(trabajo.estado, TrabajoReporte.LISTO)
+        descarga = self.client.get(f'/reporte/trabajo/{trabajo.pk}/descargar/')
+        self.assertEqual(descarga['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(descarga.streaming_content))) as zf:
+            nombres = zf.namelist()
+            self.assertEqual({zf.read(n) for n in nombres}, {b'%PDF-1.7 lote'})
+        secretarias = RegistroHora.objects.filter(periodo=self.cerrado, secretaria__isnull=False).values('secretaria').distinct().count()
+        self.assertEqual((len(nombres), renderizar.call_count), (2 + secretarias, 2 + secretarias))
+        self.assertContains(self.client.get('/admin/calculos/periodo/'), '📦 ZIP listo')
+
+# ====================================================================
+# BÚSQUEDA DE EMPLEADOS (FTS5)
+# ====================================================================
+@unittest.skipUnless(connection.vendor == 'sqlite', 'El índice de texto completo usa FTS5 de SQLite')
+class BusquedaEmpleadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.secretaria = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.depto = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.secretaria)
+        cls.empleado = Empleado.objects.create(legajo='20451', nombre_completo='GÓMEZ NÚÑEZ, JUAN JOSÉ', departamento=cls.depto)
+        Empleado.objects.create(legajo='30999', nombre_completo='PÉREZ, ANA', departamento=None)
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    def buscar(self, termino):
+        return set(Empleado.objects.filter(pk__in=busqueda.coincidencias(termino)).values_list('legajo', flat=True))
+
+    def test_prefijos_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.buscar('gomez ju'), {'20451'})
+        self.assertEqual(self.buscar('nuñez'), {'20451'})
+        self.assertEqual(self.buscar('204'), {'20451'})
+        self.assertEqual(self.buscar('publicas alum'), {'20451'})
+        self.assertEqual(self.buscar('gomez ana'), set())
+        self.assertIsNone(busqueda.coincidencias(' "*- '))
+
+    def test_se_mantiene_desde_las_senales(self):
+        self.depto.nombre = 'TALLERES'; self.depto.save()
+        self.assertEqual(self.buscar('talleres'), {'20451'})
+        self.secretaria.nombre = 'Servicios'; self.secretaria.save()
+        self.assertEqual(self.buscar('servicios'), {'20451'})
+        self.secretaria.delete()
+        self.assertEqual(self.buscar('servicios'), set())
+        self.depto.delete()
+        self.assertEqual(self.buscar('talleres'), set())
+        self.assertEqual(self.buscar('gomez'), {'20451'})
+        self.empleado.delete()
+        self.assertEqual(self.buscar('gomez'), set())
+
+    def test_importacion_masiva_indexa(self):
+        import tablib
+        from .admin import EmpleadoResourceMasivo
+        datos = tablib.Dataset(('20451', 'GÓMEZ, JUAN', 'ALUMBRADO'), ('77777', 'SOSA, MARÍA', 'CATASTRO'),
+                               headers=['Nº identificación', 'Nombre del empleado', 'Departamento'])
+        resultado = EmpleadoResourceMasivo().import_data(datos)
+        self.assertFalse(resultado.has_errors())
+        self.assertEqual(self.buscar('sosa catastro'), {'77777'})
+        self.assertEqual(self.buscar('nuñez'), set())
+
+    def test_admin_y_autocompletado(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get('/admin/autocomplete/', {'app_label': 'calculos', 'model_name': 'registrohora', 'field_name': 'empleado', 'term': 'gomez'})
+        self.assertEqual([r['id'] for r in respuesta.json()['results']], [str(self.empleado.pk)])
+        respuesta = self.client.get('/admin/calculos/empleado/', {'q': 'perez'})
+        self.assertEqual([e.legajo for e in respuesta.context['cl'].result_list], ['30999'])
+
+
+# ====================================================================
+# SECRETARÍA DENORMALIZADA EN EMPLEADO Y REGISTRO DE HORAS
+# ====================================================================
+class SecretariaDenormalizadaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.salud = Secretaria.objects.create(nombre='Salud')
+        cls.depto = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.obras)
+        cls.periodo = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=True)
+        cls.empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=cls.depto)
+        cls.registro = RegistroHora.objects.create(periodo=cls.periodo, empleado=cls.empleado, cantidad_horas=Decimal('10'))
+
+    def secretarias(self):
+        return (Empleado.objects.get(pk=self.empleado.pk).secretaria_id, RegistroHora.objects.get(pk=self.registro.pk).secretaria_id)
+
+    def test_save_copia_la_secretaria(self):
+        self.assertEqual(self.secretarias(), (self.obras.pk, self.obras.pk))
+
+    def test_mover_departamento_es_un_update_por_tabla(self):
+        self.depto.secretaria = self.salud
+        with CaptureQueriesContext(connection) as ctx:
+            self.depto.save()
+        actualizaciones = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE "calculos_empleado"', 'UPDATE "calculos_registrohora"'))]
+        self.assertEqual(len(actualizaciones), 2)
+        self.assertEqual(self.secretarias(), (self.salud.pk, self.salud.pk))
+
+    def test_borrados(self):
+        self.obras.delete()
+        self.assertEqual(self.secretarias(), (None, None))
+        self.depto.secretaria = self.salud; self.depto.save()
+        self.depto.delete()
+        self.assertIsNone(Empleado.objects.get(pk=self.empleado.pk).secretaria_id)
+
+    def test_caminos_masivos(self):
+        import tablib
+        from .admin import EmpleadoResourceMasivo
+        otro = Departamento.objects.create(nombre='HOSPITAL', secretaria=self.salud)
+        datos = tablib.Dataset(('100', 'GÓMEZ, JUAN', 'HOSPITAL'), ('200', 'SOSA, ANA', 'HOSPITAL'), headers=['Nº identificación', 'Nombre del empleado', 'Departamento'])
+        self.assertFalse(EmpleadoResourceMasivo().import_data(datos).has_errors())
+        self.assertEqual(set(Empleado.objects.values_list('legajo', 'secretaria_id')), {('100', self.salud.pk), ('200', self.salud.pk)})
+        resultado = importar_registros([(2, {'legajo': '200', 'horas': '5'}), (3, {'legajo': '100', 'horas': '3', 'departamento': 'ALUMBRADO'})], self.periodo)
+        self.assertEqual(resultado.creados, 2)
+        nuevos = RegistroHora.objects.exclude(pk=self.registro.pk)
+        self.assertEqual(sorted(nuevos.values_list('secretaria_id', flat=True)), sorted([self.salud.pk, self.obras.pk]))
+        self.assertEqual(nuevos.filter(departamento_imputacion=otro).get().secretaria_id, self.salud.pk)
+
+    def test_secretario_filtra_sin_join(self):
+        usuario = User.objects.create_user('secretario', password='clave', is_staff=True)
+        PerfilUsuario.objects.filter(usuario=usuario).update(secretaria=self.salud)
+        otro = Departamento.objects.create(nombre='HOSPITAL', secretaria=self.salud)
+        propio = RegistroHora.objects.create(periodo=self.periodo, empleado=self.empleado, departamento_imputacion=otro, cantidad_horas=Decimal('4'))
+        request = RequestFactory().get('/admin/calculos/registrohora/')
+        request.user = usuario
+        qs = admin.site._registry[RegistroHora].get_queryset(request)
+        self.assertEqual(list(qs), [propio])
+        self.assertIn('"calculos_registrohora"."secretaria_id" =', str(qs.query))
+        self.assertEqual(list(admin.site._registry[Empleado].get_queryset(request)), [])
+
+
+# ====================================================================
+# IMPORTACIÓN DE EMPLEADOS (FILA POR FILA Y MASIVA)
+# ====================================================================
+class ImportacionEmpleadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.alumbrado = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.obras)
+        Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=cls.alumbrado)
+
+    def importar(self, recurso):
+        import tablib
+        datos = tablib.Dataset(
+            ('100', 'GÓMEZ, JUAN', 'alumbrado'),       # sin cambios: se saltea
+            (200.0, 'SOSA, ANA', 'TALLERES'),           # legajo repetido: vale la última fila
+            ('', 'SIN LEGAJO', ''),                     # sin legajo: se saltea
+            ('300', 'PÉREZ, LUIS', 'ALUMBRADO'),
+            ('200', 'SOSA, ANA MARÍA', 'Catastro'),
+            headers=['Nº identificación', 'Nombre del empleado', 'Departamento'])
+        with mock.patch.object(Empleado, 'save', autospec=True, side_effect=Empleado.save) as guardar:
+            resultado = recurso().import_data(datos)
+        self.assertFalse(resultado.has_errors())
+        return resultado, guardar.call_count
+
+    def test_fila_por_fila_y_masiva_dan_lo_mismo(self):
+        from .admin import EmpleadoResource, EmpleadoResourceMasivo
+        for recurso, guardados in ((EmpleadoResource, 2), (EmpleadoResourceMasivo, 0)):
+            with self.subTest(recurso=recurso.__name__), transaction.atomic():
+                resultado, llamadas = self.importar(recurso)
+                self.assertEqual(llamadas, guardados)
+                self.assertEqual((resultado.totals['new'], resultado.totals['skip']), (2, 2))
+                self.assertEqual(sorted(Empleado.objects.values_list('legajo', 'nombre_completo', 'departamento__nombre', 'secretaria_id')), [
+                    ('100', 'GÓMEZ, JUAN', 'ALUMBRADO', self.obras.pk), ('200', 'SOSA, ANA MARÍA', 'CATASTRO', None), ('300', 'PÉREZ, LUIS', 'ALUMBRADO', self.obras.pk)])
+                # Solo se crea el departamento de la fila que quedó
+                self.assertEqual(sorted(Departamento.objects.values_list('nombre', flat=True)), ['ALUMBRADO', 'CATASTRO'])
+                if connection.vendor == 'sqlite':
+                    self.assertEqual(set(Empleado.objects.filter(pk__in=busqueda.coincidencias('sosa catastro')).values_list('legajo', flat=True)), {'200'})
+                transaction.set_rollback(True)
+
+    def test_la_masiva_es_una_opcion_del_formulario(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        respuesta = self.client.get('/admin/calculos/empleado/import/')
+        self.assertEqual([n for _, n in respuesta.context['form'].fields['resource'].choices], ['Empleados (fila por fila)', 'Empleados (importación masiva)'])
+
+
+# ====================================================================
+# IMPORTACIÓN MASIVA DE HORAS
+# ====================================================================
+class ImportacionHorasTests(TestCase):
+    URL = '/admin/calculos/registrohora/importar-horas/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.salud = Secretaria.objects.create(nombre='Salud')
+        cls.alumbrado = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.obras)
+        cls.hospital = Departamento.objects.create(nombre='HOSPITAL', secretaria=cls.salud)
+        cls.periodo = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        cls.cerrado = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False, cerrado=True)
+        Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN', departamento=cls.alumbrado)
+        Empleado.objects.create(legajo='200', nombre_completo='SOSA, ANA', departamento=cls.hospital)
+        cls.secretario = User.objects.create_user('secretario', password='clave', is_staff=True)
+        cls.secretario.user_permissions.add(*Permission.objects.filter(codename__in=['add_registrohora', 'view_registrohora']))
+        PerfilUsuario.objects.filter(usuario=cls.secretario).update(secretaria=cls.obras)
+
+    def subir(self, contenido, simular=False, omitir_cargadas=False):
+        archivo = io.BytesIO(contenido.encode()); archivo.name = 'horas.csv'
+        return self.client.post(self.URL, {'archivo': archivo, 'periodo': self.periodo.pk, **({'simular': 'on'} if simular else {}), **({'omitir_cargadas': 'on'} if omitir_cargadas else {})})
+
+    def test_secretario_solo_importa_su_secretaria(self):
+        self.client.force_login(self.secretario)
+        resultado = self.subir('Legajo;Horas;Departamento\n100;10;\n200;5;\n100;3;HOSPITAL\n').context['resultado']
+        self.assertEqual([n for n, _ in resultado.errores], [3, 4])
+        self.assertFalse(RegistroHora.objects.exists())
+        resultado = self.subir('Legajo;Horas;Departamento\n100;10;\n100;3;ALUMBRADO\n').context['resultado']
+        self.assertEqual((resultado.errores, resultado.creados), ([], 2))
+        self.assertEqual(set(RegistroHora.objects.values_list('secretaria_id', flat=True)), {self.obras.pk})
+
+    def test_filas_ya_cargadas(self):
+        filas = [(2, {'legajo': '100', 'horas': '10'}), (3, {'legajo': '200', 'horas': '5,5'})]
+        self.assertEqual(importar_registros(filas, self.periodo).creados, 2)
+        # Por defecto se informan y se cargan igual: dos cargas de 10hs del mismo legajo son válidas
+        resultado = importar_registros(filas + [(4, {'legajo': '100', 'horas': '10'})], self.periodo)
+        self.assertEqual((resultado.creados, [n for n, _ in resultado.ya_cargadas]), (3, [2, 3]))
+        self.assertEqual(RegistroHora.objects.filter(empleado__legajo='100', cantidad_horas=10).count(), 3)
+        # La simulación las muestra antes de guardar
+        self.client.force_login(self.secretario)
+        respuesta = self.subir('Legajo;Horas\n100;10\n100;7\n', simular=True)
+        self.assertEqual([n for n, _ in respuesta.context['resultado'].ya_cargadas], [2])
+        self.assertContains(respuesta, 'se cargan igual')
+        # Con 'omitir filas ya cargadas' se saltean; cada registro existente cubre una sola fila
+        resultado = self.subir('Legajo;Horas\n100;10\n100;10\n100;10\n100;10\n', omitir_cargadas=True).context['resultado']
+        self.assertEqual((resultado.creados, len(resultado.ya_cargadas)), (1, 3))
+        self.assertEqual(RegistroHora.objects.filter(empleado__legajo='100', cantidad_horas=10).count(), 4)
+
+    def test_periodo_cerrado(self):
+        with self.assertRaisesMessage(ErrorImportacion, 'CERRADO'):
+            importar_registros([(2, {'legajo': '100', 'horas': '10'})], self.cerrado)
+        # Cerrado mientras se leía el archivo (la instancia todavía lo ve abierto)
+        periodo = Periodo.objects.get(pk=self.periodo.pk)
+        Periodo.objects.filter(pk=periodo.pk).update(cerrado=True)
+        with self.assertRaisesMessage(ErrorImportacion, 'fue CERRADO durante la importación'):
+            importar_registros([(2, {'legajo': '100', 'horas': '10'})], periodo)
+        self.assertFalse(RegistroHora.objects.exists())
+        # Desde el admin ni siquiera se ofrece
+        self.client.force_login(self.secretario)
+        self.assertIn('periodo', self.subir('Legajo;Horas\n100;10\n').context['form'].errors)
+
+    def test_simulacion(self):
+        RegistroHora.objects.create(periodo=self.periodo, empleado=Empleado.objects.get(legajo='100'), cantidad_horas=Decimal('4'))
+        resumen = list(ResumenHoras.objects.values_list('departamento_id', 'total_horas'))
+        self.client.force_login(self.secretario)
+        resultado = self.subir('Legajo;Horas\n100;10\n100;2\n', simular=True).context['resultado']
+        self.assertEqual((resultado.simulacion, resultado.creados, resultado.errores), (True, 0, []))
+        self.assertEqual(resultado.diferencias, [{'legajo': '100', 'nombre': 'GÓMEZ, JUAN', 'horas_actuales': Decimal('4.0'), 'horas_importadas': Decimal('12.0'), 'total_resultante': Decimal('16.0')}])
+        self.assertEqual(RegistroHora.objects.count(), 1)
+        self.assertEqual(list(ResumenHoras.objects.values_list('departamento_id', 'total_horas')), resumen)
+
+
+# ====================================================================
+# EXPORTACIÓN DE LA LIQUIDACIÓN (CSV / XLSX)
+# ====================================================================
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datos_prueba.generar(semilla=9, secretarias=2, departamentos=6, empleados=60, periodos=2, cobertura=0.9, desde=datetime.date(2024, 1, 1))
+        cls.cerrado = Periodo.objects.get(cerrado=True)
+        cls.abierto = Periodo.objects.get(activo=True)
+        cls.admin = User.objects.create_superuser('admin', password='clave')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_csv_en_streaming(self):
+        esperado = list(exportacion.filas_liquidacion(self.cerrado))
+        with mock.patch.object(exportacion, 'TAMANIO_BLOQUE', 512):
+            respuesta = self.client.get(reverse('reporte_exportar', args=[self.cerrado.pk, 'csv']))
+            bloques = list(respuesta.streaming_content)
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment;', respuesta['Content-Disposition'])
+        self.assertGreater(len(bloques), 2)
+        texto = b''.join(bloques).decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeffLegajo,Nombre,Departamento,Total horas'))
+        filas = texto.splitlines()[1:]
+        self.assertEqual(len(filas), len(esperado))
+        self.assertEqual(filas[0].split(',')[-1], str(esperado[0][-1]))
+        # Período abierto: bloqueado como el PDF
+        self.assertEqual(self.client.get(reverse('reporte_exportar', args=[self.abierto.pk, 'csv'])).status_code, 400)
+
+    def test_xlsx_sin_openpyxl(self):
+        with mock.patch.dict(sys.modules, {'openpyxl': None}):
+            with self.assertRaises(exportacion.ErrorExportacion):
+                exportacion.xlsx_temporal(iter([]), 'Período')
+            respuesta = self.client.get(reverse('reporte_exportar', args=[self.cerrado.pk, 'xlsx']))
+        self.assertContains(respuesta, 'openpyxl', status_code=400)
+
+    def test_boton_xlsx_solo_con_openpyxl(self):
+        url, xlsx = reverse('admin:calculos_periodo_changelist'), reverse('reporte_exportar', args=[self.cerrado.pk, 'xlsx'])
+        with mock.patch('calculos.admin.xlsx_disponible', return_value=False):
+            self.assertNotContains(self.client.get(url), xlsx)
+        with mock.patch('calculos.admin.xlsx_disponible', return_value=True):
+            self.assertContains(self.client.get(url), xlsx)
+        self.assertEqual(exportacion.xlsx_disponible(), importlib.util.find_spec('openpyxl') is not None)
+
+
+# ====================================================================
+# CONTEXTO POR PETICIÓN: SIN COPIAS ENTRE REQUESTS
+# ====================================================================
+class ContextoPorPeticionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.salud = Secretaria.objects.create(nombre='Salud')
+        cls.enero = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=True)
+        cls.febrero = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=False)
+        cls.empleado = Empleado.objects.create(legajo='100', nombre_completo='GÓMEZ, JUAN')
+        cls.usuario = User.objects.create_user('secretario', password='clave', is_staff=True)
+        PerfilUsuario.objects.filter(usuario=cls.usuario).update(secretaria=cls.obras)
+
+    def request(self):
+        request = RequestFactory().get('/admin/')
+        request.user = self.usuario
+        return request
+
+    def test_alta_sin_periodo_lee_el_activo_de_la_base(self):
+        self.assertEqual(RegistroHora.objects.create(empleado=self.empleado, cantidad_horas=Decimal('1')).periodo_id, self.enero.pk)
+        # Cambio hecho por otro worker (UPDATE directo, sin señales en este proceso)
+        Periodo.objects.filter(pk=self.enero.pk).update(activo=False)
+        Periodo.objects.filter(pk=self.febrero.pk).update(activo=True)
+        self.assertEqual(RegistroHora.objects.create(empleado=self.empleado, cantidad_horas=Decimal('1')).periodo_id, self.febrero.pk)
+        self.assertEqual(contexto.periodo_activo_id(), self.febrero.pk)
+
+    def test_secretaria_una_vez_por_request(self):
+        request = self.request()
+        self.assertEqual(contexto.secretaria_usuario(request), self.obras)
+        with self.assertNumQueries(0):
+            self.assertEqual(contexto.secretaria_usuario(request), self.obras)
+        PerfilUsuario.objects.filter(usuario=self.usuario).update(secretaria=self.salud)
+        self.assertEqual(contexto.secretaria_usuario(request), self.obras)  # el mismo request no cambia a mitad de camino
+        self.assertEqual(contexto.secretaria_usuario(self.request()), self.salud)
+
+
+# ====================================================================
+# LISTADO DE REGISTROS: CONTEOS DESDE EL RESUMEN Y FILTROS EN CACHÉ
+# ====================================================================
+class ConteosListadoTests(TestCase):
+    URL = '/admin/calculos/registrohora/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.obras = Secretaria.objects.create(nombre='Obras Públicas')
+        cls.alumbrado = Departamento.objects.create(nombre='ALUMBRADO', secretaria=cls.obras)
+        cls.hospital = Departamento.objects.create(nombre='HOSPITAL')
+        cls.viejo = Periodo.objects.create(nombre='Período 01', fecha_inicio=datetime.date(2025, 1, 1), fecha_fin=datetime.date(2025, 1, 31), activo=False)
+        cls.activo = Periodo.objects.create(nombre='Período 02', fecha_inicio=datetime.date(2025, 2, 1), fecha_fin=datetime.date(2025, 2, 28), activo=True)
+        for i in range(6):
+            empleado = Empleado.objects.create(legajo=str(i), nombre_completo=f'{"GÓMEZ" if i % 2 else "PÉREZ"}, EMPLEADO {i}', departamento=cls.alumbrado if i < 4 else cls.hospital)
+            RegistroHora.objects.create(periodo=cls.viejo, empleado=empleado, cantidad_horas=Decimal('5'))
+            if i < 3: RegistroHora.objects.create(periodo=cls.activo, empleado=empleado, cantidad_horas=Decimal('8'))
+        # Sin período (no hay resumen para estos)
+        RegistroHora.objects.filter(pk=RegistroHora.objects.filter(periodo=cls.viejo).order_by('pk').values('pk')[:1]).update(periodo=None)
+        registros_modificados.send(sender=RegistroHora, periodo_ids=[cls.viejo.pk])
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def listado(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(self.URL, params)
+        self.assertEqual(respuesta.status_code, 200)
+        cl = respuesta.context['cl']
+        conteos_tabla = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT COUNT(*)') and 'FROM "calculos_registrohora"' in q['sql'] and 'IS NULL' not in q['sql']]
+        return cl, conteos_tabla
+
+    def test_conteos_desde_el_resumen(self):
+        for params, esperado, total in (
+            ({}, 3, 3),  # período activo por defecto
+            ({'periodo__id__exact': self.viejo.pk}, 5, 9),
+            ({'periodo__id__exact': self.viejo.pk, 'departamento_imputacion__id__exact': self.hospital.pk}, 2, 9),
+            ({'o': '1'}, 9, 9),  # toda la historia, con el registro sin período
+        ):
+            cl, conteos_tabla = self.listado(**params)
+            self.assertEqual((cl.result_count, cl.full_result_count), (esperado, total), params)
+            self.assertEqual(len(cl.result_list), esperado)
+            self.assertEqual(conteos_tabla, [], params)
+
+    def test_secretario(self):
+        usuario = User.objects.create_user('secretario', password='clave', is_staff=True)
+        usuario.user_permissions.add(Permission.objects.get(codename='view_registrohora'))
+        PerfilUsuario.objects.filter(usuario=usuario).update(secretaria=self.obras)
+        self.client.force_login(usuario)
+        cl, conteos_tabla = self.listado(periodo__id__exact=self.viejo.pk)
+        self.assertEqual((cl.result_count, cl.full_result_count, conteos_tabla), (3, 7, []))  # 4 del período viejo (uno sin período) + 3 del activo
+
+    def test_busqueda_cuenta_una_vez_por_version_del_periodo(self):
+        cl, conteos_tabla = self.listado(q='gomez', periodo__id__exact=self.activo.pk)
+        self.assertEqual((cl.result_count, len(conteos_tabla)), (1, 1))
+        cl, conteos_tabla = self.listado(q='gomez', periodo__id__exact=self.activo.pk)
+        self.assertEqual((cl.result_count, len(conteos_tabla)), (1, 0))
+        RegistroHora.objects.create(periodo=self.activo, empleado=Empleado.objects.get(legajo='3'), cantidad_horas=Decimal('2'))
+        cl, conteos_tabla = self.listado(q='gomez', periodo__id__exact=self.activo.pk)
+        self.assertEqual((cl.result_count, len(conteos_tabla)), (2, 1))
+
+    def test_opciones_de_filtros_en_cache(self):
+        def opciones():
+            respuesta = self.client.get(self.URL)
+            filtro = next(f for f in respuesta.context['cl'].filter_specs if f.field_path == 'departamento_imputacion')
+            return [nombre for _, nombre in filtro.lookup_choices]
+        self.assertEqual(opciones(), ['ALUMBRADO (Obras Públicas)', 'HOSPITAL'])
+        obtener = mock.Mock(return_value=[])
+        conteos.opciones_filtro(Departamento, [], obtener)
+        obtener.assert_not_called()
+        self.obras.nombre = 'Servicios'; self.obras.save()
+        self.assertEqual(opciones(), ['ALUMBRADO (Servicios)', 'HOSPITAL'])
+
+
+# ====================================================================
+# COPIAS DE SEGURIDAD: COPIA EN LÍNEA, RETENCIÓN Y RESTAURACIÓN
+# ====================================================================
+class BackupsTests(SimpleTestCase):
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        # Caracteres que rompen una URI sin codificar ('?' empieza la query, '#' el fragmento)
+        self.carpeta = os.path.join(carpeta.name, 'datos #1 ?x')
+        self.directorio = os.path.join(self.carpeta, 'backups')
+        os.makedirs(self.directorio)
+        self.base = os.path.join(self.carpeta, 'base de datos.sqlite3')
+        with closing(sqlite3.connect(self.base)) as conexion, conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('CREATE TABLE horas (id INTEGER PRIMARY KEY, legajo TEXT, horas REAL)')
+            conexion.executemany('INSERT INTO horas (legajo, horas) VALUES (?, ?)', [(str(i), i / 10) for i in range(5000)])
+        parche = mock.patch.object(backups, 'ruta_base_datos', return_value=self.base)
+        parche.start(); self.addCleanup(parche.stop)
+        self.archivo = os.path.join(self.carpeta, 'archivo')
+        ajustes = override_settings(ARCHIVO_DIR=self.archivo)
+        ajustes.enable(); self.addCleanup(ajustes.disable)
+
+    def filas(self, ruta):
+        with closing(sqlite3.connect(ruta)) as conexion:
+            return conexion.execute('SELECT count(*), sum(horas) FROM horas').fetchone()
+
+    def test_backup_comprimido_por_tramos(self):
+        with mock.patch('calculos.backups.tempfile.mkstemp', wraps=tempfile.mkstemp) as temporales, \
+             mock.patch('calculos.backups.shutil.copyfileobj', wraps=shutil.copyfileobj) as copias:
+            ruta, digest, tamanio, comprimido = backups.crear_backup(self.directorio, paginas=8, pausa=0)
+        # Copia en un .sqlite3 temporal junto al backup (no en memoria), comprimida por tramos y borrada al final
+        self.assertEqual([(c.kwargs['dir'], c.kwargs['suffix']) for c in temporales.call_args_list], [(self.directorio, '.sqlite3.tmp'), (self.directorio, '.gz.tmp')])
+        self.assertEqual([c.args[2] for c in copias.call_args_list], [backups.TAMANIO_BLOQUE])
+        self.assertEqual(sorted(os.listdir(self.directorio)), [os.path.basename(ruta), os.path.basename(ruta) + '.sha256'])
+        self.assertEqual((backups.sha256_archivo(ruta), backups.leer_sidecar(ruta)), (digest, digest))
+        self.assertLess(comprimido, tamanio)
+        destino = os.path.join(self.carpeta, 'restaurada.sqlite3')
+        backups.restaurar('completo', ruta, destino)
+        self.assertEqual(self.filas(destino), self.filas(self.base))
+
+    def test_retencion_escalonada(self):
+        ahora = datetime.datetime(2025, 6, 15, 12, 30)
+        f = lambda *a: datetime.datetime(2025, *a)
+        conservar = {f(6, 15, 12, 10), f(6, 15, 11, 50), f(6, 15, 10, 40), f(6, 14, 18, 0), f(6, 13, 10, 0), f(5, 20, 8, 0)}
+        borrar = {f(6, 15, 12, 0), f(6, 15, 11, 20), f(6, 14, 9, 0), f(6, 10, 10, 0), f(5, 2, 8, 0), f(1, 1, 8, 0)}
+        self.assertEqual(backups.a_conservar(conservar | borrar, ahora, horarios=2, diarios=3, mensuales=4), conservar)
+        # El último nunca se borra, aunque quede fuera de todas las ventanas
+        self.assertEqual(backups.a_conservar([f(1, 1, 8, 0)], ahora, horarios=0, diarios=0, mensuales=0), {f(1, 1, 8, 0)})
+        self.assertEqual(backups.a_conservar([], ahora, horarios=2, diarios=3, mensuales=4), set())
+        # Sobre los archivos: también se borra el .sha256
+        for fecha in conservar | borrar:
+            nombre = os.path.join(self.directorio, f'{backups.PREFIJO}{fecha:%Y-%m-%d_%H-%M-%S}.sqlite3.gz')
+            open(nombre, 'w').close(); backups.escribir_sidecar(nombre, '0' * 64)
+        borrados = backups.aplicar_retencion(self.directorio, ahora=ahora, horarios=2, diarios=3, mensuales=4)
+        self.assertEqual(len(borrados), len(borrar))
+        self.assertEqual({f for f, _ in backups.listar_backups(self.directorio)}, conservar)
+        self.assertEqual(len(os.listdir(self.directorio)), 2 * len(conservar))
+
+    def modificar(self):
+        with closing(sqlite3.connect(self.base)) as conexion, conexion:
+            conexion.execute('UPDATE horas SET horas = horas + 1 WHERE id > 4900')
+
+    def test_incremental_restaura_y_recolecta(self):
+        base = backups.directorio_incrementales(self.directorio)
+        with mock.patch('calculos.backups.tempfile.mkstemp', wraps=tempfile.mkstemp) as temporales:
+            viejo, total, nuevos, _ = backups.crear_incremental(self.directorio, ahora=datetime.datetime(2025, 6, 1, 10))
+        self.assertEqual(nuevos, total)
+        # Los bloques salen de una copia temporal en disco, que no queda
+        self.assertEqual((temporales.call_args_list[0].kwargs['dir'], temporales.call_args_list[0].kwargs['suffix']), (base, '.sqlite3.tmp'))
+        self.assertEqual(sorted(n for n in os.listdir(base) if not n.startswith('.')), [os.path.basename(viejo), 'objetos'])
+        filas_viejas = self.filas(self.base)
+        self.modificar()
+        ruta, total, nuevos, _ = backups.crear_incremental(self.directorio, ahora=datetime.datetime(2025, 6, 1, 11))
+        self.assertTrue(0 < nuevos < total)
+        destino = os.path.join(self.carpeta, 'restaurada.sqlite3')
+        backups.restaurar('incremental', viejo, destino)
+        self.assertEqual(self.filas(destino), filas_viejas)
+        with open(viejo) as f:
+            self.assertEqual(os.path.getsize(destino), json.load(f)['tamanio'])
+        # Sin el manifiesto viejo sus bloques propios sobran; los del nuevo quedan
+        os.remove(viejo)
+        self.assertEqual(backups.recolectar_bloques(self.directorio), nuevos)
+        self.assertEqual(backups.recolectar_bloques(self.directorio), 0)
+        os.remove(destino)
+        backups.restaurar('incremental', ruta, destino)
+        self.assertEqual(self.filas(destino), self.filas(self.base))
+        # Un bloque faltante corta la restauración
+        with open(ruta) as f:
+            os.remove(backups._ruta_bloque(os.path.dirname(ruta), json.load(f)['bloques'][-1]))
+        with self.assertRaises(backups.ErrorRestauracion):
+            backups.restaurar('incremental', ruta, destino)
+
+    def test_recoleccion_espera_al_incremental_en_curso(self):
+        # Bloques ya escritos y manifiesto todavía no: la recolección no los toca hasta que termine
+        with ThreadPoolExecutor(max_workers=1) as hilo:
+            with backups.candado_incrementales(self.directorio):
+                huerfano = backups._ruta_bloque(backups.directorio_incrementales(self.directorio), 'ab' * 32)
+                os.makedirs(os.path.dirname(huerfano)); open(huerfano, 'w').close()
+                recoleccion = hilo.submit(backups.recolectar_bloques, self.directorio)
+                self.assertRaises(TimeoutError, recoleccion.result, timeout=0.3)
+                self.assertTrue(os.path.exists(huerfano))
+            self.assertEqual(recoleccion.result(timeout=5), 1)
+
+    def archivar(self, *periodos):
+        # Archivo en frío simulado: un .col por período y el manifiesto
+        os.makedirs(self.archivo, exist_ok=True)
+        for pk in periodos:
+            with open(os.path.join(self.archivo, f'periodo_{pk:06d}.col'), 'wb') as f: f.write(f'{pk};'.encode() * 1000)
+        with open(os.path.join(self.archivo, 'manifiesto.json'), 'w') as f: json.dump({'periodos': {str(pk): {} for pk in periodos}}, f)
+        return self.contenido(self.archivo)
+
+    def contenido(self, carpeta):
+        return {n: open(os.path.join(carpeta, n), 'rb').read() for n in os.listdir(carpeta)}
+
+    def test_backup_completo_incluye_el_archivo(self):
+        viejo, *_ = backups.crear_backup(self.directorio, pausa=0, ahora=datetime.datetime(2025, 6, 1, 10))
+        self.assertEqual(len(os.listdir(self.directorio)), 2)  # sin nada archivado no hay paquete
+        archivados = self.archivar(1, 2)
+        ruta, *_ = backups.crear_backup(self.directorio, pausa=0, ahora=datetime.datetime(2025, 6, 1, 11))
+        paquete = backups.ruta_archivo_en_frio(ruta)
+        self.assertEqual(backups.sha256_archivo(paquete), backups.leer_sidecar(paquete))
+        destino = os.path.join(self.carpeta, 'restaurada.sqlite3')
+        self.assertIsNone(backups.restaurar('completo', viejo, destino))
+        carpeta = backups.restaurar('completo', ruta, destino)
+        self.assertEqual(self.contenido(carpeta), archivados)
+        # Perdido ARCHIVO_DIR, vuelve desde la copia
+        shutil.rmtree(self.archivo)
+        backups.reemplazar_archivo(carpeta)
+        self.assertEqual(self.contenido(self.archivo), archivados)
+        # La retención borra el paquete junto con su backup
+        backups.crear_backup(self.directorio, pausa=0, ahora=datetime.datetime(2025, 6, 1, 12))
+        backups.aplicar_retencion(self.directorio, ahora=datetime.datetime(2025, 6, 1, 12), horarios=0, diarios=0, mensuales=0)
+        self.assertEqual(len(os.listdir(self.directorio)), 4)
+        self.assertFalse(os.path.exists(paquete))
+
+    def test_incremental_incluye_el_archivo(self):
+        archivados = self.archivar(1)
+        backups.crear_incremental(self.directorio, ahora=datetime.datetime(2025, 6, 1, 10))
+        archivados = {**archivados, **self.archivar(1, 2)}  # el .col del 1 no cambia: no se vuelve a guardar
+        ruta, total, nuevos, _ = backups.crear_incremental(self.directorio, ahora=datetime.datetime(2025, 6, 1, 11))
+        self.assertEqual(nuevos, 2)  # el .col nuevo y el manifiesto
+        shutil.rmtree(self.archivo)
+        self.assertEqual(backups.recolectar_bloques(self.directorio), 0)
+        destino = os.path.join(self.carpeta, 'restaurada.sqlite3')
+        self.assertEqual(self.contenido(backups.restaurar('incremental', ruta, destino)), archivados)
+
+    def test_reemplazar_pide_confirmacion_y_vacia_la_cache(self):
+        with override_settings(BACKUPS_DIR=self.directorio):
+            backups.crear_backup(paginas=-1, pausa=0)
+            filas_viejas = self.filas(self.base)
+            self.modificar()
+            modificadas = self.filas(self.base)
+            destino = os.path.join(self.carpeta, 'restaurada.sqlite3')
+            cache.set('calculos:prueba', 1)
+            with mock.patch('builtins.input', return_value='no'):
+                call_command('restaurar_backup', destino=destino, reemplazar=True, stdout=io.StringIO())
+            self.assertEqual((self.filas(self.base), cache.get('calculos:prueba')), (modificadas, 1))
+            call_command('restaurar_backup', destino=destino, reemplazar=True, interactive=False, stdout=io.StringIO())
+            self.assertEqual((self.filas(self.base), cache.get('calculos:prueba')), (filas_viejas, None))
+
+
+# ====================================================================
+# ARCHIVO EN FRÍO DE PERÍODOS CERRADOS
+# ====================================================================
+class ArchivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        datos_prueba.generar(semilla=3, secretarias=2, departamentos=5, empleados=30, periodos=3, cobertura=0.8, desde=datetime.date(2020, 1, 1))
+        cls.periodo = Periodo.objects.filter(cerrado=True).order_by('fecha_inicio').first()
+        # Empleados con varias cargas en el período (el departamento del PDF pasa a ser el habitual)
+        otro = Departamento.objects.exclude(pk=Empleado.objects.first().departamento_id).first()
+        RegistroHora.objects.bulk_create([RegistroHora(periodo=cls.periodo, empleado=e, departamento_imputacion=otro, secretaria_id=otro.secretaria_id, cantidad_horas=Decimal('2.5'))
+                                          for e in Empleado.objects.order_by('pk')[:3]])
+        registros_modificados.send(sender=RegistroHora, periodo_ids=[cls.periodo.pk])
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(ARCHIVO_DIR=carpeta.name)
+        ajustes.enable(); self.addCleanup(ajustes.disable)
+
+    def salidas(self):
+        from .cache_reportes import huella_datos
+        from .exportacion import filas_liquidacion
+        periodo = Periodo.objects.get(pk=self.periodo.pk)
+        secretaria = Secretaria.objects.order_by('pk').first()
+        return {
+            'pdf': contexto_reporte(periodo, 'andrea', 'nota')['registros'], 'huella': huella_datos(periodo),
+            'lote': list(resumen_por_empleado(periodo, por_secretaria=True)), 'secretaria': list(resumen_por_empleado(periodo, secretaria=secretaria)),
+            'exportacion': list(filas_liquidacion(periodo)), 'historico': list(totales_por_secretaria(periodo)),
+        }
+
+    def test_archivar_conserva_reportes_e_historico(self):
+        antes = self.salidas()
+        resumen = list(ResumenHoras.objects.filter(periodo=self.periodo).values_list('departamento_id', 'total_horas', 'cantidad_registros').order_by('departamento_id'))
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(backups, 'crear_backup', return_value=('db_backup_x.sqlite3.gz',)) as copia:  # el manifiesto se escribe al confirmar
+            call_command('archivar_periodos', meses=1, stdout=io.StringIO())
+        copia.assert_called_once_with()  # los registros borrados quedan respaldados enseguida
+        self.assertEqual(Periodo.objects.filter(archivado=True).count(), 2)
+        self.assertFalse(RegistroHora.objects.filter(periodo__archivado=True).exists())
+        self.assertTrue(RegistroHora.objects.filter(periodo__activo=True).exists())
+        self.assertEqual(self.salidas(), antes)
+        # El resumen del archivado se conserva aunque se reconstruya todo
+        from .resumenes import recalcular_resumen
+        recalcular_resumen()
+        self.assertEqual(list(ResumenHoras.objects.filter(periodo=self.periodo).values_list('departamento_id', 'total_horas', 'cantidad_registros').order_by('departamento_id')), resumen)
+        self.assertEqual(conteos.desde_resumen(periodo_id=self.periodo.pk), 0)
+        self.assertEqual(set(archivo.leer_manifiesto()['periodos']), {str(p) for p in Periodo.objects.filter(archivado=True).values_list('pk', flat=True)})
+        call_command('archivar_periodos', verificar=True, stdout=io.StringIO())
+
+    def test_reabrir_un_archivado_no_se_permite(self):
+        from .cierres import ErrorCierre, reabrir_periodos
+        archivo.archivar_periodo(self.periodo)
+        with self.assertRaises(ErrorCierre):
+            reabrir_periodos([self.periodo])
+        with self.assertRaises(archivo.ErrorArchivo):
+            archivo.archivar_periodo(self.periodo)
+
+    def test_backup_al_archivar(self):
+        salida = io.StringIO()
+        with mock.patch.object(backups, 'crear_backup') as copia:
+            call_command('archivar_periodos', meses=1, simular=True, stdout=io.StringIO())
+            call_command('archivar_periodos', periodos=[self.periodo.pk], sin_backup=True, stdout=salida)
+        copia.assert_not_called()
+        self.assertIn('⚠️ Sin copia de seguridad', salida.getvalue())
+        # Si la copia falla, el comando termina con error aunque el período ya esté archivado
+        otro = Periodo.objects.filter(cerrado=True, archivado=False).first()
+        with mock.patch.object(backups, 'crear_backup', side_effect=OSError('disco lleno')), self.assertRaisesMessage(CommandError, 'disco lleno'):
+            call_command('archivar_periodos', periodos=[otro.pk], stdout=io.StringIO())
+        self.assertTrue(Periodo.objects.get(pk=otro.pk).archivado)
+
+    def test_simular_y_archivo_danado(self):
+        call_command('archivar_periodos', meses=1, simular=True, stdout=io.StringIO())
+        self.assertFalse(Periodo.objects.filter(archivado=True).exists())
+        archivo.archivar_periodo(self.periodo)
+        ruta = archivo.ruta_periodo(self.periodo.pk)
+        with open(ruta, 'r+b') as f:
+            f.seek(-3, os.SEEK_END); f.write(b'xyz')
+        self.assertEqual([problema for _, problema in archivo.verificar()][:1], [f"❌ {ruta}: la columna 'confirmar_exceso' está dañada."])
+
+
+# ====================================================================
+# VISTAS ASYNC DE LOS REPORTES (ASGI)
+# ====================================================================
+# TransactionTestCase: las consultas corren en otros hilos (otras conexiones), que no ven
+# lo que está dentro de la transacción de un TestCase
+class VistasAsyncTests(TransactionTestCase):
+    def setUp(self):
+        datos_prueba.generar(semilla=5, secretarias=2, departamentos=4, empleados=15, periodos=3, cobertura=1)
+        self.cerrado = Periodo.objects.filter(cerrado=True).order_by('fecha_inicio').first()
+        self.activo = Periodo.objects.get(activo=True)
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(REPORTES_CACHE_DIR=carpeta.name)
+        ajustes.enable(); self.addCleanup(ajustes.disable)
+
+    def test_dashboard_igual_que_la_vista_sync(self):
+        sync = self.client.get('/reporte/historico/datos/')
+        self.assertEqual(sync.resolver_match.func.__module__, 'calculos.views')
+
+        async def pedir():
+            cliente = AsyncClient()
+            return await cliente.get('/reporte/historico/datos/'), await cliente.get('/reporte/historico/datos/?since=x')
+        respuesta, invalida = async_to_sync(pedir)()
+        self.assertEqual(respuesta.resolver_match.func.__module__, 'calculos.vistas_async')
+        self.assertEqual(respuesta.json(), sync.json())
+        self.assertEqual(respuesta['ETag'], sync['ETag'])
+        self.assertEqual(invalida.status_code, 400)
+
+    def test_pdf_un_solo_renderizado_para_pedidos_simultaneos(self):
+        # El pool de procesos se reemplaza por un hilo (no hace falta levantar procesos en las pruebas)
+        hilo = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(hilo.shutdown)
+        renderizados = []
+        def enviar(html, base_url):
+            renderizados.append(base_url)
+            return hilo.submit(render_pdf.renderizar, html, base_url)
+        url = f'/reporte/pdf/{self.cerrado.pk}/andrea/'
+
+        async def pedir():
+            cliente = AsyncClient()
+            respuestas = await asyncio.gather(*(cliente.get(url) for _ in range(4)))
+            condicional = await cliente.get(url, headers={'If-None-Match': respuestas[0]['ETag']})
+            abierto = await cliente.get(f'/reporte/pdf/{self.activo.pk}/andrea/')
+            return respuestas, condicional, abierto
+        with mock.patch('calculos.vistas_async.enviar_al_pool', side_effect=enviar):
+            respuestas, condicional, abierto = async_to_sync(pedir)()
+        self.assertEqual(len(renderizados), 1)
+        self.assertEqual({(r.status_code, r.content) for r in respuestas}, {(200, respuestas[0].content)})
+        self.assertTrue(respuestas[0].content.startswith(b'%PDF'))
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(abierto.status_code, 400)
+        # El PDF quedó en la caché en disco: la vista sync lo sirve sin renderizar
+        self.assertEqual(self.client.get(url).content, respuestas[0].content)
+
+    def test_prueba_de_carga(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'carga.json')
+            call_command('carga_reportes', segundos=0.3, usuarios=2, sin_pdf=True, salida=salida, stdout=io.StringIO())
+            with open(salida, encoding='utf-8') as f:
+                resultados = json.load(f)['resultados']
+        self.assertEqual(set(resultados), {'wsgi', 'asgi'})
+        for r in resultados.values():
+            self.assertGreater(r['pedidos'], 0)
+            self.assertEqual(r['errores'], 0, r['primeros_errores'])
+            self.assertIn('p95', r['admin_ms'])
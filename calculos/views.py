@@ -1,17 +1,36 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, HttpResponseBadRequest
-from django.db.models import Sum, FloatField, Value, CharField 
-from django.db.models.functions import Coalesce, Cast
-from django.template.loader import render_to_string
-from weasyprint import HTML
-import datetime
-import locale
-from django.utils import timezone
-from collections import defaultdict
+from django.shortcuts import render, get_object_or_404, redirect
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, FileResponse, Http404, StreamingHttpResponse
+from django.contrib import messages
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag, url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+import hashlib
+import json
+import os
 import calculos.models as models 
+from .cache_reportes import EntradaCache
+from .cola_reportes import encolar_reporte
+from .exportacion import ErrorExportacion, csv_en_streaming, filas_liquidacion, xlsx_temporal
+from .historico import datos_historico
+from . import instrumentacion
+from .reportes import PLANTILLA_PDF, contexto_reporte, fecha_nota, normalizar_destinatario, renderizar_pdf
 
-try: locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-except: pass
+def respuesta_periodo_abierto(periodo):
+    mensaje = f"""
+    <html>
+        <head><title>Bloqueo de Reporte</title></head>
+        <body style="font-family: sans-serif; padding: 30px;">
+            <h2 style="color: #dc3545;">❌ Error de Regla de Negocio</h2>
+            <p style="font-size: 16px;">El período <b>{periodo.nombre}</b> debe estar <b>CERRADO</b> (marcado con el candado) antes de generar el reporte de liquidación final.</p>
+            <p><b>Acción Requerida:</b> Vaya al menú Módulos > Períodos, marque el período como "Cerrado" y vuelva a intentarlo.</p>
+        </body>
+    </html>
+    """
+    return HttpResponseBadRequest(mensaje)
 
 # ====================================================================
 # FUNCIÓN 1: GENERACIÓN DE PDF
@@ -20,92 +39,141 @@ def generar_reporte_pdf(request, periodo_id, destinatario):
     periodo = get_object_or_404(models.Periodo, pk=periodo_id)
     
     if not periodo.cerrado:
-        mensaje = f"""
-        <html>
-            <head><title>Bloqueo de Reporte</title></head>
-            <body style="font-family: sans-serif; padding: 30px;">
-                <h2 style="color: #dc3545;">❌ Error de Regla de Negocio</h2>
-                <p style="font-size: 16px;">El período <b>{periodo.nombre}</b> debe estar <b>CERRADO</b> (marcado con el candado) antes de generar el reporte de liquidación final.</p>
-                <p><b>Acción Requerida:</b> Vaya al menú Módulos > Períodos, marque el período como "Cerrado" y vuelva a intentarlo.</p>
-            </body>
-        </html>
-        """
-        return HttpResponseBadRequest(mensaje)
+        return respuesta_periodo_abierto(periodo)
     
-    if destinatario == 'andrea':
-        encabezado = {'linea1': 'A la', 'nombre': 'SRA. BALTIERI ANDREA SOLEDAD', 'cargo': 'A/C del Área Sueldos', 'organismo': 'del Gobierno de la Ciudad de Chajarí', 'ubicacion': 'S / D'}
-    else:
-        encabezado = {'linea1': 'A la SRA. SHORT, EDITH MARISA', 'nombre': '', 'cargo': 'Encargada del Área Sueldos', 'organismo': 'del Gobierno de la Ciudad de Chajarí', 'ubicacion': 'S / D'}
-    
-    registros_raw = models.RegistroHora.objects.filter(periodo=periodo).select_related(
-        'empleado', 'empleado__departamento', 'departamento_imputacion'
-    ).order_by('empleado__nombre_completo')
-
-    agrupados = defaultdict(lambda: {'empleado': None, 'lista_registros': []})
-    for r in registros_raw:
-        agrupados[r.empleado.id]['empleado'] = r.empleado
-        agrupados[r.empleado.id]['lista_registros'].append(r)
-
-    lista_final = []
-    total_general = 0
-
-    for item in agrupados.values():
-        empleado = item['empleado']
-        cargas = item['lista_registros']
-        
-        suma_horas = sum(c.cantidad_horas for c in cargas)
-        total_general += suma_horas
-        
-        if len(cargas) == 1:
-            depto_mostrar = cargas[0].departamento_imputacion.nombre if cargas[0].departamento_imputacion else "-"
-        else:
-            depto_mostrar = empleado.departamento.nombre if empleado.departamento else "-"
-
-        lista_final.append({
-            'nombre': empleado.nombre_completo,
-            'documento': empleado.legajo,  # <--- DATO AGREGADO PARA EL REPORTE
-            'departamento': depto_mostrar,
-            'total_horas': suma_horas
-        })
-
-    fecha_actual = datetime.date.today()
-    fecha_nota = f"Chajarí, {fecha_actual.day} de {fecha_actual.strftime('%B')} de {fecha_actual.year}"
-
-    context = {'periodo': periodo, 'registros': lista_final, 'encabezado': encabezado, 'fecha_nota': fecha_nota, 'total_general': total_general}
-
-    html_string = render_to_string('reportes/pdf_horas.html', context)
-    response = HttpResponse(content_type='application/pdf')
+    destinatario = normalizar_destinatario(destinatario)
+    fecha = fecha_nota()
+
+    # Los períodos cerrados no cambian: servimos desde la caché en disco si la huella coincide
+    with instrumentacion.etapa('huella'):
+        entrada = EntradaCache(periodo, destinatario, PLANTILLA_PDF, fecha)
+    no_modificado = get_conditional_response(request, etag=quote_etag(entrada.etag))
+    if no_modificado is not None:
+        return no_modificado
+
+    pdf = entrada.leer()
+    if pdf is None:
+        with instrumentacion.etapa('datos'):
+            context = contexto_reporte(periodo, destinatario, fecha)
+        pdf = renderizar_pdf(context, request.build_absolute_uri())
+        entrada.guardar(pdf)
+    return respuesta_pdf(periodo, entrada, pdf)
+
+def respuesta_pdf(periodo, entrada, pdf):
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'inline; filename="Reporte_{periodo.nombre}.pdf"'
-    HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(response)
+    response['ETag'] = quote_etag(entrada.etag)
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
+# ====================================================================
+# FUNCIÓN 1B: RENDERIZADO EN SEGUNDO PLANO (COLA DE TRABAJOS)
+# ====================================================================
+def _datos_trabajo(trabajo):
+    return {
+        'id': trabajo.pk, 'periodo': trabajo.periodo_id, 'destinatario': trabajo.destinatario,
+        'estado': trabajo.estado, 'estado_display': trabajo.get_estado_display(), 'error': trabajo.error,
+        'url_estado': reverse('reporte_trabajo_estado', args=[trabajo.pk]),
+        'url_descarga': reverse('reporte_trabajo_descarga', args=[trabajo.pk]) if trabajo.estado == models.TrabajoReporte.LISTO else None,
+    }
+
+@staff_member_required
+@require_POST
+def encolar_reporte_pdf(request, periodo_id, destinatario):
+    periodo = get_object_or_404(models.Periodo, pk=periodo_id)
+    if not periodo.cerrado:
+        return respuesta_periodo_abierto(periodo)
+
+    trabajo = encolar_reporte(periodo, destinatario, request.build_absolute_uri(reverse('reporte_pdf', args=[periodo.pk, destinatario])))
+
+    # Desde el admin volvemos al listado; cualquier otro cliente recibe el JSON con el id del trabajo
+    volver = request.GET.get('volver')
+    if volver and url_has_allowed_host_and_scheme(volver, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        messages.info(request, f"📄 Reporte {trabajo.destinatario.title()} de {periodo.nombre}: {trabajo.get_estado_display()}.")
+        return redirect(volver)
+    return JsonResponse(_datos_trabajo(trabajo), status=202 if trabajo.estado != models.TrabajoReporte.LISTO else 200)
+
+@staff_member_required
+def estado_trabajo_reporte(request, trabajo_id):
+    trabajo = get_object_or_404(models.TrabajoReporte, pk=trabajo_id)
+    return JsonResponse(_datos_trabajo(trabajo))
+
+@staff_member_required
+def descargar_trabajo_reporte(request, trabajo_id):
+    trabajo = get_object_or_404(models.TrabajoReporte.objects.select_related('periodo'), pk=trabajo_id)
+    if trabajo.estado != models.TrabajoReporte.LISTO or not os.path.exists(trabajo.archivo):
+        raise Http404("El reporte todavía no está listo o fue invalidado.")
+    if trabajo.archivo.endswith('.zip'):
+        return FileResponse(open(trabajo.archivo, 'rb'), as_attachment=True, content_type='application/zip', filename=f"Cierre_{trabajo.periodo.nombre}.zip")
+    return FileResponse(open(trabajo.archivo, 'rb'), content_type='application/pdf', filename=f"Reporte_{trabajo.periodo.nombre}.pdf")
+
+# ====================================================================
+# FUNCIÓN 1C: EXPORTACIÓN DE LA LIQUIDACIÓN (CSV / XLSX)
+# ====================================================================
+@staff_member_required
+def exportar_liquidacion(request, periodo_id, formato):
+    periodo = get_object_or_404(models.Periodo, pk=periodo_id)
+    if not periodo.cerrado:
+        return respuesta_periodo_abierto(periodo)
+
+    nombre = f"Liquidacion_{periodo.nombre}"
+    if formato == 'csv':
+        response = StreamingHttpResponse(csv_en_streaming(filas_liquidacion(periodo)), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+        return response
+    if formato == 'xlsx':
+        try:
+            archivo = xlsx_temporal(filas_liquidacion(periodo), periodo.nombre)
+        except ErrorExportacion as e:
+            return HttpResponseBadRequest(str(e))
+        return FileResponse(archivo, as_attachment=True, filename=f"{nombre}.xlsx", content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    raise Http404("Formato de exportación desconocido.")
+
 # ====================================================================
 # FUNCIÓN 2: DASHBOARD HISTÓRICO
 # ====================================================================
 def reporte_historico(request):
-    data_barra_qs = list(models.RegistroHora.objects.exclude(periodo__isnull=True).values( 
-        'periodo__nombre',
-        'periodo__fecha_inicio'
-    ).annotate(
-        total_horas=Sum(Cast('cantidad_horas', FloatField()))
-    ).order_by('periodo__fecha_inicio'))
-    
-    labels_barra = [f"{item['periodo__nombre']}" for item in data_barra_qs]
-    datos_barra = [float(item['total_horas']) for item in data_barra_qs]
-    
-    periodo_actual = models.Periodo.objects.filter(activo=True).first()
-    labels_torta = ['Sin Datos']; datos_torta = [1]; periodo_actual_nombre = "No Definido"
-    
-    if periodo_actual:
-        periodo_actual_nombre = periodo_actual.nombre
-        data_torta_qs = list(models.RegistroHora.objects.filter(periodo=periodo_actual)
-            .exclude(departamento_imputacion__secretaria__isnull=True).values(
-            secretaria_nombre=Coalesce('departamento_imputacion__secretaria__nombre', Value('SIN SECRETARÍA', output_field=CharField()))
-        ).annotate(total_horas=Sum(Cast('cantidad_horas', FloatField()))).order_by('secretaria_nombre'))
-        
-        labels_torta = [item['secretaria_nombre'] for item in data_torta_qs]
-        datos_torta = [float(item['total_horas']) for item in data_torta_qs]
-        if not any(datos_torta): labels_torta = ['Sin Datos']; datos_torta = [1]
-
-    context = {'labels_barra': labels_barra, 'datos_barra': datos_barra, 'labels_torta': labels_torta, 'datos_torta': datos_torta, 'periodo_actual_nombre': periodo_actual_nombre}
-    return render(request, 'reportes/historico.html', context)
\ No newline at end of file
+    # La página sale sin datos; los gráficos se cargan desde reporte_historico_datos
+    return render(request, 'reportes/historico.html', {'url_datos': reverse('reporte_historico_datos')})
+
+def parametro_desde(request):
+    # (desde, None) o (None, respuesta de error)
+    desde = request.GET.get('since')
+    if desde is None:
+        return None, None
+    try: return int(desde), None
+    except ValueError: return None, HttpResponseBadRequest("El parámetro 'since' debe ser un número de versión.")
+
+def reporte_historico_datos(request):
+    desde, error = parametro_desde(request)
+    if error is not None:
+        return error
+    return respuesta_historico(request, datos_historico(request, desde))
+
+def respuesta_historico(request, datos):
+    cuerpo = json.dumps(datos, ensure_ascii=False)
+    etag = quote_etag(hashlib.sha256(cuerpo.encode()).hexdigest())
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    response = HttpResponse(cuerpo, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+# ====================================================================
+# FUNCIÓN 3: PANEL DE RENDIMIENTO (SOLO SUPERUSUARIO)
+# ====================================================================
+def panel_rendimiento(request):
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if request.method == 'POST' and 'reiniciar' in request.POST:
+        instrumentacion.reiniciar()
+        messages.success(request, "✅ Se descartaron las muestras acumuladas.")
+        return redirect('panel_rendimiento')
+    return render(request, 'admin/rendimiento.html', {
+        **admin.site.each_context(request), 'title': 'Rendimiento por URL',
+        'activa': instrumentacion.activa(), 'umbral_ms': instrumentacion.umbral_ms(),
+        'filas': instrumentacion.estadisticas(), 'lentas': instrumentacion.ultimas_lentas(),
+    })
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+import calculos.models as models
+from . import instrumentacion
+from .cache_reportes import EntradaCache
+from .cola_reportes import enviar_al_pool
+from .historico import armar_datos, serie_abiertos, serie_cerrados, torta_activo
+from .reportes import PLANTILLA_PDF, contexto_reporte, fecha_nota, html_reporte, normalizar_destinatario
+from .views import parametro_desde, respuesta_historico, respuesta_pdf, respuesta_periodo_abierto
+
+# ====================================================================
+# VISTAS ASYNC DE LOS REPORTES (SERVIDAS BAJO ASGI)
+# ====================================================================
+# Bajo ASGI (config/asgi.py con uvicorn, daphne, etc.) RutasAsgiMiddleware
+# cambia el urlconf del request por ROOT_URLCONF_ASGI (config/urls_asgi.py),
+# que sirve estas versiones en las mismas URLs; bajo WSGI siguen las de views.py.
+# - Dashboard: la serie de cerrados, la de abiertos y la torta del período
+#   activo se piden a la vez, cada una en un hilo con su propia conexión.
+# - PDF: la huella, la lectura de la caché y el contexto corren en hilos; el
+#   WeasyPrint va al pool de procesos de cola_reportes, así el event loop
+#   sigue atendiendo otros pedidos (y el admin) mientras se renderiza.
+# Con INSTRUMENTACION_ACTIVA el middleware (solo sync) hace que Django corra
+# toda la cadena en un hilo: funciona igual, pero sin esa ventaja.
+
+_renders = {}  # ruta del PDF -> Future del renderizado en curso
+_candado_renders = threading.Lock()
+_tareas = set()
+
+def en_hilo(funcion):
+    # Hilo propio (no el compartido del request) para poder correr varias a la vez;
+    # al terminar se cierran las conexiones vencidas de ese hilo, como al final de un request
+    def envuelta(*args, **kwargs):
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(envuelta, thread_sensitive=False)
+
+# --- MIDDLEWARE ---
+class RutasAsgiMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REPORTES_ASYNC', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.ROOT_URLCONF_ASGI
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+# --- PDF ---
+async def generar_reporte_pdf(request, periodo_id, destinatario):
+    periodo = await aget_object_or_404(models.Periodo, pk=periodo_id)
+
+    if not periodo.cerrado:
+        return respuesta_periodo_abierto(periodo)
+
+    destinatario = normalizar_destinatario(destinatario)
+    fecha = fecha_nota()
+
+    with instrumentacion.etapa('huella'):
+        entrada = await en_hilo(EntradaCache)(periodo, destinatario, PLANTILLA_PDF, fecha)
+    no_modificado = get_conditional_response(request, etag=quote_etag(entrada.etag))
+    if no_modificado is not None:
+        return no_modificado
+
+    pdf = await en_hilo(entrada.leer)()
+    if pdf is None:
+        pdf = await pdf_compartido(entrada, lambda: html_reporte(contexto_reporte(periodo, destinatario, fecha)), request.build_absolute_uri())
+    return respuesta_pdf(periodo, entrada, pdf)
+
+def pdf_compartido(entrada, obtener_html, base_url):
+    # Los pedidos simultáneos del mismo PDF (misma ruta = mismo ETag) esperan un único
+    # renderizado. Corre en su propia tarea: si el cliente que lo pidió se desconecta, sigue.
+    with _candado_renders:
+        futuro = _renders.get(entrada.ruta)
+        if futuro is None:
+            futuro = _renders[entrada.ruta] = Future()
+            tarea = asyncio.ensure_future(_renderizar(entrada, obtener_html, base_url, futuro))
+            _tareas.add(tarea)  # el loop solo guarda referencias débiles a las tareas
+            tarea.add_done_callback(_tareas.discard)
+    return asyncio.wrap_future(futuro)
+
+async def _renderizar(entrada, obtener_html, base_url, futuro):
+    try:
+        with instrumentacion.etapa('datos'):
+            html = await en_hilo(obtener_html)()
+        with instrumentacion.etapa('weasyprint'):
+            pdf = await asyncio.wrap_future(enviar_al_pool(html, base_url))
+        await en_hilo(entrada.guardar)(pdf)
+        futuro.set_result(pdf)
+    except BaseException as e:
+        futuro.set_exception(e)
+    finally:
+        with _candado_renders:
+            _renders.pop(entrada.ruta, None)
+
+# --- DASHBOARD HISTÓRICO ---
+async def reporte_historico_datos(request):
+    desde, error = parametro_desde(request)
+    if error is not None:
+        return error
+    cerrados, abiertos, torta = await asyncio.gather(en_hilo(serie_cerrados)(), en_hilo(serie_abiertos)(), en_hilo(torta_activo)(request))
+    return respuesta_historico(request, armar_datos(cerrados, abiertos, torta, desde))
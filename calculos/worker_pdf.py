@@ -0,0 +1,20 @@
+import os
+
+# ====================================================================
+# FUNCIONES QUE CORREN DENTRO DE LOS PROCESOS HIJOS DEL POOL
+# ====================================================================
+# Este módulo no importa modelos ni nada que lea settings al importarse: con
+# 'spawn' el hijo lo importa para deserializar las tareas antes de que Django
+# esté configurado.
+
+def inicializar():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    # Fuentes, hoja de estilos y estáticos listos antes de la primera tarea
+    from .render_pdf import precalentar
+    precalentar()
+
+def renderizar_html(html_string, base_url):
+    from .render_pdf import renderizar
+    return renderizar(html_string, base_url)
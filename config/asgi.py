@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Los reportes se sirven con las vistas async (calculos/vistas_async.py, REPORTES_ASYNC);
+# con cualquier servidor ASGI, p. ej.: uvicorn config.asgi:application --workers 2
+
+# Fuentes, hoja de estilos y estáticos del PDF cargados antes del primer pedido
+from calculos.render_pdf import precalentar  # noqa: E402
+precalentar()
@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'calculos.instrumentacion.InstrumentacionMiddleware',  # solo si INSTRUMENTACION_ACTIVA
+    'calculos.vistas_async.RutasAsgiMiddleware',  # bajo ASGI, reportes con las vistas async (REPORTES_ASYNC)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +48,7 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'config.urls'
+ROOT_URLCONF_ASGI = 'config.urls_asgi'  # mismas rutas, reportes async (ver calculos/vistas_async.py)
 
 TEMPLATES = [
     {
@@ -66,10 +69,29 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 
 # Database
+# Perfil de SQLite: PRAGMAs que se aplican en cada conexión nueva.
+# WAL deja que los lectores (reportes, listados) no bloqueen al que escribe y viceversa.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # seguro con WAL; solo se arriesga la última transacción ante un corte de luz
+    'cache_size': -32000,        # en KiB (negativo) → ~32 MB de caché de páginas por conexión
+    'mmap_size': 134217728,      # 128 MB leídos por mmap
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,     # conexiones persistentes: los PRAGMA se pagan una vez por hilo
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {k}={v}' for k, v in SQLITE_PRAGMAS.items()),
+            'timeout': 20,  # segundos esperando un lock antes de "database is locked" (no va busy_timeout en los PRAGMA: lo pisaría)
+            # Las escrituras toman el lock al empezar: evita deadlocks de "upgrade" de lector a escritor
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -105,6 +127,50 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Caché en disco de los PDF de períodos cerrados
+REPORTES_CACHE_DIR = os.path.join(BASE_DIR, 'cache_reportes')
+REPORTES_HUELLA_TIMEOUT = 3600  # huella de los datos de cada período (se renueva sola al cambiar el resumen)
+
+# Cola de renderizado en segundo plano (None = un proceso por núcleo)
+REPORTES_WORKERS = None
+REPORTES_TRABAJO_TIMEOUT = 300  # segundos antes de dar por perdido un renderizado
+REPORTES_PRECALENTAR = True  # cargar fuentes / hoja de estilos del PDF al arrancar (wsgi, asgi y pool)
+REPORTES_ASYNC = True  # bajo ASGI: consultas del dashboard a la vez y WeasyPrint en el pool (no bloquea el event loop)
+
+# Dashboard histórico: cuánto se guardan en caché los totales de períodos cerrados
+HISTORICO_CACHE_TIMEOUT = 86400
+
+# Listado de registros: conteos con búsqueda y opciones de los filtros laterales en caché (segundos)
+CONTEOS_CACHE_TIMEOUT = 300
+
+# Archivo en frío de períodos cerrados (archivar_periodos): carpeta y antigüedad mínima
+# (crear_backup lo incluye en cada copia: esos registros ya no están en la base)
+ARCHIVO_DIR = os.path.join(BASE_DIR, 'archivo')
+ARCHIVO_ANTIGUEDAD_MESES = 24
+
+# Copias de seguridad (crear_backup): cuántos backups horarios / diarios / mensuales se conservan
+BACKUPS_DIR = os.path.join(BASE_DIR, 'backups')
+BACKUP_RETENCION = {'horarios': 24, 'diarios': 30, 'mensuales': 12}
+
+# Instrumentación por request (tiempos, consultas SQL, render del PDF). Las que superan
+# el umbral se registran en un log rotativo; percentiles en /admin/rendimiento/
+INSTRUMENTACION_ACTIVA = False
+INSTRUMENTACION_UMBRAL_MS = 1000
+INSTRUMENTACION_LOG = os.path.join(BASE_DIR, 'logs', 'peticiones_lentas.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'json': {'format': '%(message)s'}},
+    'handlers': {
+        'lentas': {
+            'class': 'logging.handlers.RotatingFileHandler', 'filename': INSTRUMENTACION_LOG,
+            'maxBytes': 5 * 1024 * 1024, 'backupCount': 5, 'encoding': 'utf-8', 'delay': True, 'formatter': 'json',
+        },
+    },
+    'loggers': {'calculos.lentas': {'handlers': ['lentas'], 'level': 'INFO', 'propagate': False}},
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
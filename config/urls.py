@@ -3,12 +3,23 @@ from django.urls import path
 from calculos import views  # <--- IMPORTAR TUS VISTAS
 
 urlpatterns = [
+    # Panel de rendimiento (instrumentación por request); va antes del admin para que no lo tape
+    path('admin/rendimiento/', admin.site.admin_view(views.panel_rendimiento), name='panel_rendimiento'),
     path('admin/', admin.site.urls),
     
     # RUTA NUEVA PARA EL REPORTE
     # Recibe el ID del período y el nombre del destinatario (andrea/edith)
     path('reporte/pdf/<int:periodo_id>/<str:destinatario>/', views.generar_reporte_pdf, name='reporte_pdf'),
 
+    # Renderizado en segundo plano: encolar, consultar estado y descargar
+    path('reporte/pdf/<int:periodo_id>/<str:destinatario>/encolar/', views.encolar_reporte_pdf, name='reporte_pdf_encolar'),
+    path('reporte/trabajo/<int:trabajo_id>/', views.estado_trabajo_reporte, name='reporte_trabajo_estado'),
+    path('reporte/trabajo/<int:trabajo_id>/descargar/', views.descargar_trabajo_reporte, name='reporte_trabajo_descarga'),
+
+    # Liquidación del período en planilla (csv / xlsx)
+    path('reporte/exportar/<int:periodo_id>/<str:formato>/', views.exportar_liquidacion, name='reporte_exportar'),
+
     # RUTA NUEVA: Dashboard Histórico
     path('reporte/historico/', views.reporte_historico, name='reporte_historico'), # <--- NUEVA LÍNEA
+    path('reporte/historico/datos/', views.reporte_historico_datos, name='reporte_historico_datos'),
 ]
\ No newline at end of file
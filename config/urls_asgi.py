@@ -0,0 +1,15 @@
+from django.urls import path
+from calculos import vistas_async
+from .urls import urlpatterns as urlpatterns_wsgi
+
+# Mismas rutas que config/urls.py, pero los reportes con las vistas async.
+# RutasAsgiMiddleware lo usa para los requests que llegan por ASGI.
+VISTAS_ASYNC = {
+    'reporte_pdf': vistas_async.generar_reporte_pdf,
+    'reporte_historico_datos': vistas_async.reporte_historico_datos,
+}
+
+urlpatterns = [
+    path(str(ruta.pattern), VISTAS_ASYNC[ruta.name], name=ruta.name) if getattr(ruta, 'name', None) in VISTAS_ASYNC else ruta
+    for ruta in urlpatterns_wsgi
+]
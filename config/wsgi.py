@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Fuentes, hoja de estilos y estáticos del PDF cargados antes del primer pedido
+from calculos.render_pdf import precalentar  # noqa: E402
+precalentar()